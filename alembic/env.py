@@ -0,0 +1,57 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from logging.config import fileConfig
+
+from sqlalchemy import create_engine, pool
+
+from alembic import context
+
+from app.core.config import Config
+from app.models.base import Base
+# 导入全部模型，使其注册到 Base.metadata（用于 alembic revision --autogenerate）
+from app.models.user import User  # noqa: F401
+from app.models.chat import Chat, Message  # noqa: F401
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_url() -> str:
+    # alembic.ini 中设置了 sqlalchemy.url 时优先使用，否则使用应用配置
+    return config.get_main_option("sqlalchemy.url") or Config.get_database_url
+
+
+def run_migrations_offline() -> None:
+    """
+    离线模式：只生成 SQL 脚本，不连接数据库（alembic upgrade head --sql）。
+    """
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """
+    在线模式：连接数据库执行迁移。
+    """
+    connectable = create_engine(get_url(), poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,64 @@
+"""initial schema: users, chats, messages
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+之前的版本在应用启动时用 create_all 建表，这里跳过已经存在的表，已有数据库可以直接升级。
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 离线模式（--sql）无法查看数据库，按空库生成
+    existing = set() if context.is_offline_mode() else set(sa.inspect(op.get_bind()).get_table_names())
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("username", sa.String(36), nullable=False),
+            sa.Column("nickname", sa.String(100), nullable=True, unique=True),
+            sa.Column("email", sa.String(255), nullable=True),
+            sa.Column("hashed_password", sa.String(255), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+            sa.Column("is_superuser", sa.Boolean(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+    if "chats" not in existing:
+        op.create_table(
+            "chats",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("title", sa.String(255), nullable=False),
+            sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+    if "messages" not in existing:
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("role", sa.String(255), nullable=False),
+            sa.Column("content", mysql.LONGTEXT(), nullable=False),
+            sa.Column("chat_id", sa.String(36), sa.ForeignKey("chats.id"), nullable=False),
+            sa.Column("meta_data", mysql.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("messages")
+    op.drop_table("chats")
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_index("ix_users_username", table_name="users")
+    op.drop_table("users")
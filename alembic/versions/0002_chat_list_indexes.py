@@ -0,0 +1,34 @@
+"""indexes for chat listing and message pagination
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+- chats(user_id, created_at): 对话列表按用户过滤、按创建时间排序；
+- messages(chat_id, created_at): 按对话分页读取消息。
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_chats_user_id_created_at", "chats", ["user_id", "created_at"]),
+    ("ix_messages_chat_id_created_at", "messages", ["chat_id", "created_at"]),
+]
+
+
+def upgrade() -> None:
+    inspector = None if context.is_offline_mode() else sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        # 用 create_all 建表的数据库可能已经有这些索引
+        if inspector is None or name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,37 @@
+"""per-message rows for chat_history
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+chat_history 的消息按行存储（见 app/db/mysql_client.py）。旧数据的迁移见 app/db/migrate_chat_history.py。
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 之前的版本由 SQLClient 在运行时创建该表
+    if not context.is_offline_mode() and "chat_history_messages" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "chat_history_messages",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("conversation_id", sa.String(36), nullable=False),
+        sa.Column("role", sa.String(16), nullable=False),
+        sa.Column("content", mysql.LONGTEXT(), nullable=False),
+        sa.Column("created_at", mysql.DATETIME(fsp=6), nullable=False),
+    )
+    op.create_index(
+        "idx_chat_history_messages_conversation", "chat_history_messages", ["conversation_id", "id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("chat_history_messages")
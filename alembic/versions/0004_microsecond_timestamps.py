@@ -0,0 +1,37 @@
+"""microsecond precision for created_at / updated_at
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+DATETIME 只保留到秒：同一秒内写入的消息（提问和回答、批量写入的消息）created_at 相同，
+分页时只能按随机的 UUID 主键排序，顺序与写入顺序不一致。改为 DATETIME(6) 后按微秒排序。
+已有数据的时间保持不变（微秒部分为 0），升级前同一秒内写入的旧消息的相对顺序无法恢复。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+TABLES = ("users", "chats", "messages")
+COLUMNS = ("created_at", "updated_at")
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        for column in COLUMNS:
+            op.alter_column(
+                table, column, type_=mysql.DATETIME(fsp=6), existing_type=sa.DateTime(), existing_nullable=False
+            )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        for column in COLUMNS:
+            op.alter_column(
+                table, column, type_=sa.DateTime(), existing_type=mysql.DATETIME(fsp=6), existing_nullable=False
+            )
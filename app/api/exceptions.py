@@ -86,6 +86,12 @@ class APIExceptions:
         detail="Network error or service unavailable, please try again later",  # 网络错误或服务不可用，请稍后再试
     )
 
+    SERVER_BUSY_EXCEPTION = HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again later",  # 服务繁忙，请稍后再试
+        headers={"Retry-After": "1"},
+    )
+
     # ================ 聊天相关异常 (Chat related exceptions) ================
     CHAT_NOT_FOUND_EXCEPTION = HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -108,6 +114,11 @@ class APIExceptions:
         detail="Invalid role",  # 角色无效
     )
 
+    INVALID_CURSOR_EXCEPTION = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid pagination cursor",  # 分页游标无效
+    )
+
     # ================ 业务逻辑相关异常 (Business logic related exceptions) ================
     RATE_LIMIT_EXCEEDED_EXCEPTION = HTTPException(
         status_code=470,  # 自定义状态码：470 - 超过速率限制
@@ -0,0 +1,36 @@
+from functools import lru_cache
+from typing import Any
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+"""
+高性能 JSON 响应。
+FastAPI 默认对返回值先按 response_model 校验一遍，再转换为 Python 基本类型，最后由标准库 json 编码；
+消息多、内容长的对话会在这三步上消耗大量 CPU。
+- FastJSONResponse: 应用的默认响应类，直接用 pydantic-core（Rust）把内容编码为 UTF-8 字节，
+  Pydantic 模型、datetime、UUID 等无需先转换为字典；
+- orm_response: 大响应的路由直接返回它：ORM 对象只按响应模型校验一次，随后直接编码为字节，跳过 FastAPI 的二次校验和编码。
+  路由仍需声明 response_model，用于生成 OpenAPI 文档。
+"""
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        # 与标准库 json 的输出一致：紧凑格式，非 ASCII 字符不转义
+        return to_json(content)
+
+@lru_cache(maxsize=None)
+def get_type_adapter(response_type: Any) -> TypeAdapter:
+    # TypeAdapter 的构建开销较大，每种响应类型只构建一次
+    return TypeAdapter(response_type)
+
+def orm_response(response_type: Any, content: Any, status_code: int = 200) -> Response:
+    """
+    按响应类型校验 content（可以是 ORM 对象或其列表）并直接编码为 JSON 响应。
+    :param response_type: 响应模型，如 ChatResponse 或 List[ChatResponse]
+    :param content: 要返回的对象
+    :param status_code: HTTP 状态码
+    """
+    adapter = get_type_adapter(response_type)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+    return Response(content=body, status_code=status_code, media_type=FastJSONResponse.media_type)
@@ -1,8 +1,13 @@
 from fastapi import APIRouter
 
+from app.api.v1 import conversation, health
 from app.api.v1.sql import auth, chat
 
 api_router = APIRouter()
 
+api_router.include_router(health.router, prefix="/v1/health", tags=["health"])
 api_router.include_router(auth.router, prefix="/v1/auth", tags=["auth"])
-api_router.include_router(chat.router, prefix="/v1/chats", tags=["chats"])
\ No newline at end of file
+api_router.include_router(chat.router, prefix="/v1/chats", tags=["chats"])
+api_router.include_router(conversation.RAG_Client, prefix="/v1", tags=["rag"])
+api_router.include_router(conversation.SQL_ChatHistory_Client, prefix="/v1", tags=["rag"])
+api_router.include_router(conversation.Test_Client, prefix="/v1/test", tags=["test"])
\ No newline at end of file
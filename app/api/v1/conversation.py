@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Header, HTTPException, Depends
-from app.services.response_generation import OpenAI_RAG_Client
-from app.db.conversation_manager import ConversationManager
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.services.response_generation import AsyncOpenAI_RAG_Client
+from app.db.conversation_manager import create_conversation_manager
 from app.db.mysql_client import SQLClient
-from app.models.conversation_base import ConversationRequest, ConversationResponse, ChatHistoryRequest
+from app.schemas.conversation import ConversationRequest, ConversationResponse, ChatHistoryRequest
 from app.core.config import Config
 from typing import Optional
+import asyncio
 import json
 from uuid import uuid4
 import logging
@@ -15,9 +18,12 @@ RAG_Client = APIRouter()
 Test_Client = APIRouter()
 SQL_ChatHistory_Client = APIRouter()
 
-GPT_Client = OpenAI_RAG_Client()
+GPT_Client = AsyncOpenAI_RAG_Client()
 SQL_client = SQLClient()
-conversation_manager = ConversationManager()
+# 对话历史后端（CONVERSATION_BACKEND=redis 时多个 worker 共享）
+conversation_manager = create_conversation_manager()
+# 正在进行的流式回复写入任务（保持引用，避免任务被垃圾回收）
+_pending_saves = set()
 
 API_KEY = Config.FASTAPI_API_KEY
 # 验证 API 密钥的依赖项
@@ -27,21 +33,24 @@ def api_key_auth(api_key: Optional[str] = Header(None)):
     return api_key
 
 @RAG_Client.post("/cflp")
-def generate_response_for_user(request: ConversationRequest, api_key: str = Depends(api_key_auth)):
-    # 用户输入写入SQL
-    conversation_id = SQL_client.append_to_conversation(
+async def generate_response_for_user(request: ConversationRequest, api_key: str = Depends(api_key_auth)):
+    # 用户输入写入SQL（SQLClient 是阻塞的，放到线程池中执行，只占用线程很短的时间）
+    conversation_id = await run_in_threadpool(
+        SQL_client.append_to_conversation,
         username=request.user_id,
         conversation_id=request.conversation_id,
         message=request.query,
         is_user=True
         )
     # 获取当前对话的历史对话
-    history = conversation_manager.get_history(request.conversation_id)
-    response = GPT_Client.generate_response(user_query = request.query, history=history)
+    history = await run_in_threadpool(conversation_manager.get_history, conversation_id)
+    # 检索和大模型调用都是异步的，等待期间不占用线程池
+    response = await GPT_Client.generate_response(user_query = request.query, history=history)
     # 更新对话历史，保存用户查询和模型响应
-    conversation_manager.update_history(conversation_id=conversation_id, query=request.query, response=response)
+    await run_in_threadpool(conversation_manager.update_history, conversation_id=conversation_id, query=request.query, response=response)
     # 模型响应写入SQL
-    SQL_client.append_to_conversation(
+    await run_in_threadpool(
+        SQL_client.append_to_conversation,
         username=request.user_id,
         conversation_id=conversation_id,
         message=response,
@@ -53,11 +62,100 @@ def generate_response_for_user(request: ConversationRequest, api_key: str = Depe
         model_response=response
     )
 
+def format_sse(event: str, data: dict) -> str:
+    """
+    按 Server-Sent Events 格式编码一条事件。
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@RAG_Client.post("/cflp/stream")
+async def generate_response_stream_for_user(request: ConversationRequest, api_key: str = Depends(api_key_auth)):
+    """
+    流式 RAG 接口，以 Server-Sent Events 返回：
+    - meta: 首个事件，包含 conversation_id
+    - delta: 模型输出的文本片段
+    - done: 生成结束，包含完整回复
+    - error: 生成过程中出错
+    回复在发送 done 之前写入对话历史和 SQL；出错或客户端中途断开时保存已生成的部分。
+    """
+    # 用户输入写入SQL
+    conversation_id = await run_in_threadpool(
+        SQL_client.append_to_conversation,
+        username=request.user_id,
+        conversation_id=request.conversation_id,
+        message=request.query,
+        is_user=True
+        )
+    history = await run_in_threadpool(conversation_manager.get_history, conversation_id)
+
+    async def save_response(response: str):
+        """
+        把回复写入对话历史和 SQL。
+        """
+        try:
+            await run_in_threadpool(conversation_manager.update_history, conversation_id=conversation_id, query=request.query, response=response)
+            await run_in_threadpool(
+                SQL_client.append_to_conversation,
+                username=request.user_id,
+                conversation_id=conversation_id,
+                message=response,
+                is_user=False
+                )
+        except Exception as e:
+            logger.error(f"Error saving streamed response for conversation {conversation_id}: {e}")
+
+    async def event_stream():
+        chunks = []
+        saved = False
+
+        async def save():
+            # 客户端断开时 Starlette 会取消本生成器：写入放在独立的任务中，
+            # shield 保证等待被取消后写入仍会完成
+            nonlocal saved
+            saved = True
+            response = "".join(chunks)
+            if not response:
+                logger.warning(f"No response generated for conversation {conversation_id}, nothing saved")
+                return
+            task = asyncio.ensure_future(save_response(response))
+            _pending_saves.add(task)
+            task.add_done_callback(_pending_saves.discard)
+            await asyncio.shield(task)
+
+        try:
+            yield format_sse("meta", {"user_id": request.user_id, "conversation_id": conversation_id})
+            try:
+                async for text in GPT_Client.generate_response_stream(user_query=request.query, history=history):
+                    chunks.append(text)
+                    yield format_sse("delta", {"content": text})
+            except Exception as e:
+                logger.error(f"Error streaming response: {e}")
+                # 出错前已生成的部分仍然保存
+                await save()
+                yield format_sse("error", {"detail": str(e)})
+                return
+            response = "".join(chunks)
+            # 先保存再发送 done：客户端收到 done 后关闭连接不会丢失回复
+            await save()
+            yield format_sse("done", {"conversation_id": conversation_id, "model_response": response})
+        finally:
+            if not saved:
+                logger.warning(f"Client disconnected mid-stream, saving partial response for conversation {conversation_id}")
+                await save()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # 禁止缓存和反向代理缓冲，保证片段及时送达客户端
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @SQL_ChatHistory_Client.post("/chat_history")
 async def add_chat_history(request: ChatHistoryRequest, api_key: str = Depends(api_key_auth)):
     try:
         # 如果 request.conversation_id 为空，SQL_client.append_to_conversation 内部应生成新的会话ID
-        conversation_id = SQL_client.append_to_conversation(
+        conversation_id = await run_in_threadpool(
+            SQL_client.append_to_conversation,
             username=request.user_id,
             conversation_id=request.conversation_id,
             message=request.message,
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import Config
+from app.db.session import get_async_engine
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+"""
+存活 / 就绪探针。
+- /live: 进程能处理请求即返回 200，不访问任何外部依赖，供容器编排判断是否需要重启；
+- /ready: 检查数据库（以及共享的对话历史后端）是否可用，不可用时返回 503，供负载均衡决定是否转发流量。
+"""
+
+async def check_database() -> None:
+    async with get_async_engine().connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+async def check_conversation_backend() -> None:
+    # 进程内后端没有外部依赖
+    if Config.CONVERSATION_BACKEND != "redis":
+        return
+    from app.api.v1.conversation import conversation_manager
+    await run_in_threadpool(conversation_manager.ping)
+
+@router.get("/live", operation_id="liveness")
+async def liveness():
+    """
+    存活探针
+    """
+    return {"status": "ok"}
+
+@router.get("/ready", operation_id="readiness")
+async def readiness():
+    """
+    就绪探针：逐项检查依赖，任何一项失败或超时都返回 503。
+    """
+    checks = {"database": check_database, "conversation_backend": check_conversation_backend}
+    results = {}
+    ready = True
+    for name, check in checks.items():
+        try:
+            await asyncio.wait_for(check(), timeout=Config.READINESS_CHECK_TIMEOUT)
+            results[name] = "ok"
+        except Exception as e:
+            logger.warning(f"Readiness check {name} failed: {e!r}")
+            results[name] = "unavailable"
+            ready = False
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ok" if ready else "unavailable", "checks": results},
+    )
@@ -2,19 +2,23 @@ from datetime import timedelta
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from jose import JWTError
 from requests.exceptions import RequestException
 import re
 import uuid
 
 from app.core import security
 from app.core.config import Config
-from app.db.session import get_db
+from app.core.password_hashing import PasswordHasherBusyError
+from app.core.user_cache import user_cache
+from app.db.session import get_async_db
 from app.models.user import User
 from app.schemas.token import Token
 from app.schemas.user import UserCreate, UserResponse
 from app.api.exceptions import APIExceptions
+from app.api.responses import FastJSONResponse, orm_response
 
 router = APIRouter()  # 创建一个名为 "router" 的 API 路由器
 # 定义 JWT 认证的 token 端点（/token），客户端通过此端点获取 token。
@@ -28,7 +32,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/token")
 Depends 是 FastAPI 提供的一个依赖注入工具，允许函数在调用时自动解析和提供参数，而无需手动传入。
 """
 async def get_current_user(
-    db: Session = Depends(get_db),  # 声明并注入依赖项
+    db: AsyncSession = Depends(get_async_db),  # 声明并注入依赖项（异步会话，查询时不阻塞事件循环）
     token: str = Depends(oauth2_scheme)
 ) -> User:
     """
@@ -41,11 +45,9 @@ async def get_current_user(
     
     # 解码 JWT token，并验证其有效性。如果 token 无效或用户不存在，将抛出异常。
     try:
-        # jwt.decode: 解码 JWT 令牌。
-        # token: 从请求中提取的令牌。
-        # Config.SECRET_KEY: 用于签名验证的密钥。
-        # algorithms=[Config.ALGORITHM]: 使用的加密算法（如 "HS256"）。
-        payload = jwt.decode(token, Config.SECRET_KEY, algorithms=[Config.ALGORITHM])
+        # security.decode_access_token: 解码 JWT 令牌并验证签名（Config.SECRET_KEY / Config.ALGORITHM）。
+        # 已验证过的令牌从缓存中取出 payload，不再重复验证签名。
+        payload = security.decode_access_token(token)
         
         # 从解码后的 payload 中提取 sub 字段（通常表示用户名或用户 ID）
         username: str = payload.get("sub")
@@ -56,8 +58,13 @@ async def get_current_user(
         # 如果令牌无效（例如签名错误、过期等），捕获异常并抛出异常。
         raise APIExceptions.TOKEN_INVALID_EXCEPTION
     
+    # 先查已认证用户缓存，未命中时再查询数据库
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+
     # 查询用户，如果用户不存在，抛出异常。
-    user = db.query(User).filter(User.username == username).first()
+    user = (await db.execute(select(User).where(User.username == username))).scalars().first()
     if user is None:
         raise APIExceptions.USER_NOT_FOUND_EXCEPTION
     
@@ -65,6 +72,9 @@ async def get_current_user(
     if not user.is_active:
         raise APIExceptions.INACTIVE_USER_EXCEPTION
     
+    # 只缓存活跃用户；停用用户时（after_update 事件）对应条目失效
+    user = user_cache.set(username, user)
+    
     # 返回经过验证的 User 对象，供后续接口使用。
     return user
 
@@ -81,7 +91,7 @@ def is_valid_email(email: str) -> bool:
 
 # 用户注册接口
 @router.post("/register", response_model=UserResponse, operation_id="register_user")
-async def register(*, db: Session = Depends(get_db), user_in: UserCreate) -> Any:
+async def register(*, db: AsyncSession = Depends(get_async_db), user_in: UserCreate) -> Any:
     """
     用户注册接口
     - username: 必填，用户名
@@ -98,7 +108,7 @@ async def register(*, db: Session = Depends(get_db), user_in: UserCreate) -> Any
             raise APIExceptions.INVALID_INVITE_CODE_EXCEPTION
         
         # 检查用户名是否存在
-        user = db.query(User).filter(User.username == user_in.username).first()
+        user = (await db.execute(select(User).where(User.username == user_in.username))).scalars().first()
         if user:
             raise APIExceptions.USERNAME_EXISTS_EXCEPTION
         
@@ -110,7 +120,7 @@ async def register(*, db: Session = Depends(get_db), user_in: UserCreate) -> Any
                 raise APIExceptions.INVALID_EMAIL_FORMAT_EXCEPTION
                 
             # 检查邮箱是否已存在
-            user = db.query(User).filter(User.email == email).first()
+            user = (await db.execute(select(User).where(User.email == email))).scalars().first()
             if user:
                 raise APIExceptions.EMAIL_EXISTS_EXCEPTION
         else:
@@ -122,19 +132,23 @@ async def register(*, db: Session = Depends(get_db), user_in: UserCreate) -> Any
         if not nickname or nickname.strip() == "":
             nickname = f"user_{uuid.uuid4().hex[:8]}"
         
-        # 创建新用户
+        # 创建新用户（bcrypt 计算在进程池中执行，不阻塞事件循环）
+        try:
+            hashed_password = await security.password_hasher.hash(user_in.password)
+        except PasswordHasherBusyError:
+            raise APIExceptions.SERVER_BUSY_EXCEPTION
         user = User(
             username=user_in.username,
             email=email,  # 使用处理后的email
             nickname=nickname,
-            hashed_password=security.get_password_hash(user_in.password),
+            hashed_password=hashed_password,
             is_active=True,  # 默认设置为激活状态
             is_superuser=False,  # 默认设置为非超级用户
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
-        return user
+        await db.commit()
+        await db.refresh(user)
+        return orm_response(UserResponse, user)
     except RequestException as e:
         # 处理网络或服务器错误
         raise APIExceptions.NETWORK_ERROR_EXCEPTION from e
@@ -142,21 +156,25 @@ async def register(*, db: Session = Depends(get_db), user_in: UserCreate) -> Any
 # 获取 JWT 访问令牌
 @router.post("/token", response_model=Token, operation_id="get_access_token")
 async def login_access_token(
-    db: Session = Depends(get_db),  # 注入数据库会话，通过 get_db 获取。
+    db: AsyncSession = Depends(get_async_db),  # 注入异步数据库会话，通过 get_async_db 获取。
     form_data: OAuth2PasswordRequestForm = Depends()  # 注入表单数据，使用 FastAPI 的 OAuth2PasswordRequestForm，从请求中提取用户名和密码。
 ) -> Any:
     """
     用户登录接口，获取 JWT 访问令牌
     """
     # 验证用户凭证
-    user = db.query(User).filter(User.username == form_data.username).first()
+    user = (await db.execute(select(User).where(User.username == form_data.username))).scalars().first()
     
     # 检查用户是否存在
     if not user:
         raise APIExceptions.USER_NOT_FOUND_EXCEPTION
     
-    # 验证密码
-    if not security.verify_password(form_data.password, user.hashed_password):
+    # 验证密码（bcrypt 计算在进程池中执行，不阻塞事件循环）
+    try:
+        password_ok = await security.password_hasher.verify(form_data.password, user.hashed_password)
+    except PasswordHasherBusyError:
+        raise APIExceptions.SERVER_BUSY_EXCEPTION
+    if not password_ok:
         raise APIExceptions.INCORRECT_PASSWORD_EXCEPTION
     
     # 验证用户状态    
@@ -171,11 +189,11 @@ async def login_access_token(
         data={"sub": user.username}, 
         expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return FastJSONResponse({"access_token": access_token, "token_type": "bearer"})
 
 @router.post("/test_token", response_model=UserResponse, operation_id="test_access_token")
 async def test_token(current_user: User = Depends(get_current_user)):
     """
     测试访问 token 是否有效
     """
-    return current_user
\ No newline at end of file
+    return orm_response(UserResponse, current_user)
\ No newline at end of file
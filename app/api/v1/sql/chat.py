@@ -1,21 +1,52 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import base64
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from app.db.session import get_db
+from app.core.config import Config
+from app.db.session import get_async_db
+from app.models.base import get_current_beijing_time
 from app.models.chat import Chat, Message
 from app.models.user import User
-from app.schemas.chat import ChatCreate, ChatResponse, MessageCreate, MessageResponse
+from app.schemas.chat import (
+    ChatCreate, ChatResponse, ChatSummaryResponse, MessageBatchCreate, MessageBatchResponse, MessageCreate,
+    MessagePageResponse, MessageResponse
+)
 from app.api.v1.sql.auth import get_current_user
 from app.api.exceptions import APIExceptions
+from app.api.responses import FastJSONResponse, orm_response
 
 router = APIRouter()
 
+def encode_message_cursor(message: Message) -> str:
+    """
+    把消息的 (created_at, id) 编码为不透明的分页游标。
+    """
+    # 数据库中保存的是不带时区的北京时间
+    created_at = message.created_at.replace(tzinfo=None)
+    raw = f"{created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_message_cursor(cursor: str):
+    """
+    解析分页游标。
+    :return: (created_at, message_id)
+    """
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), message_id
+    except (ValueError, UnicodeDecodeError):
+        raise APIExceptions.INVALID_CURSOR_EXCEPTION
+
 # 创建新对话
 @router.post("/", response_model=ChatResponse, operation_id="create_chat")
 async def create_chat(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     chat_in: ChatCreate,
     current_user: User = Depends(get_current_user)
 ):
@@ -28,7 +59,7 @@ async def create_chat(
     # 检查前端是否提供了 ID
     if chat_in.id:
         # 检查提供的 ID 是否已存在
-        existing_chat = db.query(Chat).filter(Chat.id == chat_in.id).first()
+        existing_chat = (await db.execute(select(Chat.id).where(Chat.id == chat_in.id))).first()
         if existing_chat:
             raise APIExceptions.CHAT_ID_EXISTS_EXCEPTION
         chat_id = chat_in.id
@@ -51,36 +82,83 @@ async def create_chat(
     chat = Chat(**chat_data)
 
     db.add(chat)
-    db.commit()
-    db.refresh(chat)
-    return chat
+    await db.commit()
+    # 新对话没有消息；一并加载 messages，避免序列化时在异步会话中触发懒加载
+    await db.refresh(chat, attribute_names=["messages"])
+    return orm_response(ChatResponse, chat)
 
 # 获取所有对话
 @router.get("/", response_model=List[ChatResponse], operation_id="list_chats")
 async def get_chats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
     skip: int = 0,
     limit: int = 100
 ):
     """
-    获取当前用户的所有对话
+    获取当前用户的所有对话（包含全部消息）。
+    消息通过 selectinload 一次性批量加载：无论对话数多少，总共只有两次查询。
+    只需要对话列表时请使用 /summary。
     """
     chats = (
-        db.query(Chat)
-        .filter(Chat.user_id == current_user.id)
-        .order_by(Chat.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+        await db.execute(
+            select(Chat)
+            .where(Chat.user_id == current_user.id)
+            .options(selectinload(Chat.messages))
+            .order_by(Chat.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+    ).scalars().all()
+    # 直接编码为 JSON，跳过 FastAPI 对大响应的二次校验和编码
+    return orm_response(List[ChatResponse], chats)
+
+# 获取对话列表（不含消息内容）
+@router.get("/summary", response_model=List[ChatSummaryResponse], operation_id="list_chat_summaries")
+async def get_chat_summaries(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+    skip: int = 0,
+    limit: int = 100
+):
+    """
+    获取当前用户的对话列表，只返回每个对话的消息数和最后更新时间，不加载消息内容。
+    一次查询完成：按 chats(user_id, created_at) 索引过滤排序，消息数和最后更新时间由相关子查询计算。
+    """
+    # 相关子查询只对分页后的对话执行，每个对话走一次 messages.chat_id 索引，不会聚合整个 messages 表
+    message_count = (
+        select(func.count(Message.id)).where(Message.chat_id == Chat.id).correlate(Chat).scalar_subquery()
+    )
+    last_message_at = (
+        select(func.max(Message.updated_at)).where(Message.chat_id == Chat.id).correlate(Chat).scalar_subquery()
     )
-    return chats
+    rows = (
+        await db.execute(
+            select(Chat, message_count, last_message_at)
+            .where(Chat.user_id == current_user.id)
+            .order_by(Chat.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+    ).all()
+    return FastJSONResponse([
+        ChatSummaryResponse(
+            id=chat.id,
+            title=chat.title,
+            user_id=chat.user_id,
+            created_at=chat.created_at,
+            updated_at=chat.updated_at,
+            message_count=message_count or 0,
+            last_updated_at=max(chat.updated_at, last_message_at) if last_message_at else chat.updated_at,
+        )
+        for chat, message_count, last_message_at in rows
+    ])
 
 # 删除特定对话
 @router.delete("/{chat_id}", operation_id="delete_chat")
 async def delete_chat(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     chat_id: str,
     current_user: User = Depends(get_current_user)
 ) -> Any:
@@ -88,25 +166,27 @@ async def delete_chat(
     删除指定对话
     """
     chat = (
-        db.query(Chat)
-        .filter(
-            Chat.id == chat_id,
-            Chat.user_id == current_user.id
+        await db.execute(
+            select(Chat)
+            .where(
+                Chat.id == chat_id,
+                Chat.user_id == current_user.id
+            )
+            .options(selectinload(Chat.messages))
         )
-        .first()
-    )
+    ).scalars().first()
     if not chat:
         raise APIExceptions.USER_CHAT_NOT_FOUND_EXCEPTION
     
-    db.delete(chat)
-    db.commit()
+    await db.delete(chat)
+    await db.commit()
     return {"status": "success"}
 
 # 获取单个对话
 @router.get("/{chat_id}", response_model=ChatResponse, operation_id="get_chat")
 async def get_chat(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     chat_id: str,
     current_user: User = Depends(get_current_user)
 ):
@@ -114,22 +194,24 @@ async def get_chat(
     获取指定对话
     """
     chat = (
-        db.query(Chat)
-        .filter(
-            Chat.id == chat_id,
-            Chat.user_id == current_user.id
+        await db.execute(
+            select(Chat)
+            .where(
+                Chat.id == chat_id,
+                Chat.user_id == current_user.id
+            )
+            .options(selectinload(Chat.messages))
         )
-        .first()
-    )
+    ).scalars().first()
     if not chat:
         raise APIExceptions.USER_CHAT_NOT_FOUND_EXCEPTION
-    return chat
+    return orm_response(ChatResponse, chat)
 
 # 存入特定聊天（chat_id）的新消息
 @router.post("/message", response_model=MessageResponse, operation_id="create_message")
 async def create_message(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     message: MessageCreate,
     current_user: User = Depends(get_current_user)
 ):
@@ -137,13 +219,13 @@ async def create_message(
     上传对话历史
     """
     chat = (
-        db.query(Chat)
-        .filter(
-            Chat.id == message.chat_id,
-            Chat.user_id == current_user.id
+        await db.execute(
+            select(Chat.id).where(
+                Chat.id == message.chat_id,
+                Chat.user_id == current_user.id
+            )
         )
-        .first()
-    )
+    ).first()
     if not chat:
         raise APIExceptions.USER_CHAT_NOT_FOUND_EXCEPTION
     
@@ -160,8 +242,8 @@ async def create_message(
         meta_data=message.meta_data
     )
     db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
+    await db.commit()
+    await db.refresh(new_message)
     
     return MessageResponse(
         id=new_message.id,
@@ -173,11 +255,69 @@ async def create_message(
         updated_at=new_message.updated_at
     )
 
+# 批量存入消息
+@router.post("/message/batch", response_model=MessageBatchResponse, operation_id="create_messages_batch")
+async def create_messages_batch(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    batch: MessageBatchCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量上传对话历史，消息可以属于当前用户的多个对话。
+    每个对话只校验一次归属，全部消息在一个事务中用一条批量 INSERT 写入，任何一条不合法时全部不写入。
+    """
+    if not batch.messages:
+        return MessageBatchResponse(ids=[], count=0)
+    if len(batch.messages) > Config.MESSAGE_BATCH_MAX_SIZE:
+        raise APIExceptions.create_custom_exception(
+            status_code=413,
+            detail=f"Too many messages in one batch (max {Config.MESSAGE_BATCH_MAX_SIZE})",
+        )
+
+    # 验证 role 是否合法
+    valid_roles = {"system", "user", "assistant"}
+    if any(message.role not in valid_roles for message in batch.messages):
+        raise APIExceptions.INVALID_ROLE_EXCEPTION
+
+    # 一次查询校验所有涉及的对话都属于当前用户
+    chat_ids = {message.chat_id for message in batch.messages}
+    owned = set(
+        (
+            await db.execute(
+                select(Chat.id).where(
+                    Chat.id.in_(chat_ids),
+                    Chat.user_id == current_user.id
+                )
+            )
+        ).scalars().all()
+    )
+    if owned != chat_ids:
+        raise APIExceptions.USER_CHAT_NOT_FOUND_EXCEPTION
+
+    # 在应用侧生成 ID 和时间，省去逐条 refresh；时间按顺序递增 1 微秒，保持批内顺序
+    now = get_current_beijing_time()
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "chat_id": message.chat_id,
+            "role": message.role,
+            "content": message.content,
+            "meta_data": message.meta_data,
+            "created_at": now + timedelta(microseconds=i),
+            "updated_at": now + timedelta(microseconds=i),
+        }
+        for i, message in enumerate(batch.messages)
+    ]
+    await db.execute(insert(Message), rows)
+    await db.commit()
+    return MessageBatchResponse(ids=[row["id"] for row in rows], count=len(rows))
+
 # 检查对话是否存在
 @router.get("/{chat_id}/exists", operation_id="check_chat_exists")
 async def check_chat_exists(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     chat_id: str,
     current_user: User = Depends(get_current_user)
 ) -> dict:
@@ -186,12 +326,78 @@ async def check_chat_exists(
     不返回对话内容，仅确认存在性。
     """
     chat = (
-        db.query(Chat)
-        .filter(
-            Chat.id == chat_id,
-            Chat.user_id == current_user.id
+        await db.execute(
+            select(Chat.id).where(
+                Chat.id == chat_id,
+                Chat.user_id == current_user.id
+            )
         )
-        .first()
-    )
+    ).first()
+
+    return {"exists": chat is not None}
+
+# 按游标分页获取对话消息
+@router.get("/{chat_id}/messages", response_model=MessagePageResponse, operation_id="list_chat_messages")
+async def get_chat_messages(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    chat_id: str,
+    current_user: User = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """
+    按 (created_at, id) 键集分页获取对话消息，返回的消息按时间升序排列。
+    - 不传 before / after：返回最新的 limit 条消息（先加载对话末尾）；
+    - before: 返回该游标之前（更早）的消息，用于向前翻页；
+    - after: 返回该游标之后（更新）的消息。
+    每页只按 messages(chat_id, created_at) 索引扫描 limit + 1 行，与对话长度无关。
+    created_at 为微秒精度（迁移 0004），id 只在时间完全相同时作为稳定的次序。
+    """
+    if before and after:
+        raise APIExceptions.INVALID_CURSOR_EXCEPTION
+    chat = (
+        await db.execute(
+            select(Chat.id).where(
+                Chat.id == chat_id,
+                Chat.user_id == current_user.id
+            )
+        )
+    ).first()
+    if not chat:
+        raise APIExceptions.USER_CHAT_NOT_FOUND_EXCEPTION
+
+    query = select(Message).where(Message.chat_id == chat_id)
+    if after:
+        created_at, message_id = decode_message_cursor(after)
+        query = query.where(or_(
+            Message.created_at > created_at,
+            and_(Message.created_at == created_at, Message.id > message_id),
+        )).order_by(Message.created_at.asc(), Message.id.asc())
+    else:
+        if before:
+            created_at, message_id = decode_message_cursor(before)
+            query = query.where(or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.id < message_id),
+            ))
+        # 从游标（或对话末尾）往前取，返回前再反转为升序
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+    # 多取一条，用来判断该方向上是否还有更多消息
+    messages = list((await db.execute(query.limit(limit + 1))).scalars().all())
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not after:
+        messages.reverse()
 
-    return {"exists": chat is not None}
\ No newline at end of file
+    page = MessagePageResponse(messages=[MessageResponse.model_validate(message) for message in messages])
+    if messages:
+        if after:
+            page.prev_cursor = encode_message_cursor(messages[0])
+            page.next_cursor = encode_message_cursor(messages[-1]) if has_more else None
+        else:
+            page.prev_cursor = encode_message_cursor(messages[0]) if has_more else None
+            # 通过 before 翻页时，游标指向的消息及其之后的消息都比本页更新
+            page.next_cursor = encode_message_cursor(messages[-1]) if before else None
+    return FastJSONResponse(page)
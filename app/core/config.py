@@ -7,6 +7,9 @@ from pydantic import ConfigDict
 # 加载 .env 文件
 load_dotenv()
 
+# 项目根目录：默认的数据文件路径相对于它，而不是进程的工作目录
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
 class Settings(BaseSettings):
     model_config = ConfigDict(env_file=".env")
     
@@ -19,6 +22,23 @@ class Settings(BaseSettings):
     FASTAPI_SERVER_URL: str = os.getenv("FASTAPI_SERVER_URL", "0.0.0.0")
     FASTAPI_SERVER_PORT: int  = int(os.getenv("FASTAPI_SERVER_PORT", 8000))
     FASTAPI_SERVER_URI_PORT: Optional[str] = None
+    # 生产环境启动参数（python -m app.serve）
+    SERVER_WORKERS: Optional[int] = None  # worker 进程数，None 为可用 CPU 核数；多 worker 时 CONVERSATION_BACKEND 应为 redis
+    SERVER_LOOP: str = "uvloop"  # 事件循环：uvloop / asyncio / auto
+    SERVER_HTTP: str = "httptools"  # HTTP 解析器：httptools / h11 / auto
+    SERVER_BACKLOG: int = 2048  # 监听队列长度
+    SERVER_KEEPALIVE: int = 5  # 空闲 keep-alive 连接保持时间（秒）
+    SERVER_TIMEOUT: int = 60  # worker 超过该时间（秒）没有心跳时被主进程杀死并重启
+    SERVER_GRACEFUL_TIMEOUT: int = 30  # 停止 / 重启 worker 时等待进行中请求完成的最长时间（秒）
+    SERVER_MAX_REQUESTS: int = 0  # worker 处理该数量的请求后重启，0 表示不限制
+    SERVER_MAX_REQUESTS_JITTER: int = 0  # 在 SERVER_MAX_REQUESTS 上增加的随机量，避免所有 worker 同时重启
+    SERVER_MAX_WORKER_MEMORY_MB: int = 2048  # worker 常驻内存超过该值（MB）后优雅重启，0 表示不限制
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"  # 信任其 X-Forwarded-* 头的代理 IP，逗号分隔
+    SERVER_ACCESS_LOG: bool = True
+    # 阶段耗时统计（/metrics）：多 worker 时各 worker 的数据写入该目录后汇总，未设置时只统计本进程；
+    # python -m app.serve 在多 worker 且未设置时自动使用临时目录
+    METRICS_MULTIPROCESS_DIR: Optional[str] = None
+    METRICS_FLUSH_INTERVAL: float = 5.0  # worker 写入数据的间隔（秒）
     @property
     def get_api_url(self) -> str:
         if self.FASTAPI_SERVER_URI_PORT:
@@ -34,9 +54,22 @@ class Settings(BaseSettings):
     OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL")
     OPENAI_GPT_MODEL: str = "gpt-4o-mini"
     MAX_TOKENS: int = 150
-    # TEMPERATURE = 0.7
+    TEMPERATURE: float = 0.7
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-large"
-    EMBEDDING_DIMENSION: int = 3072
+    # 嵌入维度。小于模型原生维度（text-embedding-3-large 为 3072）时请求缩短的嵌入，
+    # 向量库需要用相同维度重新导入（或用 app/db/vector_index.py 构建同维度的本地索引）
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", 3072))
+    # 嵌入缓存：进程内 LRU（容量 + TTL）+ 磁盘 float32 存储（多个 worker 共享）
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_SIZE: int = 2048  # 进程内缓存最大条目数
+    EMBEDDING_CACHE_TTL: int = 86400  # 进程内缓存条目存活时间（秒）
+    EMBEDDING_CACHE_PATH: Optional[str] = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(PROJECT_ROOT, "data", "embedding_cache.sqlite3"))  # 为空时不使用磁盘缓存
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES: int = 100000  # 磁盘缓存最大条目数
+    # 嵌入请求合并：把并发请求攒成一次批量调用
+    EMBEDDING_COALESCER_ENABLED: bool = True
+    EMBEDDING_BATCH_MAX_SIZE: int = 64  # 单批最大文本数
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0  # 攒批最长等待时间（毫秒）
+    EMBEDDING_BATCH_MAX_CONCURRENCY: int = 4  # 同时在途的批量请求数
     # Milvus
     MILVUS_SERVICE_URI: str = os.getenv("MILVUS_SERVICE_URI")
     MILVUS_TOKEN_ROOT: str = os.getenv("MILVUS_TOKEN_ROOT")
@@ -44,14 +77,58 @@ class Settings(BaseSettings):
     MILVUS_COLLECTION_NAME_CFLP: str = "collection_cflp"
     MILVUS_DB_NAME_CFLP: str = "database_cflp"
     MILVUS_SEARCH_TOP_K: int = 5
+    MILVUS_HEALTH_CHECK_INTERVAL: float = 30.0  # 长连接健康检查间隔（秒）
+    MILVUS_VECTOR_FIELD: str = "vector"  # 集合中向量字段的名称（导出本地索引时使用）
+    # 向量检索后端："milvus" 或 "mmap"（进程内内存映射索引，见 app/db/vector_index.py）
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "milvus")
+    VECTOR_INDEX_PATH: str = os.getenv("VECTOR_INDEX_PATH", os.path.join(PROJECT_ROOT, "data", "vector_index"))  # 相对路径相对于项目根目录
+    VECTOR_INDEX_NLIST: int = 0  # 构建索引时的 IVF 分区数，0 表示全量扫描
+    VECTOR_INDEX_NPROBE: int = 8  # 开启 IVF 时每次检索扫描的分区数
+    VECTOR_INDEX_QUANTIZATION: str = "none"  # 构建索引时的量化方式：none / int8（省内存，延迟与 none 相当）/ binary（省内存且更快，需精排）
+    VECTOR_INDEX_RESCORE_FACTOR: int = 4  # 量化粗排后取 top_k * 该系数个候选用 float32 精排，0 表示不精排
+    # 混合检索：BM25 关键字检索与向量检索并行执行，结果按倒数排名融合（RRF）合并
+    HYBRID_RETRIEVAL_ENABLED: bool = True
+    HYBRID_CANDIDATE_K: int = 20  # 融合前每路检索返回的候选数
+    KEYWORD_SEARCH_TOP_K: int = 20  # 关键字检索默认返回条目数
+    KEYWORD_MAX_DF_RATIO: float = 0.5  # 出现在超过该比例条目中的词视为停用词
+    KEYWORD_INDEX_RETRY_SECONDS: float = 60.0  # 关键字索引构建失败后，等待该时间（秒）再重试
+    RRF_K: int = 60  # RRF 平滑常数
+    # 上下文组装：去重、按相似度阈值过滤后，按得分把答案装入 token 预算
+    CONTEXT_TOKEN_BUDGET: int = 1500  # 拼入 Prompt 的知识最多占用的 token 数
+    CONTEXT_MIN_SCORE: float = 0.3  # 向量相似度低于该值的命中不进入上下文（仅关键字命中的条目不受影响）
+    CONTEXT_MAX_ITEMS: int = 8  # 最多拼入的知识条数
+    # 知识库版本，重新导入知识库后需修改，使依赖旧知识的缓存失效
+    KNOWLEDGE_COLLECTION_VERSION: str = os.getenv("KNOWLEDGE_COLLECTION_VERSION", "1")
+    # 语义答案缓存：相似问题直接复用之前的回答
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # 命中所需的最小余弦相似度
+    SEMANTIC_CACHE_MAX_SIZE: int = 1024  # 最大缓存条目数，满后按 LRU 淘汰
+    SEMANTIC_CACHE_TTL: int = 86400  # 条目存活时间（秒）
     # conversation_manager
     MAX_CONTENT_LENGTH: int = 4096
+    CONVERSATION_MAX_LIVE: int = 10000  # 进程内最多保留的对话数，超出后按 LRU 淘汰
+    CONVERSATION_TTL: int = 3600  # 对话闲置超过该时间（秒）后失效
+    CONVERSATION_SHARDS: int = 16  # 分片数，每个分片独立加锁
+    # 对话历史后端：memory（进程内，只适合单 worker）或 redis（多个 worker / 副本共享）
+    CONVERSATION_BACKEND: str = os.getenv("CONVERSATION_BACKEND", "memory")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     # MySQL
     MYSQL_HOST: str = os.getenv("MYSQL_HOST", "cflp_mysql_server")
     MYSQL_PORT: int = int(os.getenv("MYSQL_PORT", 3306))
     MYSQL_USER: str = os.getenv("MYSQL_USER", "dthghjc")
     MYSQL_PASSWORD: str = os.getenv("MYSQL_PASSWORD", "24Khjcmysql")
     MYSQL_DATABASE: str = "CFLP"
+    # SQLClient 连接池
+    MYSQL_POOL_SIZE: int = int(os.getenv("MYSQL_POOL_SIZE", 10))
+    MYSQL_POOL_TIMEOUT: float = 10.0  # 连接池耗尽时等待空闲连接的最长时间（秒）
+    MYSQL_POOL_PING_AFTER: float = 30.0  # 空闲超过该时间（秒）的连接借出前先 ping 检查，需小于 MySQL 的 wait_timeout
+    # SQLAlchemy 连接池（auth / chats 路由使用的异步引擎）
+    SQLALCHEMY_POOL_SIZE: int = int(os.getenv("SQLALCHEMY_POOL_SIZE", 10))
+    SQLALCHEMY_MAX_OVERFLOW: int = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", 20))  # 连接池满后允许额外创建的连接数
+    SQLALCHEMY_POOL_TIMEOUT: float = 10.0  # 等待空闲连接的最长时间（秒）
+    SQLALCHEMY_POOL_RECYCLE: int = 1800  # 连接使用超过该时间（秒）后重建，需小于 MySQL 的 wait_timeout
+    SQLALCHEMY_POOL_PRE_PING: bool = True  # 借出连接前先检查连接是否可用
+    READINESS_CHECK_TIMEOUT: float = 2.0  # 就绪探针中每项依赖检查的超时时间（秒）
     # 数据库连接 URL，使用 Optional[str] 的原因是在没有设定 MYSQL_HOST 时，SQLALCHEMY_DATABASE_URI 会被设置为 None，方便if判断。
     SQLALCHEMY_DATABASE_URI: Optional[str] = None
     
@@ -64,12 +141,37 @@ class Settings(BaseSettings):
             return self.SQLALCHEMY_DATABASE_URI
         else:
             return f"mysql+mysqlconnector://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
+
+    @property
+    def get_async_database_url(self) -> str:
+        """
+        获取适用于 SQLAlchemy 异步引擎的数据库连接 URL（aiomysql 驱动）
+        """
+        if self.SQLALCHEMY_DATABASE_URI:
+            return self.SQLALCHEMY_DATABASE_URI.replace("mysql+mysqlconnector://", "mysql+aiomysql://", 1)
+        return f"mysql+aiomysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
         
+    # 批量写入消息时单次请求允许的最大消息数
+    MESSAGE_BATCH_MAX_SIZE: int = 1000
+
     # JWT
     SECRET_KEY: str = os.getenv("SECRET_KEY", "f7a8b9c0d1e2f3g4h5i6j7k8l9m0n1o2p3q4r5s6t7u8v9w0x1y2z3")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 10080))
-    
+
+    # 密码哈希（bcrypt）
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))  # 代价因子，每加 1 计算量翻倍；只影响新生成的哈希
+    # 每个 worker 的进程池大小；0 表示改用线程池。None 时单进程为 CPU 核数，python -m app.serve 启动时为 CPU 核数 / worker 数
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))  # 执行中 + 排队的任务上限，超出时返回 503
+
+    # 已验证令牌缓存：重复使用的令牌跳过签名验证，<= 0 表示不缓存
+    TOKEN_CACHE_MAX_SIZE: int = int(os.getenv("TOKEN_CACHE_MAX_SIZE", 10000))
+
+    # 已认证用户缓存（get_current_user），<= 0 表示不缓存
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
+    USER_CACHE_TTL: float = float(os.getenv("USER_CACHE_TTL", 30))  # 秒；其他 worker 修改用户后，本进程最多在该时间内读到旧数据
+
     # 邀请码，从环境变量获取后以逗号分隔
     invite_codes: str = os.getenv("INVITE_CODES", "")
     
@@ -0,0 +1,280 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import functools
+import glob
+import inspect
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+from app.core.config import Config
+
+"""
+热路径各阶段的耗时统计。
+- stage("embedding") / instrument("llm"): 记录一个阶段的耗时，写入直方图 cflp_stage_duration_seconds{stage=...}，
+  同时累加到当前请求的阶段耗时中（同一请求内同名阶段的耗时相加，并行阶段各自计时）；
+- MetricsMiddleware: 为每个 HTTP 请求记录 cflp_http_request_duration_seconds，并在响应头中加入
+  Server-Timing（如 embedding;dur=12.3, vector_search;dur=4.1, total;dur=830.2），浏览器开发者工具可直接查看；
+- render_metrics: 以 Prometheus 文本格式输出全部直方图，由 GET /metrics 返回。
+每次记录只有一次 perf_counter、一次二分查找和几次加法，常开的开销可以忽略。
+直方图按进程统计；多 worker（python -m app.serve）时设置 METRICS_MULTIPROCESS_DIR，
+各 worker 定期把自己的数据写入该目录，/metrics 汇总所有 worker（包括已退出的 worker，计数器保持单调）。
+"""
+
+logger = logging.getLogger(__name__)
+
+# 覆盖从本地缓存命中（毫秒级）到大模型长回复（数十秒）的范围
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """
+    按标签分组的累积直方图，线程安全。
+    """
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 标签值 -> [各桶计数（最后一个为 +Inf）, 总和, 总数]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            return {labels: [list(counts), total, count] for labels, (counts, total, count) in self._series.items()}
+
+    def render(self, series: Dict[Tuple[str, ...], list]) -> Iterable[str]:
+        """
+        以 Prometheus 文本格式输出给定的数据（通常为 snapshot 或多个 worker 的汇总）。
+        """
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels in sorted(series):
+            counts, total, count = series[labels]
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}'
+            suffix = f"{{{label_text}}}" if label_text else ""
+            yield f"{self.name}_sum{suffix} {total}"
+            yield f"{self.name}_count{suffix} {count}"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+STAGE_DURATION = Histogram(
+    "cflp_stage_duration_seconds", "Duration of hot-path stages (embedding, vector search, LLM, SQL, ...)", ("stage",)
+)
+REQUEST_DURATION = Histogram(
+    "cflp_http_request_duration_seconds", "HTTP request duration until the response is fully sent", ("method", "route", "status")
+)
+HISTOGRAMS = (STAGE_DURATION, REQUEST_DURATION)
+
+# 当前请求中各阶段的累计耗时（秒），由 MetricsMiddleware 在请求开始时设置
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def record_stage(name: str, seconds: float):
+    STAGE_DURATION.observe((name,), seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+    _ensure_flusher()
+
+class stage:
+    """
+    记录一个阶段的耗时：with stage("prompt_assembly"): ...
+    在 async 函数中包住 await 同样适用。
+    """
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.name, time.perf_counter() - self._start)
+        return False
+
+def instrument(name: str):
+    """
+    记录函数耗时的装饰器，支持普通函数、协程函数，以及同步 / 异步生成器（从开始迭代到迭代结束）。
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with stage(name):
+                    yield from func(*args, **kwargs)
+            return generator_wrapper
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def asyncgen_wrapper(*args, **kwargs):
+                with stage(name):
+                    async for item in func(*args, **kwargs):
+                        yield item
+            return asyncgen_wrapper
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+class MetricsMiddleware:
+    """
+    ASGI 中间件：记录请求耗时，并在响应头中加入 Server-Timing。
+    流式响应的响应头在生成开始前发出，其中只包含检索等已完成阶段的耗时。
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            # 使用路由模板（如 /v1/chats/{chat_id}）而不是实际路径，避免标签数量无限增长
+            route = scope.get("route")
+            REQUEST_DURATION.observe(
+                (scope["method"], getattr(route, "path", "unmatched"), str(status)), time.perf_counter() - start
+            )
+            _ensure_flusher()
+
+# ---------------- 多 worker 汇总 ----------------
+
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+def _snapshot_path(directory: str) -> str:
+    return os.path.join(directory, f"metrics_{os.getpid()}.json")
+
+def write_snapshot(directory: str):
+    """
+    把本进程的直方图数据原子地写入 directory。
+    """
+    data = {h.name: [[list(labels), series] for labels, series in h.snapshot().items()] for h in HISTOGRAMS}
+    path = _snapshot_path(directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _flush_loop(directory: str, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            write_snapshot(directory)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+
+def _ensure_flusher():
+    """
+    配置了 METRICS_MULTIPROCESS_DIR 时，在第一次记录后启动定期写入快照的后台线程（在 worker 进程中启动）。
+    """
+    global _flusher_started
+    if _flusher_started or not Config.METRICS_MULTIPROCESS_DIR:
+        return
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        os.makedirs(Config.METRICS_MULTIPROCESS_DIR, exist_ok=True)
+        threading.Thread(
+            target=_flush_loop,
+            args=(Config.METRICS_MULTIPROCESS_DIR, Config.METRICS_FLUSH_INTERVAL),
+            name="metrics-flusher",
+            daemon=True,
+        ).start()
+        _flusher_started = True
+
+def _merge_snapshots(directory: str) -> Dict[str, Dict[Tuple[str, ...], list]]:
+    merged: Dict[str, Dict[Tuple[str, ...], list]] = {h.name: {} for h in HISTOGRAMS}
+    for path in glob.glob(os.path.join(directory, "metrics_*.json")):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, entries in data.items():
+            target = merged.setdefault(name, {})
+            for labels, (counts, total, count) in entries:
+                series = target.setdefault(tuple(labels), [[0] * len(counts), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+    return merged
+
+def clear_multiprocess_dir(directory: Optional[str] = None):
+    """
+    删除上一次运行留下的快照（服务主进程启动时调用）。
+    """
+    directory = directory or Config.METRICS_MULTIPROCESS_DIR
+    if directory:
+        for path in glob.glob(os.path.join(directory, "metrics_*.json*")):
+            os.remove(path)
+
+def render_metrics() -> str:
+    """
+    以 Prometheus 文本格式输出全部直方图；多 worker 时汇总目录中所有 worker 的数据。
+    """
+    directory = Config.METRICS_MULTIPROCESS_DIR
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        write_snapshot(directory)
+        merged = _merge_snapshots(directory)
+        lines = [line for h in HISTOGRAMS for line in h.render(merged.get(h.name, {}))]
+    else:
+        lines = [line for h in HISTOGRAMS for line in h.render(h.snapshot())]
+    return "\n".join(lines) + "\n"
+
+if __name__ == "__main__":
+    with stage("embedding"):
+        time.sleep(0.01)
+    print(render_metrics())
@@ -0,0 +1,110 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from bcrypt import checkpw, gensalt, hashpw
+
+"""
+bcrypt 密码哈希和验证。
+每次 bcrypt 计算需要上百毫秒 CPU，在 async def 路由中直接调用会阻塞事件循环，拖慢同一 worker 上的所有请求。
+PasswordHasher 把计算交给有界的进程池，多个登录请求可以同时利用多个 CPU 核；
+排队中的任务数超过上限时直接拒绝（PasswordHasherBusyError），避免登录洪峰把请求积压在内存中。
+本模块只依赖 bcrypt，进程池使用 spawn 启动子进程（不继承父进程的线程和连接），子进程只需导入本模块；
+与所有 spawn 进程池一样，直接运行的入口脚本需要用 if __name__ == "__main__" 保护启动代码。
+"""
+
+def hash_password(password: str, rounds: int = 12) -> str:
+    """
+    :param password: 明文密码
+    :param rounds: bcrypt 代价因子（log2 迭代次数），每加 1 计算量翻倍
+    :return: 哈希后的密码
+    """
+    return hashpw(password.encode(), gensalt(rounds)).decode()
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    验证明文密码与哈希密码是否一致（代价因子取自哈希值本身）。
+    """
+    return checkpw(plain_password.encode(), hashed_password.encode())
+
+class PasswordHasherBusyError(RuntimeError):
+    """
+    排队中的密码计算任务已达上限。
+    """
+
+class PasswordHasher:
+    """
+    在进程池中执行 bcrypt 计算，供异步代码使用。进程池在第一次使用时创建。
+    """
+    def __init__(self, rounds: int = 12, max_workers: Optional[int] = None, max_pending: int = 64):
+        """
+        :param rounds: 新生成哈希的 bcrypt 代价因子
+        :param max_workers: 进程数，None 表示 CPU 核数；<= 0 表示不使用进程池，在线程池中计算
+        :param max_pending: 最多同时提交（执行中 + 排队）的任务数，<= 0 表示不限制
+        """
+        self.rounds = rounds
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        # 统计
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self._max_workers is not None and self._max_workers <= 0:
+            return None  # run_in_executor(None, ...) 使用事件循环默认的线程池
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self._max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self._max_pending > 0 and self._pending >= self._max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusyError(f"Too many pending password operations ({self._pending})")
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(check_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._pending, "completed": self.completed, "rejected": self.rejected}
+
+    def close(self):
+        """
+        关闭进程池（应用关闭时调用），等待执行中的任务完成。
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+if __name__ == "__main__":
+    async def main():
+        hasher = PasswordHasher(rounds=10)
+        hashed = await hasher.hash("secret")
+        print(hashed, await hasher.verify("secret", hashed))
+        print(hasher.stats())
+        hasher.close()
+    asyncio.run(main())
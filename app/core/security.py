@@ -6,7 +6,8 @@ from fastapi import Depends, HTTPException, status, Security
 from fastapi.security import OAuth2PasswordBearer, APIKeyHeader  # FastAPI 提供的安全工具，分别处理 OAuth2 令牌和 API Key。
 from sqlalchemy.orm import Session
 import pytz
-from bcrypt import hashpw, gensalt, checkpw
+from app.core.token_cache import key_fingerprint, token_cache
+from app.core.password_hashing import PasswordHasher, check_password, hash_password
 
 from app.db.session import get_db
 from app.models.user import User
@@ -48,7 +49,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     使用 bcrypt 验证明文密码与哈希密码是否一致。
     内部会重新计算哈希并比较，确保安全性。
     """
-    return checkpw(plain_password.encode(), hashed_password.encode())
+    return check_password(plain_password, hashed_password)
 
 # 生成哈希密码
 def get_password_hash(password: str) -> str:
@@ -59,7 +60,15 @@ def get_password_hash(password: str) -> str:
     使用 bcrypt 对明文密码进行哈希，生成安全的密码存储格式。
     """
     # return pwd_context.hash(password)
-    return hashpw(password.encode(), gensalt()).decode()
+    return hash_password(password, Config.BCRYPT_ROUNDS)
+
+# 异步路由中使用 password_hasher.hash / password_hasher.verify，bcrypt 计算在进程池中执行，不阻塞事件循环
+password_hasher = PasswordHasher(
+    rounds=Config.BCRYPT_ROUNDS,
+    max_workers=Config.PASSWORD_HASH_WORKERS,
+    max_pending=Config.PASSWORD_HASH_MAX_PENDING,
+)
+
 # 创建访问token
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -83,4 +92,20 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         HS256 是常用的 HMAC SHA-256 算法。
     """
     encoded_jwt = jwt.encode(to_encode, Config.SECRET_KEY, algorithm=Config.ALGORITHM)
-    return encoded_jwt 
+    return encoded_jwt
+
+# 解码并验证访问token
+def decode_access_token(token: str) -> dict:
+    """
+    token: str: 客户端提交的 JWT。
+    返回值: dict，验证通过的 payload。
+    同一个令牌只在第一次使用时验证签名，之后直接从 token_cache 取出 payload（令牌过期后失效）；
+    SECRET_KEY 或 ALGORITHM 变化时缓存自动清空。
+    令牌无效或已过期时抛出 JWTError。
+    """
+    fingerprint = key_fingerprint(Config.SECRET_KEY, Config.ALGORITHM)
+    payload = token_cache.get(token, fingerprint)
+    if payload is None:
+        payload = jwt.decode(token, Config.SECRET_KEY, algorithms=[Config.ALGORITHM])
+        token_cache.set(token, fingerprint, payload)
+    return payload
@@ -0,0 +1,109 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+from app.core.config import Config
+
+"""
+已验证令牌缓存：客户端在有效期内（默认 7 天）反复使用同一个 JWT，签名只需要验证一次。
+以令牌的 SHA-256 摘要为键缓存解码后的 payload，命中时跳过 jwt.decode 的签名计算；
+条目在令牌的 exp 时间失效，容量受 TOKEN_CACHE_MAX_SIZE 限制，按 LRU 淘汰。
+缓存与签名密钥（SECRET_KEY + ALGORITHM）绑定，密钥变化（轮换）时清空全部条目。
+"""
+
+@lru_cache(maxsize=8)
+def key_fingerprint(secret_key: str, algorithm: str) -> str:
+    return hashlib.sha256(f"{algorithm}:{secret_key}".encode()).hexdigest()
+
+class TokenCache:
+    """
+    令牌摘要 -> payload 的 LRU 缓存，线程安全。
+    """
+    def __init__(self, max_size: int = Config.TOKEN_CACHE_MAX_SIZE):
+        """
+        :param max_size: 最大缓存令牌数，<= 0 表示不缓存
+        """
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 令牌摘要 -> (payload, 过期时间戳)
+        self._fingerprint: Optional[str] = None
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def _check_key(self, fingerprint: str):
+        """
+        签名密钥变化时清空缓存。调用方需持有 self._lock。
+        """
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._fingerprint = fingerprint
+
+    def get(self, token: str, fingerprint: str) -> Optional[dict]:
+        """
+        :param fingerprint: 当前签名密钥的指纹（key_fingerprint）
+        :return: 已验证的 payload 副本，未命中或令牌已过期时返回 None
+        """
+        digest = self._digest(token)
+        with self._lock:
+            self._check_key(fingerprint)
+            entry = self._entries.get(digest)
+            if entry is not None and time.time() >= entry[1]:
+                del self._entries[digest]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return dict(entry[0])
+
+    def set(self, token: str, fingerprint: str, payload: dict):
+        """
+        缓存签名验证通过的 payload。没有 exp 的令牌不缓存。
+        """
+        expires_at = payload.get("exp")
+        if self._max_size <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        digest = self._digest(token)
+        with self._lock:
+            self._check_key(fingerprint)
+            self._entries[digest] = (dict(payload), expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+token_cache = TokenCache()
+
+if __name__ == "__main__":
+    cache = TokenCache(max_size=2)
+    fingerprint = key_fingerprint("secret", "HS256")
+    cache.set("token", fingerprint, {"sub": "alice", "exp": time.time() + 60})
+    print(cache.get("token", fingerprint), cache.get("token", key_fingerprint("rotated", "HS256")))
+    print(cache.stats())
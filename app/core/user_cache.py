@@ -0,0 +1,117 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import event, inspect
+from app.core.config import Config
+from app.models.user import User
+
+"""
+已认证用户缓存：get_current_user 按令牌中的 sub（用户名）缓存查询到的用户，命中时省去一次 users 查询。
+- 容量受 USER_CACHE_MAX_SIZE 限制，按 LRU 淘汰；条目超过 USER_CACHE_TTL 后失效；
+- 通过 ORM 修改或删除用户（包括停用）时，本进程内对应的条目立即失效；
+  其他 worker / 副本中的条目依靠较短的 TTL 失效，绕过 ORM 直接改表时需调用 user_cache.invalidate。
+缓存的是与数据库会话无关的 User 副本，多个请求共用，只能读取，不能修改或加入会话。
+"""
+
+def detached_copy(user: User) -> User:
+    """
+    复制 User 的列属性，得到不属于任何会话的对象（原会话回滚或关闭不会影响副本）。
+    """
+    return User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+
+class UserCache:
+    """
+    用户名 -> User 的 LRU + TTL 缓存，线程安全。
+    """
+    def __init__(self, max_size: int = Config.USER_CACHE_MAX_SIZE, ttl: float = Config.USER_CACHE_TTL):
+        """
+        :param max_size: 最大缓存用户数，<= 0 表示不缓存
+        :param ttl: 条目存活时间（秒），<= 0 表示不缓存
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # username -> (User, 写入时间)
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_size > 0 and self._ttl > 0
+
+    def get(self, username: str) -> Optional[User]:
+        """
+        :return: 缓存的用户，未命中或已过期时返回 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and now - entry[1] > self._ttl:
+                del self._entries[username]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, username: str, user: User) -> User:
+        """
+        缓存用户的副本。
+        :return: 缓存的副本
+        """
+        user = detached_copy(user)
+        if not self.enabled:
+            return user
+        with self._lock:
+            self._entries[username] = (user, time.monotonic())
+            self._entries.move_to_end(username)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return user
+
+    def invalidate(self, username: str):
+        with self._lock:
+            if self._entries.pop(username, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+user_cache = UserCache()
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_modified_user(mapper, connection, target: User):
+    # 修改用户名时，旧用户名对应的条目同样失效
+    for username in {target.username, *inspect(target).attrs.username.history.deleted}:
+        if username is not None:
+            user_cache.invalidate(username)
+
+if __name__ == "__main__":
+    cache = UserCache(max_size=2, ttl=30)
+    cache.set("alice", User(id="1", username="alice", hashed_password="x", is_active=True))
+    print(cache.get("alice").id, cache.get("bob"))
+    print(cache.stats())
@@ -1,43 +1,190 @@
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
 from app.core.config import Config
 
-class ConversationManager:
+"""
+对话历史存储。
+- ConversationHistoryBackend: 对话历史后端的接口，通过 create_conversation_manager 按 CONVERSATION_BACKEND 选择实现；
+- ConversationManager: 进程内实现。按对话 ID 分片存储，每个分片一把锁，可以在线程池中并发访问。
+  每个分片是一个 LRU（OrderedDict），总对话数受 CONVERSATION_MAX_LIVE 限制，闲置超过 CONVERSATION_TTL 的对话失效；
+  每个对话维护内容总长度的计数器，修剪时只需增减，不再重新求和。
+- RedisConversationManager（app/db/redis_conversation_manager.py）: 多个 worker / 副本共享的实现。
+"""
+
+SYSTEM_PROMPT = "你是一个专业的问答助手，专注于基于已知信息回答用户的问题。"
+
+class ConversationHistoryBackend(ABC):
+    """
+    对话历史后端接口。get_history 返回的历史第一条始终为 system 消息。
+    """
+    @abstractmethod
+    def get_history(self, conversation_id: str) -> list:
+        """
+        获取对话历史（不存在时初始化）。
+        """
+
+    @abstractmethod
+    def update_history(self, conversation_id: str, query: str, response: str):
+        """
+        原子地追加一轮对话（用户查询和模型响应），并修剪到最大长度以内。
+        """
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """
+        返回后端的使用统计。
+        """
+
+    def close(self):
+        """
+        释放后端持有的连接等资源。
+        """
+
+    def ping(self):
+        """
+        检查后端是否可用（不可用时抛出异常），用于就绪探针。
+        """
+
+class _Conversation:
+    """
+    单个对话：system 消息之外的消息按时间顺序存放在 deque 中，total_length 为全部消息内容的长度之和。
+    """
+    __slots__ = ("system", "messages", "total_length", "last_access")
+
+    def __init__(self, now: float):
+        self.system = {"role": "system", "content": SYSTEM_PROMPT}
+        self.messages = deque()
+        self.total_length = len(SYSTEM_PROMPT)
+        self.last_access = now
+
+    def snapshot(self) -> list:
+        return [dict(self.system)] + [dict(message) for message in self.messages]
+
+class _Shard:
     def __init__(self):
-        self.history = {}
-        self.max_context_length = Config.MAX_CONTENT_LENGTH
+        self.lock = threading.Lock()
+        self.conversations = OrderedDict()
+
+class ConversationManager(ConversationHistoryBackend):
+    def __init__(
+        self,
+        max_context_length: int = Config.MAX_CONTENT_LENGTH,
+        max_conversations: int = Config.CONVERSATION_MAX_LIVE,
+        ttl: float = Config.CONVERSATION_TTL,
+        num_shards: int = Config.CONVERSATION_SHARDS,
+    ):
+        """
+        :param max_context_length: 单个对话保留的内容总长度上限（字符数）
+        :param max_conversations: 最多保留的对话数，按分片平均分配
+        :param ttl: 对话闲置多久（秒）后失效，<= 0 表示不过期
+        :param num_shards: 分片数
+        """
+        self.max_context_length = max_context_length
+        self._ttl = ttl
+        self._shards = [_Shard() for _ in range(max(1, num_shards))]
+        self._shard_capacity = max(1, -(-max_conversations // len(self._shards)))
+        # 统计
+        self._stats_lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _shard(self, conversation_id: str) -> _Shard:
+        return self._shards[hash(conversation_id) % len(self._shards)]
+
+    def _get_or_create(self, shard: _Shard, conversation_id: str, now: float) -> _Conversation:
+        """
+        取出（或新建）对话并标记为最近使用。调用方需持有 shard.lock。
+        """
+        conversation = shard.conversations.get(conversation_id)
+        if conversation is not None and self._ttl > 0 and now - conversation.last_access > self._ttl:
+            # 闲置过久，按新对话处理
+            del shard.conversations[conversation_id]
+            conversation = None
+            self._count("expirations")
+        if conversation is None:
+            conversation = shard.conversations[conversation_id] = _Conversation(now)
+            while len(shard.conversations) > self._shard_capacity:
+                shard.conversations.popitem(last=False)
+                self._count("evictions")
+        else:
+            shard.conversations.move_to_end(conversation_id)
+        conversation.last_access = now
+        return conversation
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
 
     def get_history(self, conversation_id: str):
-        # 初始化对话历史记录，如果没有的话
-        if conversation_id not in self.history:
-            self.history[conversation_id] = [
-                {
-                    "role": "system",
-                    "content": "你是一个专业的问答助手，专注于基于已知信息回答用户的问题。"
-                }
-            ]
-        self._trim_history(conversation_id)  # 确保历史记录符合最大长度限制
-        return self.history[conversation_id]
+        """
+        获取对话历史（不存在时初始化）。
+        :return: 历史消息的副本，第一条为 system 消息；调用方修改返回值不会影响已保存的历史
+        """
+        shard = self._shard(conversation_id)
+        with shard.lock:
+            conversation = self._get_or_create(shard, conversation_id, time.monotonic())
+            self._trim_history(conversation)  # 确保历史记录符合最大长度限制
+            return conversation.snapshot()
 
     def update_history(self, conversation_id: str, query: str, response: str):
-        # 更新对话历史
-        self.get_history(conversation_id)  # 确保历史初始化
-        self.history[conversation_id].append({"role": "user", "content": query})
-        self.history[conversation_id].append({"role": "assistant", "content": response})
-        self._trim_history(conversation_id)  # 更新历史后，检查并修剪
-
-    def _trim_history(self, conversation_id: str):
-        # 截取对话历史，确保其长度不超过最大限制
-        history = self.history[conversation_id]
-        total_length = sum(len(item["content"]) for item in history)
-        
-        # 保留"role": "system"部分，剔除多余的对话轮次
-        while total_length > self.max_context_length and len(history) > 1:
-            # 删除最早的对话轮次（user 和 assistant）
-            history.pop(1)
-            history.pop(1)
-            total_length = sum(len(item["content"]) for item in history)
+        """
+        追加一轮对话（用户查询和模型响应），并修剪到最大长度以内。
+        """
+        shard = self._shard(conversation_id)
+        with shard.lock:
+            conversation = self._get_or_create(shard, conversation_id, time.monotonic())
+            conversation.messages.append({"role": "user", "content": query})
+            conversation.messages.append({"role": "assistant", "content": response})
+            conversation.total_length += len(query) + len(response)
+            self._trim_history(conversation)  # 更新历史后，检查并修剪
+
+    def _trim_history(self, conversation: _Conversation):
+        # 保留"role": "system"部分，从最早的对话轮次（user 和 assistant）开始剔除，直到总长度不超过限制
+        messages = conversation.messages
+        while conversation.total_length > self.max_context_length and messages:
+            conversation.total_length -= len(messages.popleft()["content"])
+            if messages:
+                conversation.total_length -= len(messages.popleft()["content"])
+
+    def stats(self) -> dict:
+        """
+        返回当前保存的对话数、消息数、内容长度以及淘汰统计。
+        """
+        conversations = messages = content_length = content_bytes = 0
+        for shard in self._shards:
+            with shard.lock:
+                conversations += len(shard.conversations)
+                for conversation in shard.conversations.values():
+                    messages += len(conversation.messages) + 1
+                    content_length += conversation.total_length
+                    content_bytes += sum(sys.getsizeof(message["content"]) for message in conversation.messages)
+        with self._stats_lock:
+            return {
+                "conversations": conversations,
+                "messages": messages,
+                "content_length": content_length,
+                # 消息内容字符串实际占用的内存（不含 system 消息和容器本身）
+                "content_bytes": content_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+def create_conversation_manager() -> ConversationHistoryBackend:
+    """
+    按 CONVERSATION_BACKEND 创建对话历史后端：memory 为进程内存储（只适合单 worker），
+    redis 为多个 worker / 副本共享的存储。
+    """
+    if Config.CONVERSATION_BACKEND == "redis":
+        from app.db.redis_conversation_manager import RedisConversationManager
+        return RedisConversationManager.from_url(Config.REDIS_URL)
+    if Config.CONVERSATION_BACKEND != "memory":
+        raise ValueError(f"Unsupported conversation backend: {Config.CONVERSATION_BACKEND}")
+    return ConversationManager()
 
 if __name__ == "__main__":
     # 示例使用
@@ -50,3 +197,4 @@ if __name__ == "__main__":
     # 获取对话历史
     history = conversation_manager.get_history(conversation_id="conversation_1")
     print(history)
+    print(conversation_manager.stats())
@@ -0,0 +1,62 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import argparse
+import logging
+from app.db.mysql_client import SQLClient
+
+"""
+把 chat_history.conversation_history 中保存的旧格式消息迁移到 chat_history_messages（按行存储）。
+每个对话在单独的事务中迁移并锁定对话行，可以在服务运行时执行，也可以中断后重复执行。
+没有执行迁移的对话会在下一次追加消息时自动迁移。
+
+用法：
+    python app/db/migrate_chat_history.py --batch-size 500
+    python app/db/migrate_chat_history.py --dry-run
+"""
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def find_legacy_conversations(db_client: SQLClient, after_id: str, batch_size: int):
+    """
+    按 ID 顺序查找一批仍有旧格式消息（conversation_history 中不止 system 消息）的对话。
+    """
+    query = (
+        "SELECT id FROM chat_history WHERE id > %s AND JSON_LENGTH(conversation_history) > 1 "
+        "ORDER BY id LIMIT %s"
+    )
+    return [row['id'] for row in db_client.execute_query(query, (after_id, batch_size), fetch=True)]
+
+def migrate(batch_size: int = 500, dry_run: bool = False):
+    """
+    迁移全部旧格式对话。
+    :param batch_size: 每次查询的对话数
+    :param dry_run: 只统计需要迁移的对话数，不写入
+    :return: (迁移的对话数, 迁移的消息数)
+    """
+    db_client = SQLClient()
+    conversations = messages = 0
+    after_id = ""
+    try:
+        while True:
+            batch = find_legacy_conversations(db_client, after_id, batch_size)
+            if not batch:
+                break
+            for conversation_id in batch:
+                if not dry_run:
+                    messages += db_client.migrate_conversation(conversation_id)
+                conversations += 1
+            after_id = batch[-1]
+            logger.info(f"Processed {conversations} conversations, {messages} messages migrated")
+    finally:
+        db_client.close()
+    return conversations, messages
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 chat_history 的 JSON 历史迁移为按行存储")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="只统计需要迁移的对话数")
+    args = parser.parse_args()
+    conversations, messages = migrate(batch_size=args.batch_size, dry_run=args.dry_run)
+    print(f"{'需要迁移' if args.dry_run else '已迁移'}的对话数: {conversations}，消息数: {messages}")
@@ -5,14 +5,175 @@ import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from app.core.config import Config
-from pymilvus import MilvusClient
+from app.core.metrics import instrument
+from pymilvus import AsyncMilvusClient, MilvusClient, MilvusException
+import asyncio
 import logging
+import threading
+import time
+from typing import Optional
 # 配置日志
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class MilvusClientRegistry:
+    """
+    进程级 Milvus 客户端注册表。
+    每个 (uri, db_name, collection_name) 只保留一个长连接的 MilvusClient，供所有请求复用；
+    距上次检查超过 health_check_interval 秒时做一次健康检查，失败则重建连接。
+    """
+    def __init__(self, health_check_interval: float = Config.MILVUS_HEALTH_CHECK_INTERVAL):
+        """
+        :param health_check_interval: 健康检查间隔（秒）
+        """
+        self._health_check_interval = health_check_interval
+        self._clients = {}  # key -> [MilvusClient, 上次健康检查时间]
+        # _lock 只保护 _clients / _key_locks 的短暂读写；健康检查和建立连接等网络 IO 只持有对应 key 的锁，
+        # 一个慢或不可达的 Milvus 端点不会阻塞其他集合的请求
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> threading.Lock
+
+    def _fresh_client(self, key) -> Optional[MilvusClient]:
+        # 不加锁读取：dict.get 和读取列表元素是原子操作
+        entry = self._clients.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self._health_check_interval:
+            return entry[0]
+        return None
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, uri: str, token: str, db_name: str, collection_name: str) -> MilvusClient:
+        """
+        获取（必要时创建）指定集合的 Milvus 客户端。
+        :return: 可用的 MilvusClient
+        """
+        key = (uri, db_name, collection_name)
+        client = self._fresh_client(key)
+        if client is not None:
+            return client
+        with self._key_lock(key):
+            # 等待期间其他线程可能已经完成了检查或重建
+            client = self._fresh_client(key)
+            if client is not None:
+                return client
+            entry = self._clients.get(key)
+            if entry is not None:
+                client = entry[0]
+                if self._is_healthy(client, collection_name):
+                    entry[1] = time.monotonic()
+                    return client
+                logger.warning(f"Milvus client for {key} is unhealthy, reconnecting")
+                with self._lock:
+                    if self._clients.get(key) is entry:
+                        del self._clients[key]
+                self._close_client(client)
+            client = MilvusClient(uri=uri, token=token, db_name=db_name)
+            with self._lock:
+                self._clients[key] = [client, time.monotonic()]
+            return client
+
+    def reconnect(self, uri: str, token: str, db_name: str, collection_name: str) -> MilvusClient:
+        """
+        丢弃现有连接并重新创建（调用失败后使用）。
+        :return: 新的 MilvusClient
+        """
+        key = (uri, db_name, collection_name)
+        with self._lock:
+            entry = self._clients.pop(key, None)
+        if entry is not None:
+            self._close_client(entry[0])
+        return self.get(uri, token, db_name, collection_name)
+
+    def close_all(self):
+        """
+        关闭所有连接（应用关闭时调用）。
+        """
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+        for client, _ in entries:
+            self._close_client(client)
+
+    @staticmethod
+    def _is_healthy(client: MilvusClient, collection_name: str) -> bool:
+        try:
+            client.has_collection(collection_name)
+            return True
+        except Exception as e:
+            logger.warning(f"Milvus health check failed: {e}")
+            return False
+
+    @staticmethod
+    def _close_client(client: MilvusClient):
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close Milvus client: {e}")
+
+class AsyncMilvusClientRegistry:
+    """
+    进程级 AsyncMilvusClient 注册表，与 MilvusClientRegistry 相同，每个 (uri, db_name, collection_name) 只保留一个连接。
+    AsyncMilvusClient 没有轻量的健康检查接口，因此只在调用失败时通过 reconnect 重建连接。
+    """
+    def __init__(self):
+        self._clients = {}  # key -> AsyncMilvusClient
+        self._lock = asyncio.Lock()
+
+    async def get(self, uri: str, token: str, db_name: str, collection_name: str) -> AsyncMilvusClient:
+        """
+        获取（必要时创建）指定集合的异步 Milvus 客户端。
+        :return: AsyncMilvusClient
+        """
+        key = (uri, db_name, collection_name)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        async with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = AsyncMilvusClient(uri=uri, token=token, db_name=db_name)
+                self._clients[key] = client
+            return client
+
+    async def reconnect(self, uri: str, token: str, db_name: str, collection_name: str) -> AsyncMilvusClient:
+        """
+        丢弃现有连接并重新创建（调用失败后使用）。
+        :return: 新的 AsyncMilvusClient
+        """
+        key = (uri, db_name, collection_name)
+        async with self._lock:
+            client = self._clients.pop(key, None)
+        if client is not None:
+            await self._close_client(client)
+        return await self.get(uri, token, db_name, collection_name)
+
+    async def close_all(self):
+        """
+        关闭所有连接（应用关闭时调用）。
+        """
+        async with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            await self._close_client(client)
+
+    @staticmethod
+    async def _close_client(client: AsyncMilvusClient):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close async Milvus client: {e}")
+
+# 进程级共享的注册表
+milvus_registry = MilvusClientRegistry()
+async_milvus_registry = AsyncMilvusClientRegistry()
 
 class VectorDatabaseClient:
     """
-    用于与 Milvus 进行交互的客户端
+    用于与 Milvus 进行交互的客户端。
+    底层 MilvusClient 来自 milvus_registry，创建本对象不会新建连接。
     """
     def __init__(self, collection_name: str):
         """
@@ -21,25 +182,136 @@ class VectorDatabaseClient:
         """
         self._collection_name = collection_name  # 集合名称
         self._vector_size = int(Config.EMBEDDING_DIMENSION)
-        self._client = MilvusClient(
-            uri=Config.MILVUS_SERVICE_URI,
-            token=Config.MILVUS_TOKEN_USER,
-            db_name=Config.MILVUS_DB_NAME_CFLP
+        self._connection_args = (
+            Config.MILVUS_SERVICE_URI,
+            Config.MILVUS_TOKEN_USER,
+            Config.MILVUS_DB_NAME_CFLP,
+            collection_name,
             )
+        self._client = milvus_registry.get(*self._connection_args)
         
+    @instrument("vector_search")
     def search(self, query_embedding: list, top_k: int = Config.MILVUS_SEARCH_TOP_K):
         """
-        search: 搜索
+        search: 搜索。连接异常时重建连接并重试一次。
         """
-        return self._client.search(
+        try:
+            return self._search(query_embedding, top_k)
+        except MilvusException as e:
+            logger.warning(f"Milvus search failed, retrying with a new connection: {e}")
+            self._client = milvus_registry.reconnect(*self._connection_args)
+            return self._search(query_embedding, top_k)
+
+    def _search(self, query_embedding: list, top_k: int):
+        results = self._client.search(
             collection_name=self._collection_name,
             data=[query_embedding],
             limit=top_k,
             # search_params={"metric_type": "IP", "params": {}},
             output_fields=["vector_text","metadata"],
         )
+        return normalize_hits(results, get_primary_key_field(self._collection_name))
         
-     
+
+class AsyncVectorDatabaseClient:
+    """
+    VectorDatabaseClient 的异步版本，search 与其参数和返回结构一致。
+    底层 AsyncMilvusClient 来自 async_milvus_registry。
+    """
+    def __init__(self, collection_name: str):
+        """
+        :param collection_name: Milvus 集合名称
+        """
+        self._collection_name = collection_name  # 集合名称
+        self._connection_args = (
+            Config.MILVUS_SERVICE_URI,
+            Config.MILVUS_TOKEN_USER,
+            Config.MILVUS_DB_NAME_CFLP,
+            collection_name,
+            )
+
+    @instrument("vector_search")
+    async def search(self, query_embedding: list, top_k: int = Config.MILVUS_SEARCH_TOP_K):
+        """
+        search: 搜索。连接异常时重建连接并重试一次。
+        """
+        client = await async_milvus_registry.get(*self._connection_args)
+        try:
+            return await self._search(client, query_embedding, top_k)
+        except MilvusException as e:
+            logger.warning(f"Async Milvus search failed, retrying with a new connection: {e}")
+            client = await async_milvus_registry.reconnect(*self._connection_args)
+            return await self._search(client, query_embedding, top_k)
+
+    async def _search(self, client: AsyncMilvusClient, query_embedding: list, top_k: int):
+        results = await client.search(
+            collection_name=self._collection_name,
+            data=[query_embedding],
+            limit=top_k,
+            output_fields=["vector_text","metadata"],
+        )
+        primary_key = _primary_keys.get(self._collection_name)
+        if primary_key is None:
+            # AsyncMilvusClient 没有 describe_collection，首次查询时在线程中用同步客户端获取
+            primary_key = await asyncio.to_thread(get_primary_key_field, self._collection_name)
+        return normalize_hits(results, primary_key)
+
+# 集合名称 -> 主键字段名
+_primary_keys = {}
+
+def get_primary_key_field(collection_name: str) -> str:
+    """
+    获取集合的主键字段名（按集合缓存，只在首次调用时请求 describe_collection）。
+    """
+    primary_key = _primary_keys.get(collection_name)
+    if primary_key is None:
+        client = milvus_registry.get(
+            Config.MILVUS_SERVICE_URI, Config.MILVUS_TOKEN_USER, Config.MILVUS_DB_NAME_CFLP, collection_name
+        )
+        primary_key = next(
+            field["name"] for field in client.describe_collection(collection_name)["fields"] if field.get("is_primary")
+        )
+        _primary_keys[collection_name] = primary_key
+    return primary_key
+
+def normalize_hits(results, primary_key: str) -> list:
+    """
+    MilvusClient.search 的命中以集合的主键字段名为键（如 {"doc_id": ..., "distance": ..., "entity": {...}}），
+    统一改为 {"id": ..., "distance": ..., "entity": {...}}，与本地向量索引、关键字检索的命中结构一致，
+    融合检索和上下文组装只需按 "id" 取主键。
+    """
+    return [
+        [{"id": hit[primary_key], "distance": hit["distance"], "entity": hit.get("entity", {})} for hit in hits]
+        for hits in results
+    ]
+
+def iter_collection_entities(collection_name: str, output_fields: list, batch_size: int = 1000):
+    """
+    逐条导出集合中的全部实体（用于构建本地向量索引、关键字索引等）。
+    :param collection_name: Milvus 集合名称
+    :param output_fields: 需要导出的字段，主键字段会自动加入
+    :param batch_size: 每批导出的条目数
+    :return: 生成器，逐条返回 (主键, 字段字典)
+    """
+    client = milvus_registry.get(
+        Config.MILVUS_SERVICE_URI, Config.MILVUS_TOKEN_USER, Config.MILVUS_DB_NAME_CFLP, collection_name
+    )
+    primary_key = get_primary_key_field(collection_name)
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        output_fields=[primary_key] + list(output_fields),
+    )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            for row in batch:
+                yield row[primary_key], {field: row.get(field) for field in output_fields}
+    finally:
+        iterator.close()
+
 if __name__ == "__main__":
     # OpenAI客户端
     from app.services import openai_client
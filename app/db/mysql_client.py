@@ -2,35 +2,178 @@
 # import sys
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from app.core.config import Config
+from app.core.metrics import stage
 import mysql.connector
 import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
 from uuid import uuid4
 from datetime import datetime, timezone
 import pytz
 
+logger = logging.getLogger(__name__)
+
+SYSTEM_MESSAGE = {"role": "system", "content": "你是一个专业的问答助手，专注于基于已知信息回答用户的问题。"}
+
+# 对话消息按行存储：追加一条消息只插入一行，写入量与对话长度无关。
+# chat_history 表只保存对话本身（用户、最后活跃时间），conversation_history 列只保留 system 消息；
+# 旧数据中保存在 conversation_history 里的消息在第一次追加时（或由 app/db/migrate_chat_history.py）迁移为按行存储。
+# chat_history_messages 表由 alembic 迁移 0003 创建。
+
+def beijing_now():
+    """
+    当前的北京时间。
+    """
+    # timestamp = datetime.now(timezone.utc)
+    # 使用 pytz 设置为北京时间
+    return datetime.now(pytz.timezone('Asia/Shanghai'))
+
+class PoolTimeoutError(TimeoutError):
+    """
+    等待空闲连接超时（连接全部借出）。
+    """
+
 class SQLClient:
-    def __init__(self):
+    def __init__(
+        self,
+        pool_size: int = Config.MYSQL_POOL_SIZE,
+        pool_timeout: float = Config.MYSQL_POOL_TIMEOUT,
+        ping_after: float = Config.MYSQL_POOL_PING_AFTER,
+    ):
         """
-        初始化数据库连接。
+        初始化数据库配置。连接在第一次使用时创建，创建 SQLClient 本身不会连接数据库。
+        :param pool_size: 最多同时打开的连接数
+        :param pool_timeout: 连接全部借出时等待空闲连接的最长时间（秒）
+        :param ping_after: 空闲超过该时间（秒）的连接借出前先 ping 检查（断开时重连）
         """
         self.host = Config.MYSQL_HOST
         self.port = Config.MYSQL_PORT
         self.user = Config.MYSQL_USER
         self.password = Config.MYSQL_PASSWORD
         self.database = Config.MYSQL_DATABASE
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.ping_after = ping_after
+        # 自行管理的连接池：空闲连接按后进先出复用（最近用过的连接最可能仍然存活），
+        # 信号量限制同时打开的连接数，连接全部借出时调用方排队等待。
+        # _idle 中保存 (连接, 归还时间)，刚用过的连接直接借出，不额外 ping
+        self._idle = []
+        self._pool_lock = threading.Lock()
+        self._pool_slots = threading.BoundedSemaphore(self.pool_size)
+        # close() 时加一：之前借出的连接归还时直接关闭，不再放回空闲列表
+        self._generation = 0
 
-    def get_connection(self):
+    def _connect(self):
         """
-        获取数据库连接。
+        新建一个数据库连接。
         """
         return mysql.connector.connect(
             host=self.host,
             port=self.port,
             user=self.user,
             password=self.password,
-            database=self.database
+            database=self.database,
         )
 
+    def _acquire(self):
+        """
+        取出一个空闲连接，没有空闲连接时新建。调用方需已占用一个 _pool_slots。
+        空闲超过 ping_after 的连接先 ping 检查（断开的连接会重连）。
+        :return: (连接, 借出时的 generation)
+        """
+        with self._pool_lock:
+            connection, last_used = self._idle.pop() if self._idle else (None, None)
+            generation = self._generation
+        if connection is not None:
+            if time.monotonic() - last_used < self.ping_after:
+                return connection, generation
+            try:
+                connection.ping(reconnect=True, attempts=1)
+                return connection, generation
+            except mysql.connector.Error:
+                self._close_quietly(connection)
+        return self._connect(), generation
+
+    def _release(self, connection, generation: int):
+        """
+        归还连接：放回空闲列表；借出后调用过 close() 时直接关闭连接。
+        transaction() 退出时已经提交或回滚，连接上不会留下未结束的事务。
+        """
+        with self._pool_lock:
+            if generation == self._generation:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except mysql.connector.Error:
+            pass
+
+    @contextmanager
+    def _checkout(self):
+        """
+        借出一个连接，退出时归还；lease["discard"] 为 True 时关闭连接而不放回连接池。
+        with 块中抛出 mysql.connector.Error 时连接可能已断开（MySQL 重启、主从切换、网络中断），同样关闭。
+        从等待连接到归还连接的耗时计入 chat_history_db 阶段。
+        :return: {"connection": 连接, "discard": False}
+        """
+        with stage("chat_history_db"):
+            if not self._pool_slots.acquire(timeout=self.pool_timeout):
+                raise PoolTimeoutError("Timed out waiting for a free MySQL connection")
+            try:
+                connection, generation = self._acquire()
+                lease = {"connection": connection, "discard": False}
+                try:
+                    yield lease
+                except mysql.connector.Error:
+                    lease["discard"] = True
+                    raise
+                finally:
+                    if lease["discard"]:
+                        self._close_quietly(connection)
+                    else:
+                        self._release(connection, generation)
+            finally:
+                self._pool_slots.release()
+
+    @contextmanager
+    def get_connection(self):
+        """
+        借出一个连接，退出时归还；出现数据库错误时关闭连接，下次借出时新建。
+        """
+        with self._checkout() as lease:
+            yield lease["connection"]
+
+    @contextmanager
+    def transaction(self):
+        """
+        在一个连接上开启事务，正常退出时提交，出现异常时回滚。回滚失败时关闭连接，抛出原来的异常。
+        :return: 字典游标
+        """
+        with self._checkout() as lease:
+            connection = lease["connection"]
+            cursor = connection.cursor(dictionary=True)
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                try:
+                    connection.rollback()
+                except mysql.connector.Error as e:
+                    logger.warning(f"Discarding MySQL connection that failed to roll back: {e}")
+                    lease["discard"] = True
+                raise
+            finally:
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    lease["discard"] = True
+
     def execute_query(self, query: str, params: tuple = (), fetch: bool = False):
         """
         执行 SQL 语句。
@@ -38,42 +181,33 @@ class SQLClient:
         :param params: 查询参数
         :param fetch: 是否返回查询结果
         """
-        connection = self.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, params)
-        
-        result = cursor.fetchall() if fetch else None
-        connection.commit()
-        cursor.close()
-        connection.close()
-        return result
+        with self.transaction() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall() if fetch else None
 
     def user_exists(self, username: str):
         """
         检查用户是否存在。
         :return: 用户 ID 或 None
         """
-        query = "SELECT id FROM users WHERE username = %s"
-        result = self.execute_query(query, (username,), fetch=True)
-        return result[0]['id'] if result else None
+        with self.transaction() as cursor:
+            return self._user_exists(cursor, username)
 
     def create_user(self, username: str):
         """
         创建新用户。
         :return: 新用户 ID
         """
-        user_id = str(uuid4())
-        query = "INSERT INTO users (id, username) VALUES (%s, %s)"
-        self.execute_query(query, (user_id, username))
-        return user_id
+        with self.transaction() as cursor:
+            return self._create_user(cursor, username)
 
     def get_or_create_user(self, username: str):
         """
         获取或创建用户。
         :return: 用户 ID
         """
-        user_id = self.user_exists(username)
-        return user_id if user_id else self.create_user(username)
+        with self.transaction() as cursor:
+            return self._get_or_create_user(cursor, username)
 
     def conversation_exists(self, user_id: str, conversation_id: str):
         """
@@ -89,15 +223,8 @@ class SQLClient:
         创建新对话。
         :return: 对话 ID
         """
-        conversation_id = str(uuid4())
-        system_message = [{"role": "system", "content": "你是一个专业的问答助手，专注于基于已知信息回答用户的问题。"}]
-        query = "INSERT INTO chat_history (id, user_id, conversation_history, timestamp) VALUES (%s, %s, %s, %s)"
-        # timestamp = datetime.now(timezone.utc)
-        # 使用 pytz 设置为北京时间
-        beijing_tz = pytz.timezone('Asia/Shanghai')
-        timestamp = datetime.now(beijing_tz)
-        self.execute_query(query, (conversation_id, user_id, json.dumps(system_message), timestamp))
-        return conversation_id
+        with self.transaction() as cursor:
+            return self._create_conversation(cursor, user_id, [SYSTEM_MESSAGE])
 
     def get_or_create_conversation(self, user_id: str, conversation_id: str = None):
         """
@@ -110,37 +237,130 @@ class SQLClient:
 
     def append_to_conversation(self, username: str, conversation_id: str, message: str, is_user: bool):
         """
-        追加对话内容。
+        追加对话内容。查找/创建用户、查找/创建对话和写入消息都在同一个连接的同一个事务中完成；
+        消息只插入一行，不读取也不重写已有的历史。
         :param username: 用户名
         :param conversation_id: 对话 ID
         :param message: 对话内容
         :param is_user: 是否为用户消息
+        :return: 对话 ID（对话不存在时为新建对话的 ID）
         """
-        user_id = self.get_or_create_user(username)
-        conversation_id = self.get_or_create_conversation(user_id, conversation_id)
-        
         role = "user" if is_user else "assistant"
-        new_message = {"role": role, "content": message}
-        
-        # 获取当前的会话历史
-        query = "SELECT conversation_history FROM chat_history WHERE id = %s"
-        result = self.execute_query(query, (conversation_id,), fetch=True)
-        
-        if result:
+        with self.transaction() as cursor:
+            user_id = self._get_or_create_user(cursor, username)
+            legacy_count = None
+            if conversation_id:
+                # 锁定对话行，同一对话的追加按顺序执行；JSON_LENGTH 在服务端计算，不传输历史内容
+                cursor.execute(
+                    "SELECT JSON_LENGTH(conversation_history) AS legacy_count FROM chat_history "
+                    "WHERE id = %s AND user_id = %s FOR UPDATE",
+                    (conversation_id, user_id),
+                )
+                result = cursor.fetchall()
+                if result:
+                    legacy_count = result[0]['legacy_count'] or 0
+            if legacy_count is None:
+                conversation_id = self._create_conversation(cursor, user_id, [SYSTEM_MESSAGE])
+            elif legacy_count > 1:
+                # 旧格式的对话：先把历史消息迁移为按行存储
+                self._migrate_conversation(cursor, conversation_id)
+            cursor.execute(
+                "INSERT INTO chat_history_messages (conversation_id, role, content, created_at) VALUES (%s, %s, %s, %s)",
+                (conversation_id, role, message, beijing_now()),
+            )
+            if legacy_count is not None:
+                cursor.execute("UPDATE chat_history SET timestamp = %s WHERE id = %s", (beijing_now(), conversation_id))
+        return conversation_id
+
+    def get_conversation_history(self, conversation_id: str):
+        """
+        读取完整的对话历史。
+        :return: 消息列表，第一条为 system 消息；对话不存在时返回 None
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT conversation_history FROM chat_history WHERE id = %s", (conversation_id,))
+            result = cursor.fetchall()
+            if not result:
+                return None
+            # 尚未迁移的旧消息仍在 conversation_history 中，且都早于按行存储的消息
             history = json.loads(result[0]['conversation_history'])
-            history.append(new_message)
-            updated_history = json.dumps(history)
-            # timestamp = datetime.now(timezone.utc)
-            # 使用 pytz 设置为北京时间
-            beijing_tz = pytz.timezone('Asia/Shanghai')
-            timestamp = datetime.now(beijing_tz)
-            
-            query = "UPDATE chat_history SET conversation_history = %s, timestamp = %s WHERE id = %s"
-            self.execute_query(query, (updated_history, timestamp, conversation_id))
+            cursor.execute(
+                "SELECT role, content FROM chat_history_messages WHERE conversation_id = %s ORDER BY id",
+                (conversation_id,),
+            )
+            history.extend({"role": row['role'], "content": row['content']} for row in cursor.fetchall())
+        return history
+
+    def migrate_conversation(self, conversation_id: str) -> int:
+        """
+        把一个旧格式对话中保存在 conversation_history 里的消息迁移为按行存储。
+        :return: 迁移的消息数
+        """
+        with self.transaction() as cursor:
+            return self._migrate_conversation(cursor, conversation_id)
+
+    def close(self):
+        """
+        关闭所有空闲连接（应用关闭时调用）；仍被借出的连接在归还时关闭。之后的调用会重新建立连接。
+        """
+        with self._pool_lock:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close_quietly(connection)
 
+    @staticmethod
+    def _user_exists(cursor, username: str):
+        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
+        result = cursor.fetchall()
+        return result[0]['id'] if result else None
+
+    @staticmethod
+    def _create_user(cursor, username: str):
+        user_id = str(uuid4())
+        cursor.execute("INSERT INTO users (id, username) VALUES (%s, %s)", (user_id, username))
+        return user_id
+
+    def _get_or_create_user(self, cursor, username: str):
+        user_id = self._user_exists(cursor, username)
+        return user_id if user_id else self._create_user(cursor, username)
+
+    @staticmethod
+    def _create_conversation(cursor, user_id: str, messages: list):
+        conversation_id = str(uuid4())
+        query = "INSERT INTO chat_history (id, user_id, conversation_history, timestamp) VALUES (%s, %s, %s, %s)"
+        cursor.execute(query, (conversation_id, user_id, json.dumps(messages), beijing_now()))
         return conversation_id
 
+    @staticmethod
+    def _migrate_conversation(cursor, conversation_id: str) -> int:
+        """
+        锁定对话行，把 conversation_history 中 system 之外的消息插入 chat_history_messages，
+        然后把 conversation_history 重置为只含 system 消息。调用方负责提交事务。
+        迁移总是在该对话的任何新消息写入之前完成（追加时会先检查），所以迁移的消息排在按行存储的消息之前。
+        """
+        cursor.execute("SELECT conversation_history, timestamp FROM chat_history WHERE id = %s FOR UPDATE", (conversation_id,))
+        result = cursor.fetchall()
+        if not result:
+            return 0
+        history = json.loads(result[0]['conversation_history'])
+        if history and history[0].get("role") == "system":
+            system, messages = history[:1], history[1:]
+        else:
+            system, messages = [SYSTEM_MESSAGE], history
+        if not messages:
+            return 0
+        # 旧数据没有逐条消息的时间，统一使用对话的最后更新时间
+        created_at = result[0]['timestamp'] or beijing_now()
+        cursor.executemany(
+            "INSERT INTO chat_history_messages (conversation_id, role, content, created_at) VALUES (%s, %s, %s, %s)",
+            [(conversation_id, message["role"], message["content"], created_at) for message in messages],
+        )
+        cursor.execute("UPDATE chat_history SET conversation_history = %s WHERE id = %s", (json.dumps(system), conversation_id))
+        return len(messages)
+
 if __name__ == "__main__":
     db_client = SQLClient()
     conversation_id = db_client.append_to_conversation("test_user", None, "你好！", is_user=True)
-    db_client.append_to_conversation("test_user", conversation_id, "你好！我可以帮你什么？", is_user=False)
\ No newline at end of file
+    db_client.append_to_conversation("test_user", conversation_id, "你好！我可以帮你什么？", is_user=False)
+    print(db_client.get_conversation_history(conversation_id))
@@ -0,0 +1,141 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import json
+import threading
+import redis
+from app.core.config import Config
+from app.db.conversation_manager import SYSTEM_PROMPT, ConversationHistoryBackend
+
+"""
+基于 Redis 的对话历史后端，多个 uvicorn worker 和多个副本共享同一份对话历史。
+每个对话使用三个键（键名带 {conversation_id} 哈希标签，Redis Cluster 下落在同一个槽）：
+- messages: 消息列表，每项为 JSON 编码的 {"role", "content"}；
+- lengths: 与 messages 一一对应的内容长度列表；
+- total: 全部消息内容长度之和。
+追加和修剪在一个 Lua 脚本中完成，并发追加同一对话时不会丢失消息，也不需要读回整个历史。
+system 消息不写入 Redis，读取时补在最前面。
+"""
+
+# KEYS: messages, lengths, total
+# ARGV: 用户消息 JSON, 用户消息长度, 助手消息 JSON, 助手消息长度, 最大总长度, 过期时间（毫秒，<= 0 表示不过期）
+APPEND_AND_TRIM_SCRIPT = """
+redis.call('RPUSH', KEYS[1], ARGV[1], ARGV[3])
+redis.call('RPUSH', KEYS[2], ARGV[2], ARGV[4])
+local total = redis.call('INCRBY', KEYS[3], tonumber(ARGV[2]) + tonumber(ARGV[4]))
+local max_length = tonumber(ARGV[5])
+-- 从最早的对话轮次（user 和 assistant）开始剔除
+while total > max_length and redis.call('LLEN', KEYS[2]) > 0 do
+    redis.call('LPOP', KEYS[1])
+    total = total - tonumber(redis.call('LPOP', KEYS[2]))
+    if redis.call('LLEN', KEYS[2]) > 0 then
+        redis.call('LPOP', KEYS[1])
+        total = total - tonumber(redis.call('LPOP', KEYS[2]))
+    end
+end
+redis.call('SET', KEYS[3], total)
+local ttl = tonumber(ARGV[6])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[1], ttl)
+    redis.call('PEXPIRE', KEYS[2], ttl)
+    redis.call('PEXPIRE', KEYS[3], ttl)
+end
+return total
+"""
+
+class RedisConversationManager(ConversationHistoryBackend):
+    def __init__(
+        self,
+        client: redis.Redis,
+        max_context_length: int = Config.MAX_CONTENT_LENGTH,
+        ttl: float = Config.CONVERSATION_TTL,
+        key_prefix: str = "cflp:conversation:",
+    ):
+        """
+        :param client: Redis 客户端（需使用 decode_responses=True），任何兼容 Redis 协议的服务均可
+        :param max_context_length: 单个对话保留的内容总长度上限（字符数，含 system 消息）
+        :param ttl: 对话闲置多久（秒）后过期，<= 0 表示不过期；读写都会刷新过期时间
+        :param key_prefix: 键名前缀
+        """
+        self._client = client
+        self.max_context_length = max_context_length
+        self._ttl_ms = int(ttl * 1000)
+        self._key_prefix = key_prefix
+        self._append_and_trim = client.register_script(APPEND_AND_TRIM_SCRIPT)
+        # 统计
+        self._stats_lock = threading.Lock()
+        self.reads = 0
+        self.appends = 0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisConversationManager":
+        """
+        根据 Redis URL 创建后端（连接池由 redis-py 管理，线程安全）。
+        """
+        client = redis.Redis.from_url(url, decode_responses=True, health_check_interval=30)
+        return cls(client, **kwargs)
+
+    def _keys(self, conversation_id: str):
+        base = f"{self._key_prefix}{{{conversation_id}}}"
+        return [f"{base}:messages", f"{base}:lengths", f"{base}:total"]
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get_history(self, conversation_id: str) -> list:
+        """
+        获取对话历史，第一条为 system 消息。
+        """
+        keys = self._keys(conversation_id)
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.lrange(keys[0], 0, -1)
+            if self._ttl_ms > 0:
+                for key in keys:
+                    pipe.pexpire(key, self._ttl_ms)
+            messages = pipe.execute()[0]
+        self._count("reads")
+        history = [{"role": "system", "content": SYSTEM_PROMPT}]
+        history.extend(json.loads(message) for message in messages)
+        return history
+
+    def update_history(self, conversation_id: str, query: str, response: str):
+        """
+        原子地追加一轮对话，并修剪到最大长度以内。
+        """
+        self._append_and_trim(
+            keys=self._keys(conversation_id),
+            args=[
+                json.dumps({"role": "user", "content": query}, ensure_ascii=False),
+                len(query),
+                json.dumps({"role": "assistant", "content": response}, ensure_ascii=False),
+                len(response),
+                self.max_context_length - len(SYSTEM_PROMPT),
+                self._ttl_ms,
+            ],
+        )
+        self._count("appends")
+
+    def stats(self) -> dict:
+        """
+        返回本进程的读写次数，以及 Redis 服务端的内存占用。
+        """
+        with self._stats_lock:
+            stats = {"reads": self.reads, "appends": self.appends}
+        try:
+            stats["used_memory"] = self._client.info("memory").get("used_memory")
+        except redis.RedisError:
+            stats["used_memory"] = None
+        return stats
+
+    def ping(self):
+        self._client.ping()
+
+    def close(self):
+        self._client.close()
+
+if __name__ == "__main__":
+    conversation_manager = RedisConversationManager.from_url(Config.REDIS_URL)
+    conversation_manager.update_history(conversation_id="conversation_1", query="What is AI?", response="AI is the simulation of human intelligence in machines.")
+    print(conversation_manager.get_history(conversation_id="conversation_1"))
+    print(conversation_manager.stats())
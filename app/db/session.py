@@ -1,42 +1,100 @@
-from sqlalchemy import create_engine
+import time
+from functools import lru_cache
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import DatabaseError
 from app.core.config import Config
-from app.models.base import Base
-from app.models.user import User
-from app.models.chat import Chat, Message
+from app.core.metrics import record_stage
 import logging
-import time
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 创建数据库引擎
-engine = create_engine(Config.get_database_url)  # 创建数据库引擎
-# 添加重试逻辑
-max_retries = 5
-retry_interval = 5
-# 创建数据库表
-for attempt in range(max_retries):
-    try:
-        Base.metadata.create_all(bind=engine)
-        print(f"Successfully created tables on attempt {attempt + 1}")
-        break
-    except DatabaseError as e:
-        print(f"Failed to connect to database, attempt {attempt + 1}/{max_retries}: {e}")
-        if attempt < max_retries - 1:
-            time.sleep(retry_interval)
-        else:
-            raise
-
-# 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)  # 不自动提交事务， 不自动刷新
+"""
+数据库引擎和会话。
+引擎在第一次使用时才创建，导入本模块不会连接数据库；表结构由 alembic 迁移管理（alembic upgrade head），
+不再在导入时执行 create_all。
+"""
+
+def instrument_engine(engine: Engine) -> Engine:
+    """
+    把每条 SQL 的执行耗时计入 db 阶段（异步引擎传入 engine.sync_engine）。
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_stage("db", time.perf_counter() - conn.info["query_start_time"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        # 执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start_time"):
+            connection.info["query_start_time"].pop()
+    return engine
+
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    """
+    获取同步数据库引擎（首次调用时创建）。
+    """
+    return instrument_engine(create_engine(
+        Config.get_database_url,
+        pool_recycle=Config.SQLALCHEMY_POOL_RECYCLE,
+        pool_pre_ping=Config.SQLALCHEMY_POOL_PRE_PING,
+    ))
+
+@lru_cache(maxsize=None)
+def get_session_factory() -> sessionmaker:
+    # 创建会话工厂，不自动提交事务， 不自动刷新
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+@lru_cache(maxsize=None)
+def get_async_engine() -> AsyncEngine:
+    """
+    获取异步数据库引擎（aiomysql 驱动，首次调用时创建），供 async def 路由使用，查询期间不阻塞事件循环。
+    """
+    engine = create_async_engine(
+        Config.get_async_database_url,
+        pool_size=Config.SQLALCHEMY_POOL_SIZE,
+        max_overflow=Config.SQLALCHEMY_MAX_OVERFLOW,
+        pool_timeout=Config.SQLALCHEMY_POOL_TIMEOUT,
+        pool_recycle=Config.SQLALCHEMY_POOL_RECYCLE,
+        pool_pre_ping=Config.SQLALCHEMY_POOL_PRE_PING,
+    )
+    instrument_engine(engine.sync_engine)
+    return engine
+
+@lru_cache(maxsize=None)
+def get_async_session_factory() -> async_sessionmaker:
+    # expire_on_commit=False：提交后仍可直接读取对象属性，避免在异步会话中隐式触发查询
+    return async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
 
 def get_db():
-    db = SessionLocal()  # 创建一个数据库会话
+    db = get_session_factory()()  # 创建一个数据库会话
     try:
         # yield db 表示将数据库会话 db 返回给调用者，同时暂停函数执行，等待外部使用完毕后再继续执行清理逻辑。
         yield db  # 返回会话，供 FastAPI 依赖注入使用
     finally:
-        db.close()   # 关闭会话
\ No newline at end of file
+        db.close()   # 关闭会话
+
+async def get_async_db():
+    """
+    异步数据库会话依赖项，同一个请求中的依赖（如 get_current_user）共用一个会话。
+    """
+    async with get_async_session_factory()() as db:
+        yield db
+
+async def dispose_engines():
+    """
+    关闭已创建的引擎的连接池（应用关闭时调用）；未创建的引擎不会因此被创建。
+    """
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
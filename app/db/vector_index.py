@@ -0,0 +1,322 @@
+"""
+进程内的内存映射向量索引，可替代 VectorDatabaseClient 作为知识检索后端。
+向量以 float32 矩阵（.npy）保存并通过 mmap 加载，多个 worker 共享操作系统页缓存；检索使用 NumPy 向量化计算 top-k，
+较大的集合可以在构建时开启粗粒度 IVF 分区（k-means 聚类），检索时只扫描最近的 nprobe 个分区。
+还可以在构建时额外保存 int8 或二值（符号位）量化向量：检索先用量化向量粗排，再对前 top_k * rescore_factor 个候选
+用 float32 原始向量精排，常驻内存的只有量化向量（int8 为 1/4，二值为 1/32）。
+int8 节省的是内存而不是检索延迟：NumPy 没有 SIMD 的 int8 点积（整数矩阵乘法比 float32 BLAS 慢数倍），
+粗排按缓存大小的块转换为 float32 后计算，延迟与 float32 全量扫描相当。二值粗排用 64 位异或和位计数，
+比 float32 扫描快数倍，但召回率更依赖精排（见 benchmarks/embedding_quantization.py）。
+search 的参数和返回结构与 VectorDatabaseClient.search（pymilvus）一致：
+[[{"id": ..., "distance": ..., "entity": {"vector_text": ..., "metadata": {...}}}, ...]]
+索引目录结构：
+- meta.json: 维度、条目数、分区数等元信息
+- vectors.npy: (n, dim) float32 向量矩阵
+- entities.jsonl: 每行一个条目的 id 和输出字段，顺序与 vectors.npy 一致
+- centroids.npy / ivf_order.npy / ivf_offsets.npy: IVF 分区（仅在 nlist > 0 时存在）
+- codes.npy (+ scales.npy): 量化向量（仅在 quantization 不为 none 时存在）
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import json
+import logging
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import PROJECT_ROOT, Config
+from app.core.metrics import instrument
+from app.utils.embedding import shorten_embeddings
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FIELDS = ["vector_text", "metadata"]
+QUANTIZATION_MODES = ("none", "int8", "binary")
+# 量化打分时每块转换为 float32 的字节数：块留在 CPU 缓存中，转换和矩阵乘法不会反复读写内存
+_SCORE_BLOCK_BYTES = 1 << 20
+
+
+def quantize_int8(vectors: np.ndarray):
+    """
+    逐向量对称 int8 量化。
+    :param vectors: (n, dim) float32 向量
+    :return: (int8 编码, 每个向量的缩放系数)
+    """
+    max_abs = np.abs(vectors).max(axis=1)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    codes = np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """
+    二值量化：每一维只保留符号位，按位打包。
+    :param vectors: (n, dim) float32 向量
+    :return: (n, ceil(dim / 8)) uint8 编码
+    """
+    return np.packbits(vectors > 0, axis=-1)
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """
+    简单的 k-means（内积相似度），用于构建 IVF 分区中心。
+    :param vectors: (n, dim) 向量矩阵
+    :param nlist: 分区数
+    :return: (nlist, dim) 分区中心
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(nlist):
+            members = vectors[assignments == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+            else:
+                # 空分区重新随机选一个点作为中心
+                centroids[i] = vectors[rng.integers(len(vectors))]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms > 0, norms, 1.0)
+    return centroids.astype(np.float32)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    返回得分最高的 k 个位置（按得分降序）。
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class MemoryMappedVectorIndex:
+    """
+    基于内存映射 float32 矩阵的向量索引，相似度为内积（OpenAI 嵌入已归一化，等价于余弦相似度）。
+    """
+    def __init__(
+        self,
+        path: str = Config.VECTOR_INDEX_PATH,
+        nprobe: int = Config.VECTOR_INDEX_NPROBE,
+        rescore_factor: int = Config.VECTOR_INDEX_RESCORE_FACTOR,
+    ):
+        """
+        :param path: 索引目录，相对路径相对于项目根目录
+        :param nprobe: 开启 IVF 时每次检索扫描的分区数
+        :param rescore_factor: 使用量化向量时，取前 top_k * rescore_factor 个候选用 float32 向量精排；0 表示不精排
+        """
+        path = os.path.join(PROJECT_ROOT, path)
+        self._path = path
+        self._nprobe = nprobe
+        self._rescore_factor = rescore_factor
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as file:
+            self._meta = json.load(file)
+        self._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(path, "entities.jsonl"), "r", encoding="utf-8") as file:
+            self._entities = [json.loads(line) for line in file]
+        if len(self._entities) != self._vectors.shape[0]:
+            raise ValueError(f"Vector index at {path} is corrupted: entity and vector counts differ")
+        self._centroids = None
+        if self._meta.get("nlist", 0) > 0:
+            self._centroids = np.load(os.path.join(path, "centroids.npy"))
+            self._ivf_order = np.load(os.path.join(path, "ivf_order.npy"), mmap_mode="r")
+            self._ivf_offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+        self._quantization = self._meta.get("quantization", "none")
+        if self._quantization != "none":
+            # 量化编码全部载入内存；float32 向量仍通过 mmap 按需读取（仅用于精排）
+            self._codes = np.load(os.path.join(path, "codes.npy"))
+        if self._quantization == "int8":
+            self._scales = np.load(os.path.join(path, "scales.npy"))
+
+    @property
+    def dimension(self) -> int:
+        return int(self._vectors.shape[1])
+
+    def __len__(self) -> int:
+        return int(self._vectors.shape[0])
+
+    def records(self) -> List[dict]:
+        """
+        返回所有条目（{"id": ..., "entity": {...}}），顺序与向量一致。
+        """
+        return self._entities
+
+    @staticmethod
+    def build(
+        path: str,
+        ids: Sequence,
+        vectors,
+        entities: Sequence[dict],
+        nlist: int = Config.VECTOR_INDEX_NLIST,
+        quantization: str = Config.VECTOR_INDEX_QUANTIZATION,
+    ):
+        """
+        构建并保存索引。
+        :param path: 索引目录（不存在时自动创建，已有文件会被覆盖）
+        :param ids: 条目主键，与 Milvus 主键一致
+        :param vectors: (n, dim) 向量
+        :param entities: 每个条目的输出字段，如 {"vector_text": ..., "metadata": {...}}
+        :param nlist: IVF 分区数，0 表示不分区（全量扫描）
+        :param quantization: 量化方式，none / int8 / binary
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not (len(ids) == len(entities) == vectors.shape[0]):
+            raise ValueError("ids, vectors and entities must have the same length")
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        nlist = min(nlist, vectors.shape[0])
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "vectors.npy"), vectors)
+        with open(os.path.join(path, "entities.jsonl"), "w", encoding="utf-8") as file:
+            for id_, entity in zip(ids, entities):
+                file.write(json.dumps({"id": id_, "entity": entity}, ensure_ascii=False) + "\n")
+        if nlist > 0:
+            centroids = _kmeans(vectors, nlist)
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            order = np.argsort(assignments, kind="stable")
+            offsets = np.searchsorted(assignments[order], np.arange(nlist + 1))
+            np.save(os.path.join(path, "centroids.npy"), centroids)
+            np.save(os.path.join(path, "ivf_order.npy"), order.astype(np.int64))
+            np.save(os.path.join(path, "ivf_offsets.npy"), offsets.astype(np.int64))
+        if quantization == "int8":
+            codes, scales = quantize_int8(vectors)
+            np.save(os.path.join(path, "codes.npy"), codes)
+            np.save(os.path.join(path, "scales.npy"), scales)
+        elif quantization == "binary":
+            np.save(os.path.join(path, "codes.npy"), quantize_binary(vectors))
+        meta = {
+            "dimension": int(vectors.shape[1]),
+            "count": int(vectors.shape[0]),
+            "nlist": int(nlist),
+            "quantization": quantization,
+        }
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """
+        IVF：返回最近 nprobe 个分区内的条目位置；未分区时返回 None 表示全量扫描。
+        """
+        if self._centroids is None:
+            return None
+        probes = _top_k(self._centroids @ query, self._nprobe)
+        return np.concatenate(
+            [self._ivf_order[self._ivf_offsets[i]:self._ivf_offsets[i + 1]] for i in probes]
+        )
+
+    def _coarse_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        计算查询与指定条目（rows 为 None 时为全部条目）的相似度；使用量化索引时为近似值。
+        """
+        if self._quantization == "none":
+            vectors = self._vectors if rows is None else self._vectors[rows]
+            return vectors @ query
+        codes = self._codes if rows is None else self._codes[rows]
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        block_rows = max(16, _SCORE_BLOCK_BYTES // (codes.shape[1] * 4))
+        if self._quantization == "int8":
+            scales = self._scales if rows is None else self._scales[rows]
+            buffer = np.empty((block_rows, codes.shape[1]), dtype=np.float32)
+            for start in range(0, codes.shape[0], block_rows):
+                block = slice(start, start + block_rows)
+                converted = buffer[:codes[block].shape[0]]
+                np.copyto(converted, codes[block], casting="unsafe")
+                np.matmul(converted, query, out=scores[block])
+            scores *= scales
+        else:
+            # 二值：(dim - 2 * 汉明距离) / dim，即符号一致维度的比例映射到 [-1, 1]
+            # 按 8 字节一组做异或和位计数，比逐字节查表快得多
+            word = np.uint64 if codes.shape[1] % 8 == 0 else np.uint8
+            query_bits = quantize_binary(query).view(word)
+            dimension = self.dimension
+            for start in range(0, codes.shape[0], block_rows):
+                block = slice(start, start + block_rows)
+                hamming = np.bitwise_count(np.bitwise_xor(codes[block].view(word), query_bits)).sum(axis=1, dtype=np.int32)
+                scores[block] = (dimension - 2 * hamming) / dimension
+        return scores
+
+    @instrument("vector_search")
+    def search(self, query_embedding: list, top_k: int = Config.MILVUS_SEARCH_TOP_K):
+        """
+        search: 搜索，返回结构与 VectorDatabaseClient.search 一致。
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        rows = self._candidates(query)
+        if rows is not None:
+            # 按位置排序后再读取，对 mmap 的访问更接近顺序读
+            rows = np.sort(rows)
+        scores = self._coarse_scores(query, rows)
+        if self._quantization != "none" and self._rescore_factor > 0:
+            # 量化粗排后，用 float32 原始向量对候选精排
+            best = _top_k(scores, top_k * self._rescore_factor)
+            candidates = np.sort(best if rows is None else rows[best])
+            exact = self._vectors[candidates] @ query
+            best = _top_k(exact, top_k)
+            positions, best_scores = candidates[best], exact[best]
+        else:
+            best = _top_k(scores, top_k)
+            positions = best if rows is None else rows[best]
+            best_scores = scores[best]
+        hits = []
+        for position, score in zip(positions.tolist(), best_scores.tolist()):
+            record = self._entities[position]
+            hits.append({
+                "id": record["id"],
+                "distance": float(score),
+                "entity": record["entity"],
+            })
+        return [hits]
+
+
+class AsyncMemoryMappedVectorIndex:
+    """
+    MemoryMappedVectorIndex 的异步包装，与 AsyncVectorDatabaseClient 接口一致。
+    检索在内存中完成且耗时很短，因此直接在事件循环中执行。
+    """
+    def __init__(self, index: MemoryMappedVectorIndex):
+        self._index = index
+
+    async def search(self, query_embedding: list, top_k: int = Config.MILVUS_SEARCH_TOP_K):
+        return self._index.search(query_embedding, top_k)
+
+
+def build_index_from_milvus(
+    path: str = Config.VECTOR_INDEX_PATH,
+    collection_name: str = Config.MILVUS_COLLECTION_NAME_CFLP,
+    nlist: int = Config.VECTOR_INDEX_NLIST,
+    quantization: str = Config.VECTOR_INDEX_QUANTIZATION,
+    dimension: int = Config.EMBEDDING_DIMENSION,
+    batch_size: int = 1000,
+):
+    """
+    从 Milvus 集合导出全部向量和输出字段，构建内存映射索引。
+    :param path: 索引目录，相对路径相对于项目根目录
+    :param collection_name: Milvus 集合名称
+    :param nlist: IVF 分区数，0 表示不分区
+    :param quantization: 量化方式，none / int8 / binary
+    :param dimension: 索引维度；小于导出向量的维度时截断并重新归一化（与查询时请求的缩短嵌入一致）
+    :param batch_size: 每批导出的条目数
+    """
+    from app.db.milvus import iter_collection_entities
+
+    path = os.path.join(PROJECT_ROOT, path)
+    ids: List = []
+    vectors: List[List[float]] = []
+    entities: List[dict] = []
+    fields = [Config.MILVUS_VECTOR_FIELD] + OUTPUT_FIELDS
+    for id_, row in iter_collection_entities(collection_name, fields, batch_size=batch_size):
+        ids.append(id_)
+        vectors.append(row[Config.MILVUS_VECTOR_FIELD])
+        entities.append({field: row[field] for field in OUTPUT_FIELDS})
+    vectors = shorten_embeddings(np.asarray(vectors, dtype=np.float32), dimension)
+    MemoryMappedVectorIndex.build(path, ids, vectors, entities, nlist=nlist, quantization=quantization)
+    logger.info(f"Built vector index with {len(ids)} entries at {path}")
+
+
+if __name__ == "__main__":
+    # 从 Milvus 导出知识库并构建本地索引
+    build_index_from_milvus()
+    index = MemoryMappedVectorIndex()
+    print(f"索引条目数: {len(index)}, 维度: {index.dimension}")
@@ -2,11 +2,39 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.openapi.utils import get_openapi
 
+from app.api.responses import FastJSONResponse
 from app.api.v1.api import api_router
+from app.api.v1.conversation import SQL_client, conversation_manager
 from app.core.config import Config
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.security import password_hasher
+from app.db.milvus import async_milvus_registry, milvus_registry
+from app.db.session import dispose_engines
+from app.services.keyword_retrieval import build_keyword_index_in_background
+from app.services.knowledge_retrieval import get_async_openai_client
+from app.services.openai_client import close_embedding_coalescer
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：启动时在后台构建关键字索引，关闭时释放长连接和后台线程。
+    """
+    if Config.HYBRID_RETRIEVAL_ENABLED:
+        build_keyword_index_in_background()
+    yield
+    close_embedding_coalescer()
+    milvus_registry.close_all()
+    await async_milvus_registry.close_all()
+    await get_async_openai_client().close()
+    conversation_manager.close()
+    SQL_client.close()
+    password_hasher.close()
+    await dispose_engines()
 
 app = FastAPI(
     title="CFLP RAG API",
@@ -18,7 +46,10 @@ app = FastAPI(
             "url": f"{Config.get_api_url}",
             "description": "Development server"
         },
-    ]
+    ],
+    lifespan=lifespan,
+    # 默认使用 pydantic-core 编码 JSON 响应，见 app/api/responses.py
+    default_response_class=FastJSONResponse,
 )
 
 # 根路由
@@ -29,4 +60,15 @@ def root():
     """
     return {"message": "Welcome to CFLP-AI API"}
 
-app.include_router(api_router)
\ No newline at end of file
+# Prometheus 抓取入口：各阶段及请求耗时直方图，见 app/core/metrics.py
+@app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+app.include_router(api_router)
+# 记录请求耗时并加入 Server-Timing 响应头
+app.add_middleware(MetricsMiddleware)
+
+if __name__ == "__main__":
+    # 单进程开发服务器；生产环境使用 python -m app.serve（多 worker）
+    uvicorn.run(app, host=Config.FASTAPI_SERVER_URL, port=Config.FASTAPI_SERVER_PORT)
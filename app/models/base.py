@@ -1,5 +1,6 @@
 from datetime import datetime
 from sqlalchemy import Column, DateTime
+from sqlalchemy.dialects import mysql
 from sqlalchemy.ext.declarative import declarative_base
 import pytz
 
@@ -10,7 +11,11 @@ Base = declarative_base()  # 映射类的基类
 def get_current_beijing_time():
     return datetime.now(Beijing_tz)
 
+# MySQL 的 DATETIME 默认只保留到秒，同一秒内写入的消息（提问和回答、批量写入）会失去先后顺序，
+# 因此在 MySQL 上使用微秒精度 DATETIME(6)
+Timestamp = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
 class TimestampMixin:
     # 将函数本身 (get_current_beijing_time) 传递给 default 和 onupdate
-    created_at = Column(DateTime, default=get_current_beijing_time, nullable=False)
-    updated_at = Column(DateTime, default=get_current_beijing_time, onupdate=get_current_beijing_time, nullable=False)
\ No newline at end of file
+    created_at = Column(Timestamp, default=get_current_beijing_time, nullable=False)
+    updated_at = Column(Timestamp, default=get_current_beijing_time, onupdate=get_current_beijing_time, nullable=False)
\ No newline at end of file
@@ -1,11 +1,13 @@
 from app.models.base import Base, TimestampMixin
-from sqlalchemy import Column, String, ForeignKey, Integer
+from sqlalchemy import Column, String, ForeignKey, Integer, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.mysql import LONGTEXT, JSON
 import uuid
 
 class Chat(Base, TimestampMixin):
     __tablename__ = 'chats'
+    # 对话列表按用户过滤、按创建时间倒序排列
+    __table_args__ = (Index("ix_chats_user_id_created_at", "user_id", "created_at"),)
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     title = Column(String(255), nullable=False)
     user_id = Column(String(36), ForeignKey('users.id'), nullable=False)
@@ -20,6 +22,8 @@ class Chat(Base, TimestampMixin):
 
 class Message(Base, TimestampMixin):
     __tablename__ = 'messages'
+    # 按对话分页读取消息（InnoDB 二级索引隐含主键 id，即 (chat_id, created_at, id)）
+    __table_args__ = (Index("ix_messages_chat_id_created_at", "chat_id", "created_at"),)
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     role = Column(String(255), nullable=False)
@@ -10,6 +10,17 @@ class MessageBase(BaseModel):
 class MessageCreate(MessageBase):
     chat_id: str
     
+class MessageBatchCreate(BaseModel):
+    """
+    批量写入的消息，可以属于同一用户的多个对话；同一对话中的消息按列表顺序保存。
+    """
+    messages: List[MessageCreate]
+
+class MessageBatchResponse(BaseModel):
+    # 与请求中 messages 一一对应的消息 ID
+    ids: List[str]
+    count: int
+
 class MessageResponse(MessageBase):
     id: str
     chat_id: str
@@ -36,5 +47,25 @@ class ChatResponse(ChatBase):
     class Config:
         # 允许 Pydantic 从 ORM 对象（如 SQLAlchemy 的 Chat）的属性直接构建实例。
         from_attributes = True
-    
-    
\ No newline at end of file
+
+class ChatSummaryResponse(ChatBase):
+    """
+    对话列表（侧边栏）使用的精简结构：不包含消息内容，只有消息数和最后更新时间。
+    """
+    id: str
+    user_id: str
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+    # 对话本身或其中最新一条消息的更新时间，取较晚者
+    last_updated_at: datetime
+
+class MessagePageResponse(BaseModel):
+    """
+    按游标分页的消息列表。messages 按时间升序排列。
+    """
+    messages: List[MessageResponse] = []
+    # 传给 before 参数加载更早的消息；没有更早的消息时为 None
+    prev_cursor: Optional[str] = None
+    # 传给 after 参数加载更新的消息；没有更新的消息时为 None
+    next_cursor: Optional[str] = None
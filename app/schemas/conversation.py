@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class ConversationRequest(BaseModel):
+    user_id: str
+    conversation_id: Optional[str] = None
+    query: str
+
+class ConversationResponse(BaseModel):
+    user_id: str
+    conversation_id: str
+    model_response: str
+
+    class Config:
+        # 允许字段名以 model_ 开头
+        protected_namespaces = ()
+
+class ChatHistoryRequest(BaseModel):
+    user_id: str
+    conversation_id: Optional[str] = None
+    message: str
+    is_user: bool = True
@@ -0,0 +1,162 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import logging
+import signal
+import tempfile
+from typing import List, Optional
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+from app.core.config import Config
+from app.core.metrics import clear_multiprocess_dir
+
+"""
+生产环境启动入口：python -m app.serve
+
+由 gunicorn 主进程预先 fork 多个 uvicorn worker（默认与可用 CPU 核数相同），所有参数来自 Config（SERVER_*）：
+- 事件循环和 HTTP 解析器默认使用 uvloop 和 httptools；
+- worker 异常退出、处理完 SERVER_MAX_REQUESTS 个请求、或常驻内存（包括其子进程，如密码哈希进程池）
+  超过 SERVER_MAX_WORKER_MEMORY_MB 时，由主进程重新拉起一个新的 worker；
+- 每个 worker 有自己的密码哈希进程池。未设置 PASSWORD_HASH_WORKERS 时，每个池的进程数为 CPU 核数 / worker 数
+  （至少 1），所有 worker 的 bcrypt 进程合计约等于 CPU 核数，避免登录高峰时 N 个 worker 各起 N 个进程争抢 N 个核；
+- 收到 SIGTERM 时停止接收新连接，等待进行中的请求完成（最多 SERVER_GRACEFUL_TIMEOUT 秒）后退出。
+应用在各个 worker 中分别导入，本模块不导入 app.main。开发调试时可直接运行 python app/main.py（单进程）。
+"""
+
+logger = logging.getLogger(__name__)
+
+def available_cpus() -> int:
+    """
+    当前进程可用的 CPU 核数（考虑 taskset / cgroup cpuset 限制）。
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def current_rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """
+    进程的常驻内存（字节），无法读取时返回 None。
+    :param pid: 进程号，None 表示当前进程
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def child_pids(pid: int) -> List[int]:
+    """
+    pid 的直接子进程，无法读取 /proc 时返回空列表。
+    """
+    children = []
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            # 进程名可能包含空格和括号，ppid 是最后一个 ")" 之后的第二个字段
+            if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+                children.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    return children
+
+def process_tree_rss_bytes(pid: int) -> Optional[int]:
+    """
+    进程及其直接子进程（密码哈希进程池等）的常驻内存之和（字节），无法读取时返回 None。
+    """
+    rss = current_rss_bytes(pid)
+    if rss is None:
+        return None
+    return rss + sum(current_rss_bytes(child) or 0 for child in child_pids(pid))
+
+def password_hash_workers(workers: int) -> int:
+    """
+    每个 worker 的密码哈希进程数：可用 CPU 核数平均分给各 worker，至少 1 个。
+    """
+    return max(1, available_cpus() // workers)
+
+class ProductionWorker(UvicornWorker):
+    """
+    使用 Config 中配置的事件循环和 HTTP 解析器的 uvicorn worker；
+    每次向主进程发送心跳时检查常驻内存（包括子进程），超过上限后优雅退出，由主进程重新拉起。
+    """
+    CONFIG_KWARGS = {"loop": Config.SERVER_LOOP, "http": Config.SERVER_HTTP}
+
+    async def callback_notify(self) -> None:
+        await super().callback_notify()
+        limit = Config.SERVER_MAX_WORKER_MEMORY_MB
+        if limit <= 0:
+            return
+        rss = process_tree_rss_bytes(self.pid)
+        if rss is not None and rss > limit * 1024 * 1024 and not getattr(self, "_memory_exit", False):
+            self._memory_exit = True
+            self.log.warning(f"Worker {self.pid} uses {rss / 1024 / 1024:.0f} MB (limit {limit} MB), restarting")
+            # 与 gunicorn 停止 worker 的方式相同：处理完进行中的请求后退出
+            os.kill(self.pid, signal.SIGTERM)
+
+class ServerApplication(BaseApplication):
+    """
+    以代码方式配置的 gunicorn 应用。
+    """
+    def __init__(self, app_path: str, options: dict):
+        """
+        :param app_path: ASGI 应用的导入路径，在每个 worker 中导入
+        :param options: gunicorn 配置项
+        """
+        self.app_path = app_path
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from gunicorn.util import import_app
+        return import_app(self.app_path)
+
+def build_options() -> dict:
+    """
+    根据 Config 生成 gunicorn 配置项。
+    """
+    workers = Config.SERVER_WORKERS or available_cpus()
+    return {
+        "bind": f"{Config.FASTAPI_SERVER_URL}:{Config.FASTAPI_SERVER_PORT}",
+        "workers": workers,
+        "worker_class": "app.serve.ProductionWorker",
+        "backlog": Config.SERVER_BACKLOG,
+        "keepalive": Config.SERVER_KEEPALIVE,
+        "timeout": Config.SERVER_TIMEOUT,
+        "graceful_timeout": Config.SERVER_GRACEFUL_TIMEOUT,
+        "max_requests": Config.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": Config.SERVER_MAX_REQUESTS_JITTER,
+        "forwarded_allow_ips": Config.SERVER_FORWARDED_ALLOW_IPS,
+        "accesslog": "-" if Config.SERVER_ACCESS_LOG else None,
+        "errorlog": "-",
+        # worker 心跳文件放在内存文件系统中，避免容器的 overlay 文件系统拖慢心跳
+        "worker_tmp_dir": "/dev/shm" if os.path.isdir("/dev/shm") else None,
+    }
+
+def main():
+    options = build_options()
+    if options["workers"] > 1 and Config.CONVERSATION_BACKEND == "memory":
+        logger.warning("CONVERSATION_BACKEND=memory keeps conversation history per worker; use redis with multiple workers")
+    if Config.PASSWORD_HASH_WORKERS is None:
+        # worker 由 fork 产生，继承这里的设置
+        Config.PASSWORD_HASH_WORKERS = password_hash_workers(options["workers"])
+    if options["workers"] > 1 and not Config.METRICS_MULTIPROCESS_DIR:
+        # 各 worker 的耗时直方图写入共享目录，由 /metrics 汇总；worker 由 fork 产生，继承这里的设置
+        Config.METRICS_MULTIPROCESS_DIR = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "cflp_metrics")
+    clear_multiprocess_dir()
+    ServerApplication("app.main:app", options).run()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
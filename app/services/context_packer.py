@@ -0,0 +1,130 @@
+"""
+上下文组装：把检索命中整理成拼入 Prompt 的知识文本。
+- 按主键和答案文本去重；
+- 丢弃向量相似度低于阈值的命中；
+- 按得分从高到低把答案装入 token 预算，放不下的长答案截断到剩余预算。
+token 数使用与 GPT 模型一致的 tiktoken 编码计算；编码不可用时（未安装或无法下载编码文件）按字符数估算。
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import logging
+from functools import lru_cache
+from typing import List
+
+from app.core.config import Config
+from app.utils.embedding import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# 拼接知识条目时使用的分隔符
+CONTEXT_SEPARATOR = "\n"
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """
+    获取 GPT 模型对应的 tiktoken 编码（进程内只加载一次）。
+    :return: tiktoken 编码；不可用时返回 None
+    """
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(Config.OPENAI_GPT_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts by characters: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    计算文本的 token 数。
+    :param text: 输入文本
+    :return: token 数（编码不可用时为按字符数的保守估计：每个字符计一个 token）
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text)
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    把文本截断到不超过 max_tokens 个 token。
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    # 截断位置可能落在多字节字符中间，丢弃不完整的字符
+    return encoding.decode(tokens[:max_tokens]).rstrip("\ufffd")
+
+
+def hit_score(hit: dict) -> float:
+    """
+    命中的排序得分：融合检索为 RRF 得分，纯向量检索为相似度。
+    """
+    return hit.get("score", hit.get("distance", 0.0))
+
+
+def pack_context(
+    hits: List[dict],
+    token_budget: int = Config.CONTEXT_TOKEN_BUDGET,
+    min_score: float = Config.CONTEXT_MIN_SCORE,
+    max_items: int = Config.CONTEXT_MAX_ITEMS,
+) -> str:
+    """
+    把检索命中组装成知识文本。
+    :param hits: 一次查询的命中列表（Milvus 返回结构中的 knowledge[0]）
+    :param token_budget: 知识文本最多占用的 token 数
+    :param min_score: 向量相似度阈值，只对带 distance 的命中生效；只被关键字检索命中的条目没有 distance，
+        已由 BM25 命中查询中的词，不按相似度过滤
+    :param max_items: 最多拼入的条目数
+    :return: 用换行拼接的答案文本
+    """
+    candidates = [
+        hit for hit in hits
+        if "distance" not in hit or hit["distance"] >= min_score
+    ]
+    candidates.sort(key=hit_score, reverse=True)
+
+    answers = []
+    seen_ids = set()
+    seen_answers = set()
+    remaining = token_budget
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    for hit in candidates:
+        if len(answers) >= max_items or remaining <= 0:
+            break
+        metadata = hit.get("entity", {}).get("metadata") or {}
+        answer = (metadata.get("answer") or "").strip()
+        key = normalize_text(answer)
+        if not answer or hit.get("id") in seen_ids or key in seen_answers:
+            continue
+        seen_ids.add(hit.get("id"))
+        seen_answers.add(key)
+        cost = count_tokens(answer) + (separator_tokens if answers else 0)
+        if cost > remaining:
+            # 预算不足以放下完整答案：只有第一条（得分最高）截断保留，其余跳过，避免拼入半截的低分答案
+            if answers:
+                continue
+            answer = truncate_to_tokens(answer, remaining)
+            cost = remaining
+        answers.append(answer)
+        remaining -= cost
+    return CONTEXT_SEPARATOR.join(answers)
+
+
+if __name__ == "__main__":
+    hits = [
+        {"id": 1, "distance": 0.82, "entity": {"metadata": {"answer": "责任编辑：李四；校对：王五"}}},
+        {"id": 2, "distance": 0.80, "entity": {"metadata": {"answer": "责任编辑：李四；校对：王五"}}},
+        {"id": 3, "distance": 0.12, "entity": {"metadata": {"answer": "无关内容"}}},
+    ]
+    print(pack_context(hits, token_budget=50))
@@ -0,0 +1,268 @@
+"""
+关键字检索：基于 BM25 的进程内倒排索引，以及把多路检索结果合并的倒数排名融合（RRF）。
+分词针对中文问答语料：
+- 书名号中的标题（如《采购师高级 模块五 履行谈判与管控合同》）整体作为一个词；
+- 连续的字母数字（ISBN、模块编号、年份等）作为一个词，ISBN 中的连字符会被去掉；
+- 汉字按单字和相邻双字切分，不依赖额外的分词库。
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import Config
+
+logger = logging.getLogger(__name__)
+
+_TITLE_PATTERN = re.compile(r"《([^《》]+)》")
+_ALNUM_PATTERN = re.compile(r"[0-9a-z]+(?:[-.][0-9a-z]+)*")
+_CJK_PATTERN = re.compile(r"[\u4e00-\u9fff]+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    分词前的规范化：全角转半角（NFKC）并转为小写。
+    """
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def title_terms(text: str) -> List[str]:
+    """
+    书名号中的标题，内部空白合并为一个空格。
+    :param text: 已规范化的文本，见 normalize_text
+    """
+    return [f"《{' '.join(title.split())}》" for title in _TITLE_PATTERN.findall(text)]
+
+
+def alnum_terms(text: str) -> List[List[str]]:
+    """
+    连续的字母数字（ISBN、编号、年份等），每个按连字符和点拆成分段。
+    :param text: 已规范化的文本，见 normalize_text
+    :return: 每个字母数字串的分段列表；"".join(分段) 即去掉连字符后的整体
+    """
+    return [re.split(r"[-.]", word) for word in _ALNUM_PATTERN.findall(text)]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中文友好的分词。
+    :param text: 输入文本
+    :return: 词列表（可能包含重复词，用于统计词频）
+    """
+    text = normalize_text(text)
+    tokens = title_terms(text)
+    for parts in alnum_terms(text):
+        tokens.append("".join(parts))
+        if len(parts) > 1:
+            # 单字符的分段（如 ISBN 中的“7”）区分度太低，不作为独立的词
+            tokens.extend(part for part in parts if len(part) > 1)
+    for run in _CJK_PATTERN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def entity_text(entity: dict) -> str:
+    """
+    取出知识条目中参与关键字检索的文本：问题文本和答案。
+    """
+    metadata = entity.get("metadata") or {}
+    answer = metadata.get("answer", "") if isinstance(metadata, dict) else ""
+    return f"{entity.get('vector_text') or ''}\n{answer}"
+
+
+class BM25Index:
+    """
+    BM25 倒排索引。每个词的倒排表中保存预先计算好的 BM25 权重，检索时只需对命中的倒排表做向量化累加。
+    """
+    def __init__(
+        self,
+        records: Iterable[Tuple[object, dict]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        max_df_ratio: float = Config.KEYWORD_MAX_DF_RATIO,
+    ):
+        """
+        :param records: (主键, 条目字段) 序列，条目字段与向量检索返回的 entity 一致
+        :param k1: BM25 词频饱和参数
+        :param b: BM25 文档长度归一化参数
+        :param max_df_ratio: 出现在超过该比例文档中的词视为停用词（如“的”“是”），不建索引，
+            避免几乎所有条目都被命中而干扰融合排序
+        """
+        self._ids = []
+        self._entities = []
+        term_freqs = []
+        for id_, entity in records:
+            self._ids.append(id_)
+            self._entities.append(entity)
+            term_freqs.append(Counter(tokenize(entity_text(entity))))
+
+        doc_count = len(term_freqs)
+        lengths = np.array([sum(tf.values()) for tf in term_freqs], dtype=np.float32)
+        avg_length = float(lengths.mean()) if doc_count else 0.0
+        postings = defaultdict(list)
+        for doc, tf in enumerate(term_freqs):
+            for term, freq in tf.items():
+                postings[term].append((doc, freq))
+
+        # 词 -> (文档位置数组, BM25 权重数组)
+        self._postings = {}
+        max_df = max(1, int(doc_count * max_df_ratio))
+        for term, entries in postings.items():
+            if len(entries) > max_df:
+                continue
+            docs = np.array([doc for doc, _ in entries], dtype=np.int64)
+            freqs = np.array([freq for _, freq in entries], dtype=np.float32)
+            idf = math.log(1 + (doc_count - len(entries) + 0.5) / (len(entries) + 0.5))
+            norm = k1 * (1 - b + b * lengths[docs] / (avg_length or 1.0))
+            self._postings[term] = (docs, (idf * freqs * (k1 + 1) / (freqs + norm)).astype(np.float32))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def search(self, query: str, top_k: int = Config.KEYWORD_SEARCH_TOP_K) -> List[dict]:
+        """
+        检索与查询最相关的条目。
+        :param query: 查询文本
+        :param top_k: 返回条目数
+        :return: 命中列表，每项为 {"id": ..., "score": BM25 得分, "entity": {...}}，按得分降序
+        """
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                docs, weights = posting
+                scores[docs] += weights
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return []
+        k = min(top_k, matched.size)
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [
+            {"id": self._ids[doc], "score": float(scores[doc]), "entity": self._entities[doc]}
+            for doc in best.tolist()
+        ]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], top_k: int, k: int = Config.RRF_K) -> List[dict]:
+    """
+    倒数排名融合：每个条目的得分为其在各路结果中 1 / (k + 排名) 之和。
+    :param result_lists: 多路检索结果，每路为按相关性降序排列的命中列表（需包含 id，Milvus 的命中已由 normalize_hits 统一）
+    :param top_k: 返回条目数
+    :param k: RRF 平滑常数
+    :return: 融合后的命中列表。每项保留原始字段（向量检索的 distance 等），并把融合得分写入 score。
+        只被关键字检索命中的条目没有 distance：下游按相似度阈值过滤时应保留这类命中（见 pack_context），
+        排序统一使用 score
+    """
+    fused = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.get(hit["id"])
+            if entry is None:
+                entry = fused[hit["id"]] = {key: value for key, value in hit.items() if key != "score"}
+                entry["score"] = 0.0
+            elif "distance" in hit and "distance" not in entry:
+                entry["distance"] = hit["distance"]
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:top_k]
+
+
+_keyword_index: Optional[BM25Index] = None
+# 构建 _keyword_index 时的 Config.KNOWLEDGE_COLLECTION_VERSION；版本变化后重新构建
+_keyword_index_version: Optional[str] = None
+# 构建失败后，在该时间点（time.monotonic()）之前不再重试
+_keyword_index_retry_at = 0.0
+_keyword_index_lock = threading.Lock()
+_keyword_index_thread: Optional[threading.Thread] = None
+# 与 _keyword_index_lock 分开：构建期间（持有 _keyword_index_lock）请求路径仍能立即返回
+_keyword_index_thread_lock = threading.Lock()
+
+
+def load_keyword_records() -> Iterable[Tuple[object, dict]]:
+    """
+    读取构建关键字索引所需的知识条目：使用本地向量索引时直接复用其条目，否则从 Milvus 集合导出。
+    """
+    if Config.VECTOR_BACKEND == "mmap":
+        from app.services.knowledge_retrieval import get_vector_index
+        return [(record["id"], record["entity"]) for record in get_vector_index().records()]
+    from app.db.milvus import iter_collection_entities
+    from app.db.vector_index import OUTPUT_FIELDS
+    return iter_collection_entities(Config.MILVUS_COLLECTION_NAME_CFLP, OUTPUT_FIELDS)
+
+
+def build_keyword_index_in_background() -> threading.Thread:
+    """
+    在后台线程中构建关键字索引（应用启动时调用，导出整个集合可能需要较长时间）。
+    构建进行中时重复调用不会启动新的线程。
+    """
+    global _keyword_index_thread
+    with _keyword_index_thread_lock:
+        if _keyword_index_thread is None or not _keyword_index_thread.is_alive():
+            _keyword_index_thread = threading.Thread(target=get_keyword_index, name="keyword-index", daemon=True)
+            _keyword_index_thread.start()
+        return _keyword_index_thread
+
+
+def _current_keyword_index() -> Optional[BM25Index]:
+    """
+    与当前知识库版本一致的索引；尚未构建或版本已过期时返回 None。
+    """
+    if _keyword_index_version != Config.KNOWLEDGE_COLLECTION_VERSION:
+        return None
+    return _keyword_index
+
+
+def _keyword_index_needs_build() -> bool:
+    """
+    索引缺失或已过期，且不在构建失败后的退避期内。
+    """
+    return _current_keyword_index() is None and time.monotonic() >= _keyword_index_retry_at
+
+
+def get_keyword_index(wait: bool = True) -> Optional[BM25Index]:
+    """
+    获取进程级共享的 BM25 索引。KNOWLEDGE_COLLECTION_VERSION 变化后（重新导入知识库）重新构建。
+    构建失败时记录日志并返回 None，KEYWORD_INDEX_RETRY_SECONDS 之后再重试，期间的查询退化为纯向量检索。
+    :param wait: 索引尚未构建时，True 在当前线程中构建并返回；False 不等待，
+        启动后台构建并返回 None（请求路径使用，构建完成前的查询退化为纯向量检索）
+    """
+    global _keyword_index, _keyword_index_version, _keyword_index_retry_at
+    if not _keyword_index_needs_build():
+        return _current_keyword_index()
+    if not wait:
+        build_keyword_index_in_background()
+        return None
+    with _keyword_index_lock:
+        if _keyword_index_needs_build():
+            version = Config.KNOWLEDGE_COLLECTION_VERSION
+            try:
+                _keyword_index = BM25Index(load_keyword_records())
+                _keyword_index_version = version
+                logger.info(f"Built keyword index with {len(_keyword_index)} entries (collection version {version})")
+            except Exception as e:
+                _keyword_index_retry_at = time.monotonic() + Config.KEYWORD_INDEX_RETRY_SECONDS
+                logger.error(
+                    f"Failed to build keyword index, falling back to vector search only "
+                    f"and retrying in {Config.KEYWORD_INDEX_RETRY_SECONDS}s: {e}"
+                )
+    return _current_keyword_index()
+
+
+if __name__ == "__main__":
+    print(tokenize("《采购师高级 模块五 履行谈判与管控合同》的ISBN 978-7-5167-1234-5 是什么？"))
+    index = BM25Index([
+        (1, {"vector_text": "《采购师高级 模块五 履行谈判与管控合同》的ISBN是什么？", "metadata": {"answer": "ISBN 978-7-5167-1234-5"}}),
+        (2, {"vector_text": "《采购师高级 模块四》的主编是谁？", "metadata": {"answer": "主编：张三"}}),
+    ])
+    print(index.search("9787516712345"))
+    print(reciprocal_rank_fusion([index.search("模块五 ISBN"), index.search("主编")], top_k=2))
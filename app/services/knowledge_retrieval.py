@@ -5,23 +5,99 @@ import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from app.core.config import Config
-from app.db.milvus import VectorDatabaseClient
-from app.services.openai_client import OpenAIClient
+from app.core.metrics import instrument
+from app.db.milvus import AsyncVectorDatabaseClient, VectorDatabaseClient
+from app.db.vector_index import AsyncMemoryMappedVectorIndex, MemoryMappedVectorIndex
+from app.services.keyword_retrieval import get_keyword_index, reciprocal_rank_fusion
+from app.services.openai_client import AsyncOpenAIClient, OpenAIClient
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from functools import lru_cache
+import asyncio
 import logging
 
+# 同步检索路径中用于与向量检索并行执行关键字检索的线程池
+_keyword_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="keyword-search")
+
+@lru_cache(maxsize=None)
+def get_openai_client() -> OpenAIClient:
+    """
+    获取进程内共享的 OpenAIClient（复用底层 HTTP 连接池）。
+    """
+    return OpenAIClient()
+
+@lru_cache(maxsize=None)
+def get_vector_index() -> MemoryMappedVectorIndex:
+    """
+    获取进程内共享的内存映射向量索引（VECTOR_BACKEND="mmap" 时使用）。
+    """
+    return MemoryMappedVectorIndex(Config.VECTOR_INDEX_PATH)
+
+def get_vector_client():
+    """
+    按 Config.VECTOR_BACKEND 获取知识库的向量检索客户端。
+    milvus: 底层 Milvus 连接由 milvus_registry 复用；mmap: 进程内内存映射索引。
+    """
+    if Config.VECTOR_BACKEND == "mmap":
+        return get_vector_index()
+    return VectorDatabaseClient(collection_name=Config.MILVUS_COLLECTION_NAME_CFLP)
+
+@lru_cache(maxsize=None)
+def get_async_openai_client() -> AsyncOpenAIClient:
+    """
+    获取进程内共享的 AsyncOpenAIClient。
+    """
+    return AsyncOpenAIClient()
+
+def get_async_vector_client():
+    """
+    按 Config.VECTOR_BACKEND 获取知识库的异步向量检索客户端。
+    """
+    if Config.VECTOR_BACKEND == "mmap":
+        return AsyncMemoryMappedVectorIndex(get_vector_index())
+    return AsyncVectorDatabaseClient(collection_name=Config.MILVUS_COLLECTION_NAME_CFLP)
+
+@instrument("keyword_search")
+def keyword_search(user_query: str, top_k: int = Config.HYBRID_CANDIDATE_K):
+    """
+    使用 BM25 关键字索引检索，索引不可用或仍在后台构建时返回空列表。
+    :param user_query: 用户输入的查询字符串
+    :param top_k: 返回条目数
+    :return: 命中列表
+    """
+    index = get_keyword_index(wait=False)
+    return index.search(user_query, top_k) if index is not None else []
+
+def fuse_results(vector_results, keyword_hits):
+    """
+    把向量检索结果与关键字检索结果按 RRF 合并，返回结构与向量检索一致。
+    """
+    vector_hits = list(vector_results[0]) if vector_results else []
+    return [reciprocal_rank_fusion([vector_hits, keyword_hits], top_k=Config.MILVUS_SEARCH_TOP_K)]
+
 def retrieve_knowledge(user_query: str):
     """
     使用用户查询从 Milvus 向量数据库检索相关的知识。
+    开启混合检索时，关键字检索在线程池中与向量检索并行执行，结果按 RRF 合并。
     :param user_query: 用户输入的查询字符串
     :return: 返回检索到的知识文本，或者返回 None 如果没有相关结果
     """
+    hybrid = Config.HYBRID_RETRIEVAL_ENABLED
+    # 关键字检索不依赖查询向量，先提交
+    # 复制当前上下文，关键字检索的耗时才会计入本次请求的 Server-Timing
+    keyword_future = (
+        _keyword_executor.submit(contextvars.copy_context().run, keyword_search, user_query) if hybrid else None
+    )
     # 获取查询的向量嵌入
-    openai_client = OpenAIClient()
+    openai_client = get_openai_client()
     query_embedding = openai_client.generate_embedding(user_query)
     # logging.info(f"Generated embedding for query: {user_query}")
     # 查询 Milvus 获取相关内容
-    milvus_client = VectorDatabaseClient(collection_name=Config.MILVUS_COLLECTION_NAME_CFLP)  # 根据实际情况修改
-    search_results = milvus_client.search(query_embedding)
+    milvus_client = get_vector_client()
+    top_k = Config.HYBRID_CANDIDATE_K if hybrid else Config.MILVUS_SEARCH_TOP_K
+    search_results = milvus_client.search(query_embedding, top_k)
+    if keyword_future is not None:
+        search_results = fuse_results(search_results, keyword_future.result())
     # 如果检索到结果，返回相关信息；如果没有，则返回提示
     if search_results:
         # 示例：返回第一个检索到的结果（根据实际结构进行修改）
@@ -31,7 +107,29 @@ def retrieve_knowledge(user_query: str):
     else:
         # logging.info("No relevant knowledge found.")
         return None
-    
+
+async def retrieve_knowledge_async(user_query: str):
+    """
+    retrieve_knowledge 的异步版本。
+    :param user_query: 用户输入的查询字符串
+    :return: 返回检索到的知识文本，或者返回 None 如果没有相关结果
+    """
+    if not Config.HYBRID_RETRIEVAL_ENABLED:
+        query_embedding = await get_async_openai_client().generate_embedding(user_query)
+        search_results = await get_async_vector_client().search(query_embedding)
+        return search_results if search_results else None
+
+    async def vector_search():
+        query_embedding = await get_async_openai_client().generate_embedding(user_query)
+        return await get_async_vector_client().search(query_embedding, Config.HYBRID_CANDIDATE_K)
+
+    # 向量检索与关键字检索（CPU 计算，放到线程中）并行执行
+    vector_results, keyword_hits = await asyncio.gather(
+        vector_search(), asyncio.to_thread(keyword_search, user_query)
+    )
+    search_results = fuse_results(vector_results, keyword_hits)
+    return search_results if search_results else None
+
 if __name__ == "__main__":
     user_query = "《采购师高级 模块五 履行谈判与管控合同》的出版单位和主编是谁？出版时间和ISBN是什么?"
     print(retrieve_knowledge(user_query))
\ No newline at end of file
@@ -1,13 +1,64 @@
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from openai import OpenAI
+import asyncio
+import threading
+from typing import List, Optional
+from openai import AsyncOpenAI, OpenAI
 from app.core.config import Config
+from app.core.metrics import instrument
+from app.utils.embedding import AsyncEmbeddingCoalescer, EmbeddingCoalescer, EmbeddingLookup, get_embedding_cache
 
 """
 
 """
 
+# 各嵌入模型的原生维度；配置的维度更小时通过 dimensions 参数请求缩短的嵌入
+NATIVE_EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+}
+
+def embedding_request_options(model: str, dimension: int) -> dict:
+    """
+    生成嵌入请求的额外参数：配置维度小于模型原生维度时请求缩短的嵌入。
+    :param model: 嵌入模型
+    :param dimension: 配置的嵌入维度
+    :return: 传给 embeddings.create 的额外参数
+    """
+    native = NATIVE_EMBEDDING_DIMENSIONS.get(model)
+    if native is not None and dimension < native:
+        return {"dimensions": dimension}
+    return {}
+
+# 进程级共享的嵌入请求合并器，首次需要时创建
+_embedding_coalescer: Optional[EmbeddingCoalescer] = None
+_embedding_coalescer_lock = threading.Lock()
+
+def get_embedding_coalescer() -> Optional[EmbeddingCoalescer]:
+    """
+    获取同步客户端使用的进程级嵌入请求合并器（未启用时返回 None），批量请求由合并器的后台线程发出。
+    异步客户端使用各自的 AsyncEmbeddingCoalescer，不经过线程。
+    """
+    global _embedding_coalescer
+    if not Config.EMBEDDING_COALESCER_ENABLED:
+        return None
+    if _embedding_coalescer is None:
+        with _embedding_coalescer_lock:
+            if _embedding_coalescer is None:
+                _embedding_coalescer = EmbeddingCoalescer(OpenAIClient()._create_embeddings)
+    return _embedding_coalescer
+
+def close_embedding_coalescer():
+    """
+    关闭进程级嵌入请求合并器（应用关闭时调用）。
+    """
+    global _embedding_coalescer
+    with _embedding_coalescer_lock:
+        if _embedding_coalescer is not None:
+            _embedding_coalescer.close()
+            _embedding_coalescer = None
+
 class OpenAIClient:
     def __init__(self):
         # 初始化 OpenAI 客户端
@@ -18,17 +69,57 @@ class OpenAIClient:
         # GPT 模型和客户端
         self._gpt_model = Config.OPENAI_GPT_MODEL
         self._temperature = Config.TEMPERATURE
+        # 进程级共享的嵌入缓存（未启用时不缓存）
+        self._embeddings = EmbeddingLookup(self._embedding_model, self._embedding_dimension, get_embedding_cache())
         
+    @instrument("embedding")
     def generate_embedding(self, text):
         """
-        使用 OpenAI 生成文本嵌入（Embedding）。
+        使用 OpenAI 生成文本嵌入（Embedding）。命中嵌入缓存时不发起网络请求。
         :param text: 输入的文本
         :return: 返回嵌入向量
         """
-        response = self._client.embeddings.create(input=text, model=self._embedding_model)
-        embedding = response.data[0].embedding # 获取嵌入向量
+        embeddings, missing = self._embeddings.lookup([text])
+        if not missing:
+            return embeddings[0]
+        coalescer = get_embedding_coalescer()
+        if coalescer is not None:
+            # 与其他并发请求合并成一次批量调用
+            embedding = coalescer.embed(text)
+        else:
+            embedding = self._create_embeddings([text])[0]
+        self._embeddings.store([text], [embedding])
         return embedding
 
+    @instrument("embedding")
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量生成文本嵌入。已缓存的文本不再请求，其余文本去重后按批次一次性请求。
+        :param texts: 输入的文本列表
+        :return: 返回与输入顺序一致的嵌入向量列表
+        """
+        embeddings, missing = self._embeddings.lookup(texts)
+        pending = list(missing)
+        vectors = [vector for batch in self._embeddings.batches(pending) for vector in self._create_embeddings(batch)]
+        self._embeddings.fill(embeddings, missing, pending, vectors)
+        self._embeddings.store(pending, vectors)
+        return embeddings
+
+    def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        直接调用嵌入接口（不经过缓存），一次请求多条文本。
+        :param texts: 输入的文本列表
+        :return: 返回与输入顺序一致的嵌入向量列表
+        """
+        response = self._client.embeddings.create(
+            input=texts,
+            model=self._embedding_model,
+            **embedding_request_options(self._embedding_model, self._embedding_dimension),
+        )
+        # 按 index 排序，保证与输入顺序一致
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    @instrument("llm")
     def generate_response(self, messages):
         """
         使用 GPT 模型生成回复。
@@ -44,11 +135,12 @@ class OpenAIClient:
             )
         return response.choices[0].message.content
     
+    @instrument("llm")
     def generate_response_stream(self, messages):
         """
         使用 GPT 模型生成流式回复。
         :param messages: 消息列表，包含历史消息
-        :return: 返回流式生成的文本
+        :return: 生成器，逐块返回生成的文本
         """
         # 启用流式输出
         stream = self._client.chat.completions.create(
@@ -58,8 +150,132 @@ class OpenAIClient:
             stream=True,  # 设置为 True 开启流式输出
         )
         for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                print(chunk.choices[0].delta.content, end="")
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
+
+class AsyncOpenAIClient:
+    """
+    OpenAIClient 的异步版本，基于 AsyncOpenAI，等待网络响应时不占用线程。
+    """
+    def __init__(self):
+        # 初始化 AsyncOpenAI 客户端
+        self._client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY, base_url=Config.OPENAI_BASE_URL)
+        # 嵌入模型和维度
+        self._embedding_model = Config.OPENAI_EMBEDDING_MODEL
+        self._embedding_dimension = Config.EMBEDDING_DIMENSION
+        # GPT 模型和客户端
+        self._gpt_model = Config.OPENAI_GPT_MODEL
+        self._temperature = Config.TEMPERATURE
+        # 与同步客户端共享的嵌入缓存（未启用时不缓存）
+        self._embeddings = EmbeddingLookup(self._embedding_model, self._embedding_dimension, get_embedding_cache())
+        # 在事件循环内合并并发的单条嵌入请求
+        self._coalescer = AsyncEmbeddingCoalescer(self._create_embeddings) if Config.EMBEDDING_COALESCER_ENABLED else None
+
+    async def _lookup(self, texts: List[str]):
+        """
+        查询嵌入缓存：进程内缓存直接在事件循环中查询，磁盘缓存放到线程中查询，避免阻塞事件循环。
+        :return: 同 EmbeddingLookup.lookup
+        """
+        embeddings, missing = self._embeddings.lookup(texts, memory_only=True)
+        cache = self._embeddings.cache
+        if missing and cache is not None and cache.uses_disk:
+            pending = list(missing)
+            disk_embeddings, _ = await asyncio.to_thread(self._embeddings.lookup, pending)
+            self._embeddings.fill(embeddings, missing, pending, disk_embeddings)
+        return embeddings, missing
+
+    async def _store(self, texts: List[str], vectors: List[List[float]]):
+        cache = self._embeddings.cache
+        if cache is not None and cache.uses_disk:
+            await asyncio.to_thread(self._embeddings.store, texts, vectors)
+        else:
+            self._embeddings.store(texts, vectors)
+
+    @instrument("embedding")
+    async def generate_embedding(self, text):
+        """
+        使用 OpenAI 生成文本嵌入（Embedding）。命中嵌入缓存时不发起网络请求。
+        :param text: 输入的文本
+        :return: 返回嵌入向量
+        """
+        embeddings, missing = await self._lookup([text])
+        if not missing:
+            return embeddings[0]
+        if self._coalescer is not None:
+            # 与其他并发请求合并成一次批量调用
+            embedding = await self._coalescer.embed(text)
+        else:
+            embedding = (await self._create_embeddings([text]))[0]
+        await self._store([text], [embedding])
+        return embedding
+
+    @instrument("embedding")
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量生成文本嵌入。已缓存的文本不再请求，其余文本去重后按批次并发请求。
+        :param texts: 输入的文本列表
+        :return: 返回与输入顺序一致的嵌入向量列表
+        """
+        embeddings, missing = await self._lookup(texts)
+        pending = list(missing)
+        results = await asyncio.gather(*(self._create_embeddings(batch) for batch in self._embeddings.batches(pending)))
+        vectors = [vector for batch_vectors in results for vector in batch_vectors]
+        self._embeddings.fill(embeddings, missing, pending, vectors)
+        await self._store(pending, vectors)
+        return embeddings
+
+    async def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        直接调用嵌入接口（不经过缓存），一次请求多条文本。
+        :param texts: 输入的文本列表
+        :return: 返回与输入顺序一致的嵌入向量列表
+        """
+        response = await self._client.embeddings.create(
+            input=texts,
+            model=self._embedding_model,
+            **embedding_request_options(self._embedding_model, self._embedding_dimension),
+        )
+        # 按 index 排序，保证与输入顺序一致
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    @instrument("llm")
+    async def generate_response(self, messages):
+        """
+        使用 GPT 模型生成回复。
+        :param messages: 消息列表，包含历史消息
+        :return: 返回生成的文本
+        """
+        response = await self._client.chat.completions.create(
+            model=self._gpt_model,
+            messages=messages,
+            temperature=self._temperature,
+            )
+        return response.choices[0].message.content
+
+    @instrument("llm")
+    async def generate_response_stream(self, messages):
+        """
+        使用 GPT 模型生成流式回复。
+        :param messages: 消息列表，包含历史消息
+        :return: 异步生成器，逐块返回生成的文本
+        """
+        stream = await self._client.chat.completions.create(
+            model=self._gpt_model,
+            messages=messages,
+            temperature=self._temperature,
+            stream=True,  # 设置为 True 开启流式输出
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
+
+    async def close(self):
+        """
+        发出攒批中的嵌入请求并等待完成，然后关闭底层 HTTP 连接池。
+        """
+        if self._coalescer is not None:
+            await self._coalescer.close()
+        await self._client.close()
 
 if __name__ == "__main__":
     
@@ -82,4 +298,5 @@ if __name__ == "__main__":
     print("模型回复：")
     print(response)
     print("流式模型回复：")
-    OpenAIClient.generate_response_stream(messages)
\ No newline at end of file
+    for text in OpenAIClient.generate_response_stream(messages):
+        print(text, end="", flush=True)
\ No newline at end of file
@@ -4,17 +4,28 @@
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from app.services.knowledge_retrieval import retrieve_knowledge
+from app.core.metrics import instrument
+from app.services.context_packer import pack_context
+from app.services.knowledge_retrieval import retrieve_knowledge, retrieve_knowledge_async
 
+# 未检索到知识时返回的提示，以及检索出错时返回文本的前缀
+NO_KNOWLEDGE_MESSAGE = "对不起，未能找到相关信息。"
+QUERY_ERROR_PREFIX = "查询过程中发生错误: "
+
+@instrument("prompt_assembly")
 def extract_answers_from_knowledge(knowledge):
-    data_str = knowledge[0]
-    answers_str = "\n".join([item["entity"]["metadata"]["answer"] for item in data_str])
-    return(answers_str)
+    """
+    把检索结果组装成知识文本：去重、过滤低相似度命中，并按得分装入 token 预算。
+    :param knowledge: 检索结果（Milvus 返回结构）
+    :return: 知识文本；没有可用的命中时返回 NO_KNOWLEDGE_MESSAGE
+    """
+    return pack_context(knowledge[0]) or NO_KNOWLEDGE_MESSAGE
 
 class RAGProcessor:
     def __init__(self):
         self.knowledge_retrieval = retrieve_knowledge
     
+    @instrument("rag")
     def process_query(self, user_query: str):
         """
         处理用户查询，执行 RAG 流程。
@@ -25,12 +36,34 @@ class RAGProcessor:
             # 第一步：调用知识库检索模块获取相关知识
             knowledge = self.knowledge_retrieval(user_query)
             if not knowledge:
-                return "对不起，未能找到相关信息。"
+                return NO_KNOWLEDGE_MESSAGE
             # 第二步：整合知识
             knowledge_str = extract_answers_from_knowledge(knowledge)
             return(knowledge_str)
         except Exception as e:
-            return f"查询过程中发生错误: {str(e)}"
+            return f"{QUERY_ERROR_PREFIX}{str(e)}"
+
+class AsyncRAGProcessor:
+    """
+    RAGProcessor 的异步版本。
+    """
+    def __init__(self):
+        self.knowledge_retrieval = retrieve_knowledge_async
+
+    @instrument("rag")
+    async def process_query(self, user_query: str):
+        """
+        处理用户查询，执行 RAG 流程。
+        :param user_query: 用户输入的查询字符串
+        :return: 整合后的知识文本
+        """
+        try:
+            knowledge = await self.knowledge_retrieval(user_query)
+            if not knowledge:
+                return NO_KNOWLEDGE_MESSAGE
+            return extract_answers_from_knowledge(knowledge)
+        except Exception as e:
+            return f"{QUERY_ERROR_PREFIX}{str(e)}"
         
 if __name__ == "__main__":
     # 创建 RAGProcessor 实例
@@ -1,13 +1,18 @@
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from functools import lru_cache
 from app.services.openai_client import OpenAIClient
-from app.services.rag_process import RAGProcessor
+from app.services.knowledge_retrieval import get_async_openai_client
+from app.services.rag_process import AsyncRAGProcessor, RAGProcessor, QUERY_ERROR_PREFIX
+from app.services.semantic_cache import get_semantic_cache, is_cacheable
 from app.core.config import Config
+from app.core.metrics import instrument
 
+@lru_cache(maxsize=None)
 def load_prompt_template():
     """
-    加载存储在 app/templates/prompt_template.txt 中的 Prompt 模板。
+    加载存储在 app/templates/prompt_template.txt 中的 Prompt 模板。只在首次调用时读取文件，之后复用缓存。
     :return: 返回 Prompt 模板字符串
     """
     template_path = os.path.join(os.path.dirname(__file__), '..', '..', 'app', 'templates', 'prompt_template.txt')
@@ -30,6 +35,27 @@ def generate_final_response(user_query: str, knowledge_str: str):
     prompt = prompt_template.format(query=user_query, context=knowledge_str)
     return(prompt)
 
+@instrument("prompt_assembly")
+def build_messages(prompt: str, history: list):
+    """
+    把历史对话和当前 Prompt 拼接成发送给大模型的 messages 列表。
+    :param prompt: 拼接好知识的完整 Prompt
+    :param history: 历史对话，第一条为 system 消息
+    :return: messages 列表
+    """
+    messages = []
+    # 保证 system 部分始终在最前面
+    if len(history) > 0 and "system" in history[0]["role"]:
+        messages.append({"role": "system", "content": history[0]["content"]})
+
+    # 拼接用户和助手的历史对话
+    for message in history[1:]:
+        messages.append({"role": message["role"], "content": message["content"]})
+
+    # 添加当前的用户查询
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
 class OpenAI_RAG_Client:
     """
     封装 OpenAI 客户端，提供 RAG（Retrieval Augmented Generation）能力。
@@ -37,30 +63,92 @@ class OpenAI_RAG_Client:
     def __init__(self):
         self._client = OpenAIClient()
         self._rag_processor = RAGProcessor()
+        self._semantic_cache = get_semantic_cache()
     
     def generate_response(self, user_query: str, history: list):
         """
-        根据用户查询生成回复。
+        根据用户查询生成回复。首轮问题与已回答过的问题足够相似时直接复用缓存的回答。
         :param user_query: 用户输入的查询
         :return: 模型生成的回复
         """
+        use_cache = self._semantic_cache is not None and is_cacheable(history)
+        if use_cache:
+            # 查询向量会被嵌入缓存保存，随后的知识检索不会再次请求嵌入接口
+            query_embedding = self._client.generate_embedding(user_query)
+            cached = self._semantic_cache.lookup(query_embedding, Config.KNOWLEDGE_COLLECTION_VERSION, user_query)
+            if cached is not None:
+                return cached
         # 使用 RAGProcessor 处理查询，获取知识
         knowledge = self._rag_processor.process_query(user_query)
         prompt = generate_final_response(user_query, knowledge)
-        # 创建一个messages列表
-        messages = []
-        # 保证 system 部分始终在最前面
-        if len(history) > 0 and "system" in history[0]["role"]:
-            messages.append({"role": "system", "content": history[0]["content"]})
+        messages = build_messages(prompt, history)
+        response = self._client.generate_response(messages)
+        # 检索出错时生成的回答不缓存
+        if use_cache and not knowledge.startswith(QUERY_ERROR_PREFIX):
+            self._semantic_cache.store(user_query, query_embedding, response, Config.KNOWLEDGE_COLLECTION_VERSION)
+        return response
 
-        # 拼接用户和助手的历史对话
-        for message in history[1:]:
-            messages.append({"role": message["role"], "content": message["content"]})
+class AsyncOpenAI_RAG_Client:
+    """
+    OpenAI_RAG_Client 的异步版本：检索和大模型调用都不阻塞事件循环。
+    """
+    def __init__(self):
+        self._client = get_async_openai_client()
+        self._rag_processor = AsyncRAGProcessor()
+        self._semantic_cache = get_semantic_cache()
 
-        # 添加当前的用户查询
-        messages.append({"role": "user", "content": prompt})
-        response = self._client.generate_response(messages)
+    async def _lookup_cache(self, user_query: str, history: list):
+        """
+        查询语义答案缓存。
+        :return: (缓存的回答或 None, 查询向量或 None)；不适用缓存时两者均为 None
+        """
+        if self._semantic_cache is None or not is_cacheable(history):
+            return None, None
+        query_embedding = await self._client.generate_embedding(user_query)
+        cached = self._semantic_cache.lookup(query_embedding, Config.KNOWLEDGE_COLLECTION_VERSION, user_query)
+        return cached, query_embedding
+
+    def _store_cache(self, user_query: str, query_embedding, knowledge: str, response: str):
+        # 检索出错时生成的回答不缓存
+        if query_embedding is not None and not knowledge.startswith(QUERY_ERROR_PREFIX):
+            self._semantic_cache.store(user_query, query_embedding, response, Config.KNOWLEDGE_COLLECTION_VERSION)
+
+    async def generate_response(self, user_query: str, history: list):
+        """
+        根据用户查询生成回复。首轮问题与已回答过的问题足够相似时直接复用缓存的回答。
+        :param user_query: 用户输入的查询
+        :param history: 历史对话
+        :return: 模型生成的回复
+        """
+        cached, query_embedding = await self._lookup_cache(user_query, history)
+        if cached is not None:
+            return cached
+        knowledge = await self._rag_processor.process_query(user_query)
+        prompt = generate_final_response(user_query, knowledge)
+        messages = build_messages(prompt, history)
+        response = await self._client.generate_response(messages)
+        self._store_cache(user_query, query_embedding, knowledge, response)
         return response
+
+    async def generate_response_stream(self, user_query: str, history: list):
+        """
+        根据用户查询流式生成回复：检索完成后立即开始逐块返回模型输出。
+        :param user_query: 用户输入的查询
+        :param history: 历史对话
+        :return: 异步生成器，逐块返回生成的文本
+        """
+        cached, query_embedding = await self._lookup_cache(user_query, history)
+        if cached is not None:
+            yield cached
+            return
+        knowledge = await self._rag_processor.process_query(user_query)
+        prompt = generate_final_response(user_query, knowledge)
+        messages = build_messages(prompt, history)
+        chunks = []
+        async for text in self._client.generate_response_stream(messages):
+            chunks.append(text)
+            yield text
+        self._store_cache(user_query, query_embedding, knowledge, "".join(chunks))
     
 if __name__ == "__main__":
     RAG_Client = OpenAI_RAG_Client()
@@ -0,0 +1,215 @@
+"""
+语义答案缓存：当新问题的嵌入向量与已缓存问题的余弦相似度超过阈值，且知识库版本未变化时，直接复用之前的最终回答，
+省去一次完整的大模型调用。
+缓存向量保存在预分配的 float32 矩阵中，一次矩阵乘法即可完成查找；容量满时按 LRU 淘汰，条目超过 TTL 后失效。
+只差一个编号的问题（“模块五”与“模块六”、不同的 ISBN 或书名）嵌入相似度通常仍高于阈值，
+因此命中还要求两个问题中的数字、编号和书名（query_signature）完全一致。
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import re
+import threading
+import time
+from typing import FrozenSet, List, Optional
+
+import numpy as np
+
+from app.core.config import Config
+# 书名和字母数字编号（ISBN、年份、版本号、英文缩写等）与关键字检索使用同一套规范化和切分规则
+from app.services.keyword_retrieval import alnum_terms, normalize_text, title_terms
+
+
+# 带前缀或量词的中文数字，如“模块五”“第三章”“二级”
+_CJK_NUMBER = r"[零〇一二三四五六七八九十百千万两]+"
+_CJK_NUMBER_PATTERN = re.compile(
+    rf"(?:第|模块|单元|卷|册)({_CJK_NUMBER})|({_CJK_NUMBER})(?:[章节册版级期卷篇条款项课部]|单元|模块)"
+)
+
+
+def query_signature(text: str) -> FrozenSet[str]:
+    """
+    提取问题中必须完全一致才能复用回答的部分：书名、字母数字编号和中文编号。
+    :param text: 问题文本
+    :return: 这些片段（规范化后）的集合
+    """
+    text = normalize_text(text)
+    parts = set(title_terms(text))
+    # 连字符和点不影响比较
+    parts.update("".join(word) for word in alnum_terms(text))
+    parts.update(prefixed or suffixed for prefixed, suffixed in _CJK_NUMBER_PATTERN.findall(text))
+    return frozenset(parts)
+
+
+class SemanticCache:
+    """
+    基于向量相似度的答案缓存，线程安全。
+    """
+    def __init__(
+        self,
+        max_size: int = Config.SEMANTIC_CACHE_MAX_SIZE,
+        threshold: float = Config.SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = Config.SEMANTIC_CACHE_TTL,
+    ):
+        """
+        :param max_size: 最大缓存条目数
+        :param threshold: 命中所需的最小余弦相似度
+        :param ttl: 条目存活时间（秒），<= 0 表示不过期
+        """
+        self._max_size = max_size
+        self._threshold = threshold
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (max_size, dim)，首次写入时按维度分配
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._created_at = np.zeros(max_size, dtype=np.float64)
+        self._queries: List[Optional[str]] = [None] * max_size
+        self._answers: List[Optional[str]] = [None] * max_size
+        self._signatures: List[Optional[FrozenSet[str]]] = [None] * max_size
+        self._version: Optional[str] = None  # 当前缓存条目对应的知识库版本
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.signature_mismatches = 0  # 相似度达到阈值但编号 / 书名不一致而未命中的次数
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, embedding: List[float], version: str, query_text: Optional[str] = None) -> Optional[str]:
+        """
+        查找与给定问题语义相近的已缓存回答。
+        :param embedding: 问题的嵌入向量
+        :param version: 当前知识库版本，只有版本一致的条目才会命中
+        :param query_text: 问题文本；提供时还要求 query_signature 与缓存的问题一致
+        :return: 缓存的回答，未命中时返回 None
+        """
+        query = self._normalize(embedding)
+        signature = query_signature(query_text) if query_text is not None else None
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None or query.shape[0] != self._vectors.shape[1] or not self._valid.any():
+                self.misses += 1
+                return None
+            # 知识库版本变化后所有条目失效，过期条目同样失效
+            self._check_version(version)
+            if self._ttl > 0:
+                self._valid &= (now - self._created_at) <= self._ttl
+            candidates = np.flatnonzero(self._valid)
+            if candidates.size == 0:
+                self.misses += 1
+                return None
+            similarities = self._vectors[candidates] @ query
+            above = np.flatnonzero(similarities >= self._threshold)
+            # 按相似度从高到低，取第一个编号 / 书名一致的条目
+            for best in above[np.argsort(-similarities[above], kind="stable")].tolist():
+                slot = candidates[best]
+                if signature is None or self._signatures[slot] == signature:
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    return self._answers[slot]
+            if above.size:
+                self.signature_mismatches += 1
+            self.misses += 1
+            return None
+
+    def store(self, query: str, embedding: List[float], answer: str, version: str):
+        """
+        缓存一个问题的最终回答。
+        :param query: 问题文本，用于提取 query_signature
+        :param embedding: 问题的嵌入向量
+        :param answer: 最终回答
+        :param version: 生成回答时的知识库版本
+        """
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                # 首次写入（或嵌入维度变化）时重新分配
+                self._vectors = np.zeros((self._max_size, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+            self._check_version(version)
+            free = np.flatnonzero(~self._valid)
+            if free.size:
+                slot = int(free[0])
+            else:
+                # 淘汰最久未使用的条目
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._last_used[slot] = now
+            self._created_at[slot] = now
+            self._queries[slot] = query
+            self._answers[slot] = answer
+            self._signatures[slot] = query_signature(query)
+
+    def _check_version(self, version: str):
+        """
+        知识库版本变化时清空所有条目。调用方需持有 _lock。
+        """
+        if version != self._version:
+            self._valid[:] = False
+            self._version = version
+
+    def clear(self):
+        """
+        清空缓存（例如知识库重新导入之后）。
+        """
+        with self._lock:
+            self._valid[:] = False
+
+    def stats(self) -> dict:
+        """
+        返回缓存命中统计。
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "signature_mismatches": self.signature_mismatches,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": int(self._valid.sum()),
+            }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    获取进程级共享的语义答案缓存（首次调用时创建）。
+    :return: SemanticCache 实例；未启用时返回 None
+    """
+    global _semantic_cache
+    if not Config.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+
+def is_cacheable(history: list) -> bool:
+    """
+    只有对话的首轮问题才使用语义缓存：追问的回答依赖上下文，不能跨对话复用。
+    :param history: 历史对话
+    :return: 是否可以查询/写入语义缓存
+    """
+    return not any(message["role"] == "user" for message in history)
+
+
+if __name__ == "__main__":
+    cache = SemanticCache(max_size=2, threshold=0.9, ttl=60)
+    cache.store("《采购师》的ISBN是什么？", [1.0, 0.0, 0.1], "ISBN 978-7-xxx", version="v1")
+    print(cache.lookup([0.98, 0.0, 0.12], version="v1", query_text="《采购师》的 ISBN 是多少？"))
+    print(cache.lookup([0.98, 0.0, 0.12], version="v2"))
+    print(cache.stats())
@@ -0,0 +1,595 @@
+"""
+文本嵌入（Embedding）相关的工具，包括两级嵌入缓存：
+- 进程内 LRU 缓存：按容量和 TTL 淘汰，命中时无需任何 IO。
+- 磁盘 float32 存储：基于 SQLite（WAL 模式），重启后仍然有效，并可被同一主机上的所有 uvicorn worker 共享。
+缓存键为 (嵌入模型, 向量维度, 规范化文本的哈希)。
+以及嵌入请求合并器：把并发请求在几毫秒内攒成一批，一次调用嵌入接口。
+EmbeddingCoalescer 供同步客户端使用（后台线程），AsyncEmbeddingCoalescer 供异步客户端使用（事件循环内）。
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import asyncio
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import PROJECT_ROOT, Config
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化文本：Unicode NFKC（全角转半角等）、去除首尾空白并合并连续空白。
+    :param text: 原始文本
+    :return: 规范化后的文本
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
+
+
+def make_cache_key(model: str, dimension: int, text: str) -> str:
+    """
+    生成嵌入缓存键。
+    :param model: 嵌入模型名称
+    :param dimension: 向量维度
+    :param text: 原始文本（内部会先规范化）
+    :return: 缓存键字符串
+    """
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{dimension}:{digest}"
+
+
+def shorten_embeddings(vectors: np.ndarray, dimension: int) -> np.ndarray:
+    """
+    把嵌入截断到前 dimension 维并重新 L2 归一化。
+    text-embedding-3 系列的嵌入支持这种缩短方式，效果与请求时指定 dimensions 参数一致。
+    :param vectors: (n, dim) 或 (dim,) 向量
+    :param dimension: 目标维度
+    :return: 缩短后的 float32 向量
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimension >= vectors.shape[-1]:
+        return vectors
+    shortened = vectors[..., :dimension]
+    norms = np.linalg.norm(shortened, axis=-1, keepdims=True)
+    return shortened / np.where(norms > 0, norms, 1.0)
+
+
+class EmbeddingCache:
+    """
+    两级嵌入缓存：进程内 LRU（容量 + TTL 淘汰）+ 磁盘 float32 存储。
+    所有方法都是线程安全的。
+    """
+    def __init__(
+        self,
+        max_size: int = Config.EMBEDDING_CACHE_MAX_SIZE,
+        ttl: float = Config.EMBEDDING_CACHE_TTL,
+        path: Optional[str] = Config.EMBEDDING_CACHE_PATH,
+        disk_max_entries: int = Config.EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+    ):
+        """
+        :param max_size: 进程内缓存的最大条目数
+        :param ttl: 进程内缓存条目的存活时间（秒），<= 0 表示不过期
+        :param path: 磁盘缓存文件路径，为空时只使用进程内缓存；相对路径相对于项目根目录。
+            文件在第一次读写磁盘缓存时才创建
+        :param disk_max_entries: 磁盘缓存的最大条目数，超出后按写入时间淘汰最旧的条目
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (写入时间, np.ndarray)
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_writes = 0
+        # 命中统计
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._path = os.path.join(PROJECT_ROOT, path) if path else None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_opened = False
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """
+        磁盘缓存连接，首次使用时打开；未配置或打开失败时返回 None。调用方需持有 _disk_lock。
+        """
+        if not self._disk_opened:
+            self._disk_opened = True
+            self._conn = self._open_disk_store(self._path) if self._path else None
+        return self._conn
+
+    def _open_disk_store(self, path: str) -> Optional[sqlite3.Connection]:
+        """
+        打开（必要时创建）磁盘缓存。打开失败时只记录日志并退化为纯内存缓存。
+        """
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            # WAL 模式允许多个 worker 进程并发读、单个写
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, "
+                "dimension INTEGER NOT NULL, "
+                "vector BLOB NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_created_at ON embeddings (created_at)")
+            return conn
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache unavailable ({path}): {e}")
+            return None
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """
+        查询缓存，先查进程内缓存，再查磁盘缓存（磁盘命中会回填进程内缓存）。
+        :param key: 缓存键，见 make_cache_key
+        :return: 嵌入向量，未命中时返回 None
+        """
+        vector = self._memory_get(key)
+        if vector is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return vector.tolist()
+
+        vector = self._disk_get(key)
+        if vector is not None:
+            self._memory_set(key, vector)
+            with self._lock:
+                self.disk_hits += 1
+            return vector.tolist()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_memory(self, key: str, count_miss: bool = False) -> Optional[List[float]]:
+        """
+        只查询进程内缓存，不做任何 IO，可以直接在事件循环中调用。
+        :param count_miss: 未命中时是否计入统计；调用方随后会用 get 查询磁盘缓存时传 False，避免重复计数
+        """
+        vector = self._memory_get(key)
+        if vector is None:
+            if count_miss:
+                with self._lock:
+                    self.misses += 1
+            return None
+        with self._lock:
+            self.memory_hits += 1
+        return vector.tolist()
+
+    @property
+    def uses_disk(self) -> bool:
+        """
+        是否配置了磁盘缓存（get / set 可能阻塞在磁盘 IO 上）。
+        """
+        return self._path is not None
+
+    def set(self, key: str, embedding: List[float]):
+        """
+        写入缓存（同时写入进程内缓存和磁盘缓存）。
+        :param key: 缓存键，见 make_cache_key
+        :param embedding: 嵌入向量
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._memory_set(key, vector)
+        self._disk_set(key, vector)
+
+    def _memory_get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            created_at, vector = item
+            if self._ttl > 0 and time.monotonic() - created_at > self._ttl:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return vector
+
+    def _memory_set(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._memory[key] = (time.monotonic(), vector)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._max_size:
+                self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        if self._path is None:
+            return None
+        try:
+            with self._disk_lock:
+                conn = self._connection()
+                if conn is None:
+                    return None
+                row = conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _disk_set(self, key: str, vector: np.ndarray):
+        if self._path is None:
+            return
+        try:
+            with self._disk_lock:
+                conn = self._connection()
+                if conn is None:
+                    return
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, dimension, vector, created_at) VALUES (?, ?, ?, ?)",
+                    (key, int(vector.shape[0]), vector.tobytes(), time.time()),
+                )
+                self._disk_writes += 1
+                # 每写入一定次数检查一次磁盘容量，避免每次写入都做全表统计
+                if self._disk_writes % 100 == 0:
+                    self._prune_disk()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache write failed: {e}")
+
+    def _prune_disk(self):
+        """
+        删除超出 disk_max_entries 的最旧条目。调用方需持有 _disk_lock。
+        """
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self._disk_max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY created_at ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def clear(self):
+        """
+        清空进程内缓存和磁盘缓存，并重置统计。
+        """
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+        if self._path is not None:
+            with self._disk_lock:
+                conn = self._connection()
+                if conn is not None:
+                    conn.execute("DELETE FROM embeddings")
+
+    def stats(self) -> dict:
+        """
+        返回缓存命中统计。
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_size": len(self._memory),
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    获取进程级共享的嵌入缓存实例（首次调用时创建）。
+    :return: EmbeddingCache 实例；未启用缓存时返回 None
+    """
+    global _embedding_cache
+    if not Config.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+class EmbeddingLookup:
+    """
+    同步和异步嵌入客户端共用的缓存查询、批次拆分和结果回填逻辑。
+    本身不发起嵌入请求；get / set 可能访问磁盘缓存，异步客户端需放到线程中调用。
+    """
+    def __init__(self, model: str, dimension: int, cache: Optional[EmbeddingCache]):
+        """
+        :param model: 嵌入模型名称
+        :param dimension: 向量维度
+        :param cache: 嵌入缓存，为 None 时不缓存
+        """
+        self._model = model
+        self._dimension = dimension
+        self.cache = cache
+
+    def lookup(self, texts: List[str], memory_only: bool = False) -> Tuple[List[Optional[List[float]]], Dict[str, List[int]]]:
+        """
+        查询缓存。
+        :param texts: 输入的文本列表
+        :param memory_only: 只查询进程内缓存（不做 IO）
+        :return: (与输入顺序一致的向量列表（未命中为 None）, 未命中的文本 -> 其在输入中的位置)
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if self.cache is not None:
+                key = make_cache_key(self._model, self._dimension, text)
+                if memory_only:
+                    # 没有磁盘缓存时调用方不会再调用 get，未命中在这里计入统计
+                    embedding = self.cache.get_memory(key, count_miss=not self.cache.uses_disk)
+                else:
+                    embedding = self.cache.get(key)
+                if embedding is not None:
+                    embeddings[i] = embedding
+                    continue
+            missing.setdefault(text, []).append(i)
+        return embeddings, missing
+
+    @staticmethod
+    def fill(embeddings: List[Optional[List[float]]], missing: Dict[str, List[int]], texts: List[str], vectors: List[Optional[List[float]]]):
+        """
+        把 texts 对应的向量回填到 embeddings 中，并从 missing 中移除已回填的文本（向量为 None 的保留）。
+        """
+        for text, vector in zip(texts, vectors):
+            if vector is not None:
+                for i in missing.pop(text):
+                    embeddings[i] = vector
+
+    @staticmethod
+    def batches(texts: List[str]) -> List[List[str]]:
+        """
+        按 EMBEDDING_BATCH_MAX_SIZE 拆分批量请求。
+        """
+        batch_size = Config.EMBEDDING_BATCH_MAX_SIZE
+        return [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+
+    def store(self, texts: List[str], vectors: List[List[float]]):
+        """
+        把新生成的向量写入缓存。
+        """
+        if self.cache is None:
+            return
+        for text, vector in zip(texts, vectors):
+            self.cache.set(make_cache_key(self._model, self._dimension, text), vector)
+
+
+class EmbeddingCoalescer:
+    """
+    嵌入请求合并器。
+    调用方线程通过 submit/embed 提交单条文本，后台线程在 max_wait_ms 内（或攒满 max_batch_size 条时）
+    把这些文本合并成一次批量请求，再把结果分发回各个调用方。
+    submit 返回 concurrent.futures.Future，异步代码可以用 asyncio.wrap_future 等待。
+    """
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int = Config.EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms: float = Config.EMBEDDING_BATCH_MAX_WAIT_MS,
+        max_concurrency: int = Config.EMBEDDING_BATCH_MAX_CONCURRENCY,
+    ):
+        """
+        :param batch_fn: 批量嵌入函数，输入文本列表，按相同顺序返回向量列表
+        :param max_batch_size: 单批最大文本数
+        :param max_wait_ms: 攒批的最长等待时间（毫秒）
+        :param max_concurrency: 同时在途的批量请求数
+        """
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embedding-batch")
+        self._closed = False
+        # 统计：提交的文本数和实际发出的批量请求数
+        self.submitted = 0
+        self.batches = 0
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="embedding-coalescer", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """
+        提交一条待嵌入文本。
+        :param text: 输入的文本
+        :return: Future，结果为嵌入向量
+        """
+        if self._closed:
+            raise RuntimeError("EmbeddingCoalescer is closed")
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """
+        提交一条文本并阻塞等待其嵌入向量。
+        :param text: 输入的文本
+        :return: 嵌入向量
+        """
+        return self.submit(text).result()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self._max_wait
+            stop = False
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._executor.submit(self._dispatch, batch)
+            if stop:
+                break
+
+    def _dispatch(self, batch: List[tuple]):
+        # 跳过调用方已取消的请求；其余 Future 标记为运行中，之后不能再被取消，set_result 不会失败
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # 同一批内的重复文本只请求一次
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        with self._stats_lock:
+            self.submitted += len(batch)
+            self.batches += 1
+        try:
+            vectors = self._batch_fn(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Embedding batch returned {len(vectors)} vectors for {len(texts)} texts")
+            vectors = dict(zip(texts, vectors))
+            for text, future in batch:
+                future.set_result(vectors[text])
+        except Exception as e:
+            # 任何一步失败都要让所有尚未完成的调用方收到异常，否则它们会一直阻塞在 embed() 中
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def close(self):
+        """
+        停止后台线程；已提交的请求会被处理完。
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        """
+        返回合并统计：提交文本数、批量请求数以及平均批大小。
+        """
+        with self._stats_lock:
+            return {
+                "submitted": self.submitted,
+                "batches": self.batches,
+                "avg_batch_size": self.submitted / self.batches if self.batches else 0.0,
+            }
+
+
+class AsyncEmbeddingCoalescer:
+    """
+    EmbeddingCoalescer 的事件循环版本：并发的协程在 max_wait_ms 内（或攒满 max_batch_size 条时）
+    合并成一次批量请求，不占用线程。同一实例只能在一个事件循环中使用。
+    """
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = Config.EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms: float = Config.EMBEDDING_BATCH_MAX_WAIT_MS,
+        max_concurrency: int = Config.EMBEDDING_BATCH_MAX_CONCURRENCY,
+    ):
+        """
+        :param batch_fn: 异步批量嵌入函数，输入文本列表，按相同顺序返回向量列表
+        :param max_batch_size: 单批最大文本数
+        :param max_wait_ms: 攒批的最长等待时间（毫秒）
+        :param max_concurrency: 同时在途的批量请求数
+        """
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000.0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: List[tuple] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        # 统计：提交的文本数和实际发出的批量请求数
+        self.submitted = 0
+        self.batches = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        提交一条文本并等待其嵌入向量。
+        :param text: 输入的文本
+        :return: 嵌入向量
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch))
+            # 保留任务引用，避免在完成前被回收
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[tuple]):
+        # 同一批内的重复文本只请求一次
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.submitted += len(batch)
+        self.batches += 1
+        try:
+            async with self._semaphore:
+                vectors = await self._batch_fn(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Embedding batch returned {len(vectors)} vectors for {len(texts)} texts")
+            vectors = dict(zip(texts, vectors))
+            for text, future in batch:
+                # 调用方可能已经取消等待
+                if not future.done():
+                    future.set_result(vectors[text])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def close(self):
+        """
+        立即发出攒批中的请求，并等待所有在途的批量请求完成。
+        """
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        """
+        返回合并统计：提交文本数、批量请求数以及平均批大小。
+        """
+        return {
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "avg_batch_size": self.submitted / self.batches if self.batches else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    cache = EmbeddingCache(max_size=2, ttl=60, path=None)
+    key = make_cache_key(Config.OPENAI_EMBEDDING_MODEL, 3, "  《采购师》 的ISBN是什么？ ")
+    print(cache.get(key))
+    cache.set(key, [0.1, 0.2, 0.3])
+    print(cache.get(make_cache_key(Config.OPENAI_EMBEDDING_MODEL, 3, "《采购师》 的ISBN是什么？")))
+    print(cache.stats())
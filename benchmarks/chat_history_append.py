@@ -0,0 +1,82 @@
+"""
+chat_history 追加消息的基准：对比旧的 JSON 整体读改写与按行追加。
+
+在同一个对话中连续追加 N 条消息，按区间输出平均每次追加的耗时和写入的字节数。
+旧方式每次追加都读出并重写整个 JSON，耗时和写入量随对话长度线性增长；按行追加应保持平稳。
+需要可连接的 MySQL（使用 .env 中的 MYSQL_* 配置），测试数据写入后会被删除。
+
+用法：
+    python benchmarks/chat_history_append.py --messages 500 --message-size 400
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import json
+import time
+from uuid import uuid4
+
+from app.db.mysql_client import SQLClient, beijing_now
+
+
+def legacy_append(db_client: SQLClient, conversation_id: str, message: dict) -> int:
+    """
+    旧的追加方式：读出整个 JSON 历史，追加后整体写回。
+    :return: 写回的字节数
+    """
+    with db_client.transaction() as cursor:
+        cursor.execute("SELECT conversation_history FROM chat_history WHERE id = %s FOR UPDATE", (conversation_id,))
+        history = json.loads(cursor.fetchall()[0]['conversation_history'])
+        history.append(message)
+        payload = json.dumps(history)
+        cursor.execute(
+            "UPDATE chat_history SET conversation_history = %s, timestamp = %s WHERE id = %s",
+            (payload, beijing_now(), conversation_id),
+        )
+    return len(payload.encode())
+
+
+def run(args):
+    db_client = SQLClient()
+    username = f"benchmark-{uuid4()}"
+    content = "采" * args.message_size
+    user_id = db_client.get_or_create_user(username)
+    legacy_id = db_client.create_conversation(user_id)
+    row_id = db_client.create_conversation(user_id)
+    results = {"legacy": [], "rows": []}
+    try:
+        for i in range(args.messages):
+            is_user = i % 2 == 0
+            message = {"role": "user" if is_user else "assistant", "content": content}
+
+            start = time.perf_counter()
+            written = legacy_append(db_client, legacy_id, message)
+            results["legacy"].append((time.perf_counter() - start, written))
+
+            start = time.perf_counter()
+            db_client.append_to_conversation(username, row_id, content, is_user=is_user)
+            results["rows"].append((time.perf_counter() - start, len(content.encode())))
+
+        print(f"{'appends':>12} {'legacy ms':>10} {'legacy bytes':>13} {'rows ms':>9} {'rows bytes':>11}")
+        for start in range(0, args.messages, args.bucket):
+            legacy = results["legacy"][start:start + args.bucket]
+            rows = results["rows"][start:start + args.bucket]
+            print(
+                f"{start + 1:>5}-{start + len(legacy):<6} "
+                f"{sum(t for t, _ in legacy) / len(legacy) * 1000:>10.2f} {sum(b for _, b in legacy) / len(legacy):>13.0f} "
+                f"{sum(t for t, _ in rows) / len(rows) * 1000:>9.2f} {sum(b for _, b in rows) / len(rows):>11.0f}"
+            )
+    finally:
+        with db_client.transaction() as cursor:
+            cursor.execute("DELETE FROM chat_history_messages WHERE conversation_id IN (%s, %s)", (legacy_id, row_id))
+            cursor.execute("DELETE FROM chat_history WHERE user_id = %s", (user_id,))
+            cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        db_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="chat_history 追加消息基准")
+    parser.add_argument("--messages", type=int, default=500, help="每种方式追加的消息数")
+    parser.add_argument("--message-size", type=int, default=400, help="每条消息的字符数")
+    parser.add_argument("--bucket", type=int, default=100, help="统计区间大小")
+    run(parser.parse_args())
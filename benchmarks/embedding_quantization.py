@@ -0,0 +1,109 @@
+"""
+嵌入降维 / 量化的召回率与延迟基准。
+
+对每种 (维度, 量化方式, 精排系数) 组合构建内存映射索引，以 float32 全维度暴力检索为基准计算 recall@k，
+并统计平均检索延迟和每个向量常驻内存的字节数。
+有本地向量索引（VECTOR_INDEX_PATH）时使用其中的真实向量，否则使用随机生成的向量；
+查询为语料向量加少量噪声，模拟改写后的相似问题。
+
+用法：
+    python benchmarks/embedding_quantization.py --dims 3072 1024 256 --top-k 5
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import PROJECT_ROOT, Config
+from app.db.vector_index import MemoryMappedVectorIndex
+from app.utils.embedding import shorten_embeddings
+
+
+def load_corpus(path: str, synthetic_size: int, synthetic_dim: int, seed: int) -> np.ndarray:
+    """
+    读取本地索引中的向量；索引不存在时生成随机的单位向量。相对路径相对于项目根目录。
+    """
+    path = os.path.join(PROJECT_ROOT, path)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        vectors = np.array(MemoryMappedVectorIndex(path)._vectors, dtype=np.float32)
+        print(f"使用本地索引 {path}：{vectors.shape[0]} 条，{vectors.shape[1]} 维")
+        return vectors
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(synthetic_size, synthetic_dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    print(f"未找到本地索引，使用随机向量：{synthetic_size} 条，{synthetic_dim} 维")
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """
+    从语料中抽样并加噪声生成查询向量。
+    """
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.choice(vectors.shape[0], size=min(count, vectors.shape[0]), replace=False)]
+    queries = picked + rng.normal(scale=noise / np.sqrt(vectors.shape[1]), size=picked.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def bytes_per_vector(dimension: int, quantization: str) -> float:
+    """
+    每个向量常驻内存的字节数（量化时 float32 向量只在精排时按需读取）。
+    """
+    if quantization == "int8":
+        return dimension + 4  # int8 编码 + float32 缩放系数
+    if quantization == "binary":
+        return (dimension + 7) // 8
+    return dimension * 4
+
+
+def run(args):
+    vectors = load_corpus(args.index_path, args.size, args.synthetic_dim, args.seed)
+    queries = make_queries(vectors, args.queries, args.noise, args.seed)
+    # 基准：float32 全维度暴力检索
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k]
+    ids = list(range(vectors.shape[0]))
+    entities = [{"vector_text": "", "metadata": {}} for _ in ids]
+
+    print(f"{'dim':>6} {'quant':>7} {'rescore':>7} {'recall@' + str(args.top_k):>9} {'latency(ms)':>11} {'bytes/vec':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for dimension in args.dims:
+            if dimension > vectors.shape[1]:
+                continue
+            corpus = shorten_embeddings(vectors, dimension)
+            shortened_queries = shorten_embeddings(queries, dimension)
+            for quantization in args.quantization:
+                path = os.path.join(workdir, f"{dimension}-{quantization}")
+                MemoryMappedVectorIndex.build(path, ids, corpus, entities, nlist=0, quantization=quantization)
+                factors = args.rescore if quantization != "none" else [0]
+                for factor in factors:
+                    index = MemoryMappedVectorIndex(path, rescore_factor=factor)
+                    hits = 0
+                    start = time.perf_counter()
+                    for query, expected in zip(shortened_queries, truth):
+                        found = {hit["id"] for hit in index.search(query, top_k=args.top_k)[0]}
+                        hits += len(found & set(expected.tolist()))
+                    latency = (time.perf_counter() - start) / len(queries) * 1000
+                    recall = hits / truth.size
+                    print(
+                        f"{dimension:>6} {quantization:>7} {factor:>7} {recall:>9.3f} "
+                        f"{latency:>11.3f} {bytes_per_vector(dimension, quantization):>9.0f}"
+                    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="嵌入降维 / 量化召回率基准")
+    parser.add_argument("--index-path", default=Config.VECTOR_INDEX_PATH, help="本地向量索引目录（相对路径相对于项目根目录）")
+    parser.add_argument("--dims", type=int, nargs="+", default=[3072, 1536, 1024, 512, 256])
+    parser.add_argument("--quantization", nargs="+", default=["none", "int8", "binary"])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[0, 4, 10], help="精排系数（0 表示不精排）")
+    parser.add_argument("--top-k", type=int, default=Config.MILVUS_SEARCH_TOP_K)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.3, help="查询噪声强度")
+    parser.add_argument("--size", type=int, default=20000, help="随机语料条数")
+    parser.add_argument("--synthetic-dim", type=int, default=Config.EMBEDDING_DIMENSION, help="随机语料维度")
+    parser.add_argument("--seed", type=int, default=0)
+    run(parser.parse_args())
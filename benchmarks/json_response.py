@@ -0,0 +1,90 @@
+"""
+对话响应的 JSON 序列化基准：对比 FastAPI 默认的响应路径与 orm_response。
+
+默认路径：按 response_model 校验 ORM 对象 -> 转换为 Python 基本类型 -> 标准库 json 编码（JSONResponse）；
+orm_response：按响应模型校验一次后由 pydantic-core 直接编码为字节。
+构造若干个含 N 条消息的对话（不需要数据库），统计每次序列化 get_chat / list_chats 响应的平均耗时和响应大小。
+
+用法：
+    python benchmarks/json_response.py --chats 20 --messages 200 --message-size 2000
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.api.responses import orm_response
+from app.models.chat import Chat, Message
+from app.models.user import User  # noqa: F401  注册 Chat.user 关系的目标模型
+from app.schemas.chat import ChatResponse
+
+
+def make_chats(chats: int, messages: int, message_size: int) -> List[Chat]:
+    now = datetime.now()
+    result = []
+    for i in range(chats):
+        chat = Chat(id=f"chat-{i}", title=f"对话 {i}", user_id="user-1", created_at=now, updated_at=now)
+        chat.messages = [
+            Message(
+                id=f"message-{i}-{j}",
+                chat_id=chat.id,
+                role="user" if j % 2 == 0 else "assistant",
+                content="采购" * (message_size // 2),
+                meta_data={"index": j},
+                created_at=now + timedelta(microseconds=j),
+                updated_at=now + timedelta(microseconds=j),
+            )
+            for j in range(messages)
+        ]
+        result.append(chat)
+    return result
+
+
+def default_path(field, content) -> bytes:
+    """
+    与 FastAPI 处理 response_model 的方式相同（路由为 async def）。
+    """
+    serialized = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(serialized).body
+
+
+def measure(name: str, func, repeat: int):
+    func()  # 预热（构建校验器 / TypeAdapter）
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:<28} {elapsed * 1000:>10.2f} {len(body) / 1024:>12.1f}")
+    return elapsed
+
+
+def run(args):
+    chats = make_chats(args.chats, args.messages, args.message_size)
+    cases = [
+        ("get_chat", ChatResponse, chats[0]),
+        ("list_chats", List[ChatResponse], chats),
+    ]
+    print(f"对话数: {args.chats}，每个对话消息数: {args.messages}，每条消息字符数: {args.message_size}")
+    print(f"{'响应':<28} {'平均 ms':>10} {'大小 KB':>12}")
+    for name, response_type, content in cases:
+        field = create_response_field(name=f"Response_{name}", type_=response_type)
+        baseline = measure(f"{name} (FastAPI default)", lambda: default_path(field, content), args.repeat)
+        fast = measure(f"{name} (orm_response)", lambda: orm_response(response_type, content).body, args.repeat)
+        print(f"{'':<28} 加速 {baseline / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON 响应序列化基准")
+    parser.add_argument("--chats", type=int, default=20, help="list_chats 返回的对话数")
+    parser.add_argument("--messages", type=int, default=200, help="每个对话的消息数")
+    parser.add_argument("--message-size", type=int, default=2000, help="每条消息的字符数")
+    parser.add_argument("--repeat", type=int, default=20, help="重复次数")
+    run(parser.parse_args())
@@ -0,0 +1,81 @@
+"""
+注册 / 登录中 bcrypt 计算的并发基准：对比在事件循环中直接计算与交给 PasswordHasher 进程池。
+
+模拟 tests/test_async_performance.py 中 test_concurrent_user_operations 的场景：N 个用户并发注册（哈希）后并发登录（验证）。
+同时运行一个每 10 ms 唤醒一次的心跳协程，统计事件循环的最大停顿——它就是同一 worker 上其他请求被额外阻塞的时间。
+直接计算时吞吐量固定在单核水平，且心跳停顿等于全部 bcrypt 计算时间之和；进程池下吞吐量随进程数增长，心跳基本不受影响。
+
+用法：
+    python benchmarks/password_hashing.py --users 32 --rounds 12 --workers 1 2 4 8
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import asyncio
+import time
+
+from app.core.password_hashing import PasswordHasher, check_password, hash_password
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """
+    :return: 事件循环的最大停顿（秒），即实际唤醒间隔超出 interval 的最大值
+    """
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - start - interval)
+    return max_lag
+
+
+async def run_blocking(users: int, rounds: int):
+    """
+    旧方式：async def 路由中直接调用 bcrypt。
+    """
+    async def register_and_login(i: int):
+        hashed = hash_password(f"password-{i}", rounds)
+        await asyncio.sleep(0)  # 模拟注册与登录之间的其他 IO
+        return check_password(f"password-{i}", hashed)
+    return await asyncio.gather(*(register_and_login(i) for i in range(users)))
+
+
+async def run_pool(hasher: PasswordHasher, users: int):
+    async def register_and_login(i: int):
+        hashed = await hasher.hash(f"password-{i}")
+        return await hasher.verify(f"password-{i}", hashed)
+    return await asyncio.gather(*(register_and_login(i) for i in range(users)))
+
+
+async def measure(name: str, work, users: int):
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    results = await work
+    elapsed = time.perf_counter() - start
+    stop.set()
+    max_lag = await lag_task
+    assert all(results)
+    print(f"{name:<16} {elapsed:>8.2f} {users * 2 / elapsed:>10.1f} {max_lag * 1000:>14.1f}")
+
+
+async def main(args):
+    print(f"CPU 核数: {os.cpu_count()}，用户数: {args.users}，bcrypt 代价因子: {args.rounds}")
+    print(f"{'方式':<16} {'耗时 s':>8} {'次 / 秒':>10} {'最大停顿 ms':>14}")
+    await measure("event loop", run_blocking(args.users, args.rounds), args.users)
+    for workers in args.workers:
+        hasher = PasswordHasher(rounds=args.rounds, max_workers=workers, max_pending=0)
+        # 预热：启动进程池中的全部进程
+        await asyncio.gather(*(hasher.verify("x", hash_password("x", 4)) for _ in range(workers)))
+        await measure(f"pool x{workers}", run_pool(hasher, args.users), args.users)
+        hasher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="bcrypt 并发基准")
+    parser.add_argument("--users", type=int, default=32, help="并发注册并登录的用户数")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt 代价因子")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()], help="进程池大小")
+    asyncio.run(main(parser.parse_args()))
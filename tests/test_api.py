@@ -57,6 +57,20 @@ async def client() -> AsyncGenerator[httpx.AsyncClient, None]:
     async with httpx.AsyncClient(base_url=Config.get_api_url) as client:
         yield client
 
+# 健康检查测试
+@pytest.mark.asyncio
+async def test_health(client: httpx.AsyncClient):
+    """测试存活和就绪探针"""
+    response = await client.get("/v1/health/live")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+    response = await client.get("/v1/health/ready")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ok"
+    assert data["checks"]["database"] == "ok"
+
 # 用户认证测试
 @pytest.mark.asyncio
 async def test_register(client: httpx.AsyncClient):
@@ -146,6 +160,64 @@ async def test_get_chats(client: httpx.AsyncClient, access_token: str):
     data = response.json()
     assert isinstance(data, list)
 
+@pytest.mark.asyncio
+async def test_get_chat_summaries(client: httpx.AsyncClient, access_token: str):
+    """测试获取对话列表（不含消息内容）"""
+    chat_id = await test_create_chat(client, access_token)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    await client.post(
+        "/v1/chats/message",
+        headers=headers,
+        json={"chat_id": chat_id, "content": "Summary message", "role": "user"}
+    )
+    response = await client.get("/v1/chats/summary", headers=headers)
+    print(f"获取对话列表响应: {response.text}")  # 添加调试信息
+    assert response.status_code == 200
+    data = response.json()
+    chat = next(item for item in data if item["id"] == chat_id)
+    assert chat["message_count"] == 1
+    assert "messages" not in chat
+    assert "last_updated_at" in chat
+
+@pytest.mark.asyncio
+async def test_get_chat_messages_paginated(client: httpx.AsyncClient, access_token: str):
+    """测试按游标分页获取对话消息：先加载末尾，再向前翻页"""
+    chat_id = await test_create_chat(client, access_token)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for i in range(5):
+        await client.post(
+            "/v1/chats/message",
+            headers=headers,
+            json={"chat_id": chat_id, "content": f"Page message {i}", "role": "user"}
+        )
+    response = await client.get(f"/v1/chats/{chat_id}/messages", headers=headers, params={"limit": 3})
+    print(f"获取消息分页响应: {response.text}")  # 添加调试信息
+    assert response.status_code == 200
+    page = response.json()
+    assert len(page["messages"]) == 3
+    assert page["next_cursor"] is None
+    assert page["prev_cursor"] is not None
+
+    response = await client.get(
+        f"/v1/chats/{chat_id}/messages", headers=headers, params={"limit": 3, "before": page["prev_cursor"]}
+    )
+    assert response.status_code == 200
+    older = response.json()
+    assert len(older["messages"]) == 2
+    assert older["prev_cursor"] is None
+    contents = [message["content"] for message in older["messages"] + page["messages"]]
+    # 同一秒内写入的消息也必须按写入顺序返回
+    assert contents == [f"Page message {i}" for i in range(5)]
+
+    # 从较早一页的 next_cursor 向后翻页，回到最新一页
+    response = await client.get(
+        f"/v1/chats/{chat_id}/messages", headers=headers, params={"limit": 3, "after": older["next_cursor"]}
+    )
+    assert response.status_code == 200
+    newer = response.json()
+    assert [message["id"] for message in newer["messages"]] == [message["id"] for message in page["messages"]]
+    assert newer["next_cursor"] is None
+
 @pytest.mark.asyncio
 async def test_create_message(client: httpx.AsyncClient, access_token: str):
     """测试创建消息"""
@@ -169,6 +241,37 @@ async def test_create_message(client: httpx.AsyncClient, access_token: str):
     assert data["chat_id"] == chat_id
     assert data["role"] == "user"
 
+@pytest.mark.asyncio
+async def test_create_messages_batch(client: httpx.AsyncClient, access_token: str):
+    """测试批量存入消息"""
+    chat_id = await test_create_chat(client, access_token)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    messages = [
+        {"chat_id": chat_id, "content": f"Batch message {i}", "role": "user" if i % 2 == 0 else "assistant"}
+        for i in range(500)
+    ]
+    response = await client.post("/v1/chats/message/batch", headers=headers, json={"messages": messages})
+    print(f"批量存入消息响应: {response.status_code}")  # 添加调试信息
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 500
+    assert len(set(data["ids"])) == 500
+
+    # 同一批消息写入时间相差 1 微秒，读取顺序必须与列表顺序一致
+    response = await client.get(f"/v1/chats/{chat_id}/messages", headers=headers, params={"limit": 200})
+    assert response.status_code == 200
+    page = response.json()
+    assert [message["id"] for message in page["messages"]] == data["ids"][300:]
+    assert [message["content"] for message in page["messages"]] == [f"Batch message {i}" for i in range(300, 500)]
+
+    # 不属于当前用户的对话整批拒绝
+    response = await client.post(
+        "/v1/chats/message/batch",
+        headers=headers,
+        json={"messages": [{"chat_id": str(uuid.uuid4()), "content": "x", "role": "user"}]}
+    )
+    assert response.status_code == 404
+
 @pytest.mark.asyncio
 async def test_get_chat(client: httpx.AsyncClient, access_token: str):
     """测试获取单个聊天"""
@@ -0,0 +1,47 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.services.context_packer import count_tokens, pack_context
+"""
+上下文组装测试（离线运行）
+"""
+
+def make_hit(id_, answer, distance=None, score=None):
+    hit = {"id": id_, "entity": {"vector_text": "", "metadata": {"answer": answer}}}
+    if distance is not None:
+        hit["distance"] = distance
+    if score is not None:
+        hit["score"] = score
+    return hit
+
+def test_dedup_and_score_cutoff():
+    """重复答案只保留一次，低相似度命中被丢弃，仅关键字命中的条目保留"""
+    hits = [
+        make_hit(1, "责任编辑：李四", distance=0.8),
+        make_hit(2, "责任编辑：李四 ", distance=0.7),
+        make_hit(3, "无关内容", distance=0.1),
+        make_hit(4, "校对：王五", score=0.01),
+    ]
+    context = pack_context(hits, token_budget=1000, min_score=0.3)
+    assert context.split("\n") == ["责任编辑：李四", "校对：王五"]
+
+def test_packs_by_score_within_budget():
+    """按得分从高到低装入预算，放不下的低分条目被跳过"""
+    hits = [
+        make_hit(1, "低分答案" * 50, score=0.01),
+        make_hit(2, "高分答案", score=0.03),
+    ]
+    budget = count_tokens("高分答案") + 5
+    context = pack_context(hits, token_budget=budget, min_score=0.0)
+    assert context == "高分答案"
+
+def test_long_top_answer_is_truncated():
+    """得分最高的答案超过预算时截断到预算内"""
+    hits = [make_hit(1, "很长的答案内容。" * 200, distance=0.9)]
+    context = pack_context(hits, token_budget=20, min_score=0.0)
+    assert context
+    assert count_tokens(context) <= 20
+
+def test_empty_when_everything_filtered():
+    hits = [make_hit(1, "无关内容", distance=0.1)]
+    assert pack_context(hits, min_score=0.3) == ""
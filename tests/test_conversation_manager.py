@@ -0,0 +1,54 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from app.db.conversation_manager import ConversationManager
+"""
+进程内对话历史测试（离线运行）
+"""
+
+def test_trim_keeps_system_and_latest_turns():
+    """超过最大长度时从最早的轮次开始剔除，system 消息始终保留"""
+    manager = ConversationManager(max_context_length=200)
+    for i in range(20):
+        manager.update_history("c1", query=f"问题{i}" * 5, response=f"回答{i}" * 5)
+    history = manager.get_history("c1")
+    assert history[0]["role"] == "system"
+    assert sum(len(message["content"]) for message in history) <= 200
+    assert history[-1]["content"] == "回答19" * 5
+    assert [message["role"] for message in history[1:3]] == ["user", "assistant"]
+
+def test_returned_history_is_a_copy():
+    manager = ConversationManager()
+    manager.get_history("c1").append({"role": "user", "content": "x"})
+    assert len(manager.get_history("c1")) == 1
+
+def test_lru_cap_and_ttl():
+    """对话数超过上限时淘汰最久未使用的对话，过期对话重新初始化"""
+    manager = ConversationManager(max_conversations=2, num_shards=1)
+    manager.update_history("a", "q", "r")
+    manager.update_history("b", "q", "r")
+    manager.get_history("a")
+    manager.update_history("c", "q", "r")
+    assert manager.stats()["conversations"] == 2
+    assert manager.stats()["evictions"] == 1
+    assert len(manager.get_history("a")) == 3
+    assert len(manager.get_history("b")) == 1  # 已被淘汰，重新初始化
+
+    expiring = ConversationManager(ttl=1e-9)
+    expiring.update_history("a", "q", "r")
+    assert len(expiring.get_history("a")) == 1
+    assert expiring.stats()["expirations"] == 1
+
+def test_concurrent_updates():
+    """多线程并发追加不会丢失消息"""
+    manager = ConversationManager(max_context_length=10 ** 9)
+    def worker(n):
+        for i in range(200):
+            manager.update_history(f"c{n % 4}", query="q", response="r")
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert manager.stats()["messages"] == 4 + 8 * 200 * 2
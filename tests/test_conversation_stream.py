@@ -0,0 +1,75 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# 模块导入时会创建 OpenAI 客户端，测试中不会真正调用
+os.environ.setdefault("OPENAI_API_KEY", "test")
+import asyncio
+import pytest
+from app.api.v1 import conversation
+from app.db.conversation_manager import ConversationManager
+from app.schemas.conversation import ConversationRequest
+"""
+流式 RAG 接口测试（离线运行，替换大模型和 SQL 客户端）
+"""
+
+class FakeSQLClient:
+    def __init__(self):
+        self.messages = []
+
+    def append_to_conversation(self, username, conversation_id, message, is_user):
+        self.messages.append((conversation_id or "c1", message, is_user))
+        return conversation_id or "c1"
+
+class FakeGPTClient:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    async def generate_response_stream(self, user_query, history):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error:
+            raise self.error
+
+@pytest.fixture
+def sql_client(monkeypatch):
+    client = FakeSQLClient()
+    monkeypatch.setattr(conversation, "SQL_client", client)
+    monkeypatch.setattr(conversation, "conversation_manager", ConversationManager())
+    return client
+
+async def read_stream(stop_after: str):
+    """
+    读取 SSE 事件直到收到 stop_after 事件，然后像客户端断开一样关闭流。
+    """
+    request = ConversationRequest(user_id="u1", conversation_id=None, query="问题")
+    response = await conversation.generate_response_stream_for_user(request)
+    events = []
+    iterator = response.body_iterator
+    async for event in iterator:
+        events.append(event.split("\n", 1)[0].removeprefix("event: "))
+        if events[-1] == stop_after:
+            break
+    await iterator.aclose()
+    # 等待后台写入任务完成
+    while conversation._pending_saves:
+        await asyncio.sleep(0)
+    return events
+
+def test_response_saved_when_client_closes_on_done(monkeypatch, sql_client):
+    monkeypatch.setattr(conversation, "GPT_Client", FakeGPTClient(["你", "好"]))
+    events = asyncio.run(read_stream("done"))
+    assert events == ["meta", "delta", "delta", "done"]
+    assert sql_client.messages[-1] == ("c1", "你好", False)
+    assert conversation.conversation_manager.get_history("c1")[-1]["content"] == "你好"
+
+def test_partial_response_saved_on_disconnect(monkeypatch, sql_client):
+    monkeypatch.setattr(conversation, "GPT_Client", FakeGPTClient(["你", "好"]))
+    asyncio.run(read_stream("delta"))
+    assert sql_client.messages[-1] == ("c1", "你", False)
+
+def test_partial_response_saved_on_error(monkeypatch, sql_client):
+    monkeypatch.setattr(conversation, "GPT_Client", FakeGPTClient(["你"], error=RuntimeError("boom")))
+    events = asyncio.run(read_stream("error"))
+    assert events[-1] == "error"
+    assert sql_client.messages[-1] == ("c1", "你", False)
@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+from app.core.config import PROJECT_ROOT
+from app.utils.embedding import EmbeddingCache, EmbeddingLookup, make_cache_key
+"""
+嵌入缓存测试（离线运行）
+"""
+
+def key(text: str) -> str:
+    return make_cache_key("model", 3, text)
+
+def test_memory_lru_eviction_and_stats():
+    cache = EmbeddingCache(max_size=2, ttl=0, path=None)
+    cache.set(key("a"), [1.0, 0.0, 0.0])
+    cache.set(key("b"), [0.0, 1.0, 0.0])
+    assert cache.get(key("a")) == [1.0, 0.0, 0.0]  # a 变为最近使用
+    cache.set(key("c"), [0.0, 0.0, 1.0])  # 淘汰最久未使用的 b
+    assert cache.get(key("b")) is None
+    assert cache.get(key(" c ")) == [0.0, 0.0, 1.0]  # 键按规范化文本计算
+    assert cache.stats() == {"memory_hits": 2, "disk_hits": 0, "misses": 1, "hit_rate": 2 / 3, "memory_size": 2}
+
+def test_memory_only_lookup_counts_misses_without_disk():
+    """没有磁盘缓存时，只查进程内缓存的查询（异步客户端）同样统计未命中"""
+    cache = EmbeddingCache(max_size=10, ttl=0, path=None)
+    lookup = EmbeddingLookup("model", 3, cache)
+    lookup.store(["a"], [[1.0, 0.0, 0.0]])
+    embeddings, missing = lookup.lookup(["a", "b"], memory_only=True)
+    assert embeddings == [[1.0, 0.0, 0.0], None] and missing == {"b": [1]}
+    assert (cache.stats()["memory_hits"], cache.stats()["misses"]) == (1, 1)
+
+def test_memory_ttl_expiry():
+    cache = EmbeddingCache(max_size=10, ttl=0.05, path=None)
+    cache.set(key("a"), [1.0, 2.0, 3.0])
+    assert cache.get(key("a")) is not None
+    time.sleep(0.1)
+    assert cache.get(key("a")) is None
+    assert cache.stats()["memory_size"] == 0
+
+def test_disk_store_opened_lazily_and_shared_across_instances(tmp_path):
+    path = str(tmp_path / "cache" / "embeddings.sqlite3")
+    writer = EmbeddingCache(max_size=10, ttl=0, path=path)
+    assert not os.path.exists(path)
+    writer.set(key("a"), [0.5, 0.25, 0.125])
+    assert os.path.exists(path)
+
+    # 另一个实例（如另一个 worker）从磁盘命中，并回填进程内缓存
+    reader = EmbeddingCache(max_size=10, ttl=0, path=path)
+    assert reader.get(key("a")) == [0.5, 0.25, 0.125]
+    assert reader.get(key("a")) == [0.5, 0.25, 0.125]
+    stats = reader.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+
+def test_relative_path_resolved_from_project_root():
+    cache = EmbeddingCache(path="data/embedding_cache.sqlite3")
+    assert cache._path == os.path.join(PROJECT_ROOT, "data", "embedding_cache.sqlite3")
@@ -0,0 +1,142 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import threading
+import pytest
+from app.services import openai_client
+from app.utils.embedding import AsyncEmbeddingCoalescer, EmbeddingCache, EmbeddingCoalescer
+"""
+嵌入请求合并与批量嵌入测试（离线运行，使用假的批量嵌入函数）
+"""
+
+def fake_embed(texts):
+    return [[float(len(text)), float(ord(text[0]))] for text in texts]
+
+class RecordingBatchFn:
+    def __init__(self, func=fake_embed):
+        self.func = func
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        return self.func(texts)
+
+def test_coalescer_merges_concurrent_requests_and_dedupes():
+    batch_fn = RecordingBatchFn()
+    coalescer = EmbeddingCoalescer(batch_fn, max_batch_size=16, max_wait_ms=200, max_concurrency=1)
+    try:
+        futures = [coalescer.submit(text) for text in ["a", "bb", "a", "ccc"]]
+        assert [future.result(5) for future in futures] == fake_embed(["a", "bb", "a", "ccc"])
+    finally:
+        coalescer.close()
+    assert batch_fn.calls == [["a", "bb", "ccc"]]
+    assert coalescer.stats() == {"submitted": 4, "batches": 1, "avg_batch_size": 4.0}
+
+def test_coalescer_splits_batches_at_max_size():
+    batch_fn = RecordingBatchFn()
+    coalescer = EmbeddingCoalescer(batch_fn, max_batch_size=2, max_wait_ms=200, max_concurrency=1)
+    try:
+        futures = [coalescer.submit(text) for text in ["a", "b", "c"]]
+        assert [future.result(5) for future in futures] == fake_embed(["a", "b", "c"])
+    finally:
+        coalescer.close()
+    assert batch_fn.calls == [["a", "b"], ["c"]]
+
+@pytest.mark.parametrize("func", [lambda texts: fake_embed(texts)[:-1], lambda texts: 1 / 0])
+def test_coalescer_fails_every_pending_future(func):
+    """批量函数少返回向量或抛出异常时，所有调用方都收到异常而不是一直阻塞"""
+    coalescer = EmbeddingCoalescer(RecordingBatchFn(func), max_batch_size=16, max_wait_ms=200, max_concurrency=1)
+    try:
+        futures = [coalescer.submit(text) for text in ["a", "b", "c"]]
+        for future in futures:
+            with pytest.raises((ValueError, ZeroDivisionError)):
+                future.result(5)
+    finally:
+        coalescer.close()
+
+def test_coalescer_skips_cancelled_futures():
+    """调用方取消的请求不影响同一批的其他调用方"""
+    batch_fn = RecordingBatchFn()
+    coalescer = EmbeddingCoalescer(batch_fn, max_batch_size=16, max_wait_ms=200, max_concurrency=1)
+    try:
+        futures = [coalescer.submit(text) for text in ["a", "bb", "ccc"]]
+        assert futures[1].cancel()
+        assert futures[0].result(5) == fake_embed(["a"])[0]
+        assert futures[2].result(5) == fake_embed(["ccc"])[0]
+    finally:
+        coalescer.close()
+    assert batch_fn.calls == [["a", "ccc"]]
+
+def test_generate_embeddings_dedupes_batches_and_keeps_order(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(openai_client, "get_embedding_cache", lambda: None)
+    monkeypatch.setattr(openai_client.Config, "EMBEDDING_BATCH_MAX_SIZE", 2)
+    client = openai_client.OpenAIClient()
+    batch_fn = RecordingBatchFn()
+    monkeypatch.setattr(client, "_create_embeddings", batch_fn)
+    texts = ["c", "a", "c", "b", "a"]
+    assert client.generate_embeddings(texts) == fake_embed(texts)
+    assert batch_fn.calls == [["c", "a"], ["b"]]
+
+def test_async_coalescer_merges_concurrent_coroutines():
+    calls = []
+
+    async def batch_fn(texts):
+        calls.append(list(texts))
+        return fake_embed(texts)
+
+    async def run():
+        coalescer = AsyncEmbeddingCoalescer(batch_fn, max_batch_size=16, max_wait_ms=20, max_concurrency=1)
+        results = await asyncio.gather(*(coalescer.embed(text) for text in ["a", "bb", "a"]))
+        await coalescer.close()
+        return results
+
+    assert asyncio.run(run()) == fake_embed(["a", "bb", "a"])
+    assert calls == [["a", "bb"]]
+
+def test_async_coalescer_fails_every_pending_future():
+    async def batch_fn(texts):
+        return fake_embed(texts)[:-1]
+
+    async def run():
+        coalescer = AsyncEmbeddingCoalescer(batch_fn, max_batch_size=16, max_wait_ms=20, max_concurrency=1)
+        return await asyncio.gather(*(coalescer.embed(text) for text in ["a", "b"]), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(run()))
+
+def test_async_client_reads_disk_cache_off_the_event_loop(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    cache = EmbeddingCache(max_size=10, ttl=0, path=str(tmp_path / "embeddings.sqlite3"))
+    monkeypatch.setattr(openai_client, "get_embedding_cache", lambda: cache)
+    monkeypatch.setattr(openai_client.Config, "EMBEDDING_COALESCER_ENABLED", True)
+    disk_threads = []
+    disk_get = cache._disk_get
+    monkeypatch.setattr(cache, "_disk_get", lambda key: disk_threads.append(threading.get_ident()) or disk_get(key))
+
+    async def run():
+        client = openai_client.AsyncOpenAIClient()
+        calls = []
+
+        async def create_embeddings(texts):
+            calls.append(list(texts))
+            return fake_embed(texts)
+
+        monkeypatch.setattr(client, "_create_embeddings", create_embeddings)
+        client._coalescer = AsyncEmbeddingCoalescer(create_embeddings, max_wait_ms=20)
+        first = await client.generate_embeddings(["b", "a", "b"])
+        single = await asyncio.gather(client.generate_embedding("c"), client.generate_embedding("d"))
+        # 清空进程内缓存后从磁盘缓存读取，不再请求接口
+        cache._memory.clear()
+        second = await client.generate_embeddings(["a", "c"])
+        await client.close()
+        return first, single, second, calls, threading.get_ident()
+
+    first, single, second, calls, loop_thread = asyncio.run(run())
+    assert first == fake_embed(["b", "a", "b"])
+    assert single == fake_embed(["c", "d"])
+    assert second == fake_embed(["a", "c"])
+    assert calls == [["b", "a"], ["c", "d"]]
+    assert disk_threads and loop_thread not in disk_threads
@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from app.db.milvus import normalize_hits
+from app.services import keyword_retrieval
+from app.services.keyword_retrieval import BM25Index, reciprocal_rank_fusion, tokenize
+"""
+关键字检索与 RRF 融合测试
+"""
+RECORDS = [
+    (1, {"vector_text": "《采购师高级 模块五 履行谈判与管控合同》的ISBN是什么？", "metadata": {"answer": "ISBN 978-7-5167-1234-5"}}),
+    (2, {"vector_text": "《采购师高级 模块四 管理供应商》的主编是谁？", "metadata": {"answer": "主编：张三"}}),
+    (3, {"vector_text": "采购合同的履行要点有哪些？", "metadata": {"answer": "按约定履行合同义务"}}),
+]
+
+def test_tokenize_keeps_titles_and_isbn():
+    """书名号标题和 ISBN 作为完整的词"""
+    tokens = tokenize("《采购师高级 模块五》ISBN：978-7-5167-1234-5")
+    assert "《采购师高级 模块五》" in tokens
+    assert "9787516712345" in tokens
+    assert "模块" in tokens
+
+def test_bm25_ranks_exact_isbn_first():
+    """ISBN 精确匹配的条目排在最前"""
+    index = BM25Index(RECORDS)
+    hits = index.search("书号 9787516712345", top_k=3)
+    assert hits[0]["id"] == 1
+    assert hits[0]["entity"]["metadata"]["answer"].startswith("ISBN")
+
+def test_bm25_no_match_returns_empty():
+    """没有任何词命中时返回空列表"""
+    assert BM25Index(RECORDS).search("xyz", top_k=3) == []
+
+def test_reciprocal_rank_fusion_keeps_vector_distance():
+    """RRF 融合后保留向量检索的 distance，并按融合得分排序"""
+    vector_hits = [
+        {"id": 3, "distance": 0.8, "entity": {}},
+        {"id": 1, "distance": 0.7, "entity": {}},
+    ]
+    keyword_hits = [
+        {"id": 1, "score": 12.0, "entity": {}},
+        {"id": 2, "score": 3.0, "entity": {}},
+    ]
+    fused = reciprocal_rank_fusion([vector_hits, keyword_hits], top_k=3, k=60)
+    assert [hit["id"] for hit in fused] == [1, 3, 2]
+    assert fused[0]["distance"] == 0.7
+    assert "distance" not in fused[2]
+
+def test_milvus_hits_normalized_before_fusion():
+    """主键字段不叫 id 的集合，命中统一为 id 后才能与关键字检索结果融合"""
+    milvus_results = [[
+        {"doc_id": 3, "distance": 0.8, "entity": {"vector_text": "a"}},
+        {"doc_id": 1, "distance": 0.7, "entity": {"vector_text": "b"}},
+    ]]
+    vector_hits = normalize_hits(milvus_results, "doc_id")[0]
+    assert vector_hits[0] == {"id": 3, "distance": 0.8, "entity": {"vector_text": "a"}}
+    fused = reciprocal_rank_fusion([vector_hits, [{"id": 1, "score": 5.0, "entity": {}}]], top_k=2, k=60)
+    assert [hit["id"] for hit in fused] == [1, 3]
+
+def reset_keyword_index(monkeypatch):
+    monkeypatch.setattr(keyword_retrieval, "_keyword_index", None)
+    monkeypatch.setattr(keyword_retrieval, "_keyword_index_version", None)
+    monkeypatch.setattr(keyword_retrieval, "_keyword_index_retry_at", 0.0)
+    monkeypatch.setattr(keyword_retrieval, "_keyword_index_thread", None)
+
+def test_keyword_index_builds_in_background(monkeypatch):
+    """请求路径不等待索引构建：构建完成前返回 None，完成后返回索引"""
+    release = threading.Event()
+
+    def slow_records():
+        release.wait(5)
+        return RECORDS
+
+    reset_keyword_index(monkeypatch)
+    monkeypatch.setattr(keyword_retrieval, "load_keyword_records", slow_records)
+    assert keyword_retrieval.get_keyword_index(wait=False) is None
+    release.set()
+    keyword_retrieval.build_keyword_index_in_background().join(5)
+    assert len(keyword_retrieval.get_keyword_index(wait=False)) == len(RECORDS)
+
+def test_keyword_index_retries_after_failure(monkeypatch):
+    """构建失败后在退避期内不重试，退避期过后重新构建"""
+    calls = []
+
+    def flaky_records():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("milvus not ready")
+        return RECORDS
+
+    reset_keyword_index(monkeypatch)
+    monkeypatch.setattr(keyword_retrieval, "load_keyword_records", flaky_records)
+    monkeypatch.setattr(keyword_retrieval.Config, "KEYWORD_INDEX_RETRY_SECONDS", 60.0)
+    assert keyword_retrieval.get_keyword_index() is None
+    assert keyword_retrieval.get_keyword_index() is None
+    assert len(calls) == 1
+    monkeypatch.setattr(keyword_retrieval, "_keyword_index_retry_at", 0.0)
+    assert len(keyword_retrieval.get_keyword_index()) == len(RECORDS)
+
+def test_keyword_index_rebuilt_when_collection_version_changes(monkeypatch):
+    records = [RECORDS[:1]]
+    reset_keyword_index(monkeypatch)
+    monkeypatch.setattr(keyword_retrieval, "load_keyword_records", lambda: records[0])
+    monkeypatch.setattr(keyword_retrieval.Config, "KNOWLEDGE_COLLECTION_VERSION", "1")
+    assert len(keyword_retrieval.get_keyword_index()) == 1
+    records[0] = RECORDS
+    assert len(keyword_retrieval.get_keyword_index()) == 1
+    monkeypatch.setattr(keyword_retrieval.Config, "KNOWLEDGE_COLLECTION_VERSION", "2")
+    assert len(keyword_retrieval.get_keyword_index()) == len(RECORDS)
@@ -0,0 +1,111 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.metrics import (
+    STAGE_DURATION, Histogram, MetricsMiddleware, _merge_snapshots, instrument, render_metrics, stage, write_snapshot,
+)
+"""
+耗时统计测试（离线运行）
+"""
+
+def stage_count(name: str) -> int:
+    series = STAGE_DURATION.snapshot().get((name,))
+    return series[2] if series else 0
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(("a",), value)
+    lines = list(histogram.render(histogram.snapshot()))
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="a"} 3' in lines
+
+def test_instrument_sync_async_and_async_generator():
+    @instrument("t_sync")
+    def sync_func():
+        return 1
+
+    @instrument("t_async")
+    async def async_func():
+        return 2
+
+    @instrument("t_gen")
+    async def gen_func():
+        yield 3
+        yield 4
+
+    @instrument("t_sync_gen")
+    def sync_gen_func():
+        time.sleep(0.02)
+        yield 5
+        time.sleep(0.02)
+        yield 6
+
+    async def consume():
+        return [item async for item in gen_func()]
+
+    assert sync_func() == 1
+    assert asyncio.run(async_func()) == 2
+    assert asyncio.run(consume()) == [3, 4]
+    assert list(sync_gen_func()) == [5, 6]
+    assert (stage_count("t_sync"), stage_count("t_async"), stage_count("t_gen"), stage_count("t_sync_gen")) == (1, 1, 1, 1)
+    # 同步生成器计入完整的迭代时间，而不只是创建生成器的时间
+    assert STAGE_DURATION.snapshot()[("t_sync_gen",)][1] >= 0.04
+    assert 'cflp_stage_duration_seconds_count{stage="t_gen"} 1' in render_metrics()
+
+def test_server_timing_header_and_request_histogram():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        with stage("t_lookup"):
+            pass
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware)
+    response = TestClient(app).get("/items/1")
+    assert response.status_code == 200
+    names = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    assert names == ["t_lookup", "total"]
+    assert 'cflp_http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"} 1' in render_metrics()
+
+def test_snapshots_merge_across_workers(tmp_path):
+    with stage("t_merge"):
+        pass
+    write_snapshot(str(tmp_path))
+    # 模拟另一个 worker 写入的同名快照
+    os.rename(tmp_path / f"metrics_{os.getpid()}.json", tmp_path / "metrics_1.json")
+    write_snapshot(str(tmp_path))
+    merged = _merge_snapshots(str(tmp_path))
+    assert merged[STAGE_DURATION.name][("t_merge",)][2] == 2 * stage_count("t_merge")
+
+def test_keyword_search_thread_reports_to_request_timings(monkeypatch):
+    """同步检索路径在线程池中执行关键字检索，其耗时仍计入当前请求"""
+    from app.core import metrics
+    from app.services import knowledge_retrieval
+
+    class FakeEmbeddings:
+        def generate_embedding(self, text):
+            return [1.0, 0.0]
+
+    class FakeVectors:
+        def search(self, embedding, top_k):
+            return [[{"id": 1, "distance": 0.9, "entity": {}}]]
+
+    monkeypatch.setattr(knowledge_retrieval.Config, "HYBRID_RETRIEVAL_ENABLED", True)
+    monkeypatch.setattr(knowledge_retrieval, "get_openai_client", FakeEmbeddings)
+    monkeypatch.setattr(knowledge_retrieval, "get_vector_client", FakeVectors)
+    monkeypatch.setattr(knowledge_retrieval, "get_keyword_index", lambda wait=True: None)
+    timings = {}
+    token = metrics._request_timings.set(timings)
+    try:
+        knowledge_retrieval.retrieve_knowledge("问题")
+    finally:
+        metrics._request_timings.reset(token)
+    assert "keyword_search" in timings
@@ -0,0 +1,54 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from app.db import milvus
+from app.db.milvus import MilvusClientRegistry
+"""
+Milvus 客户端注册表测试（离线运行，使用假的 MilvusClient）
+"""
+
+class FakeMilvusClient:
+    # 设置后，连接到该 uri 的客户端在构建时阻塞，模拟不可达的 Milvus 端点
+    blocked_uri = None
+    release = threading.Event()
+
+    def __init__(self, uri, token, db_name):
+        self.uri = uri
+        if uri == FakeMilvusClient.blocked_uri:
+            FakeMilvusClient.release.wait(5)
+
+    def has_collection(self, collection_name):
+        return True
+
+    def close(self):
+        pass
+
+def test_slow_endpoint_does_not_block_cached_clients(monkeypatch):
+    monkeypatch.setattr(milvus, "MilvusClient", FakeMilvusClient)
+    registry = MilvusClientRegistry(health_check_interval=60)
+    cached = registry.get("fast", "", "db", "c")
+    FakeMilvusClient.blocked_uri = "slow"
+    FakeMilvusClient.release.clear()
+    slow = threading.Thread(target=registry.get, args=("slow", "", "db", "c"))
+    slow.start()
+    try:
+        # 另一个端点正在建立连接时，已缓存的客户端和其他端点的新客户端都能立即取得
+        assert registry.get("fast", "", "db", "c") is cached
+        assert registry.get("other", "", "db", "c").uri == "other"
+    finally:
+        FakeMilvusClient.release.set()
+        slow.join(5)
+    assert registry.get("slow", "", "db", "c").uri == "slow"
+
+def test_concurrent_gets_build_one_client(monkeypatch):
+    monkeypatch.setattr(milvus, "MilvusClient", FakeMilvusClient)
+    FakeMilvusClient.blocked_uri = None
+    registry = MilvusClientRegistry(health_check_interval=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("u", "", "db", "c"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len({id(client) for client in results}) == 1
@@ -0,0 +1,18 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.schema import CreateTable
+from app.models.chat import Chat, Message
+from app.models.user import User
+"""
+数据模型测试（离线运行）
+"""
+
+def test_timestamps_keep_microseconds_on_mysql():
+    # 消息分页和批量写入依赖微秒精度的 created_at 保持写入顺序
+    for model in (User, Chat, Message):
+        ddl = str(CreateTable(model.__table__).compile(dialect=mysql.dialect()))
+        assert "created_at DATETIME(6) NOT NULL" in ddl
+        assert "updated_at DATETIME(6) NOT NULL" in ddl
+    assert "created_at DATETIME NOT NULL" in str(CreateTable(Chat.__table__).compile(dialect=sqlite.dialect()))
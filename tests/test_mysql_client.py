@@ -0,0 +1,187 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import threading
+import pytest
+from mysql.connector import errors
+from app.db.mysql_client import SYSTEM_MESSAGE, PoolTimeoutError, SQLClient
+"""
+对话历史 MySQL 客户端测试（离线运行，用假的连接记录执行的 SQL）
+"""
+
+class FakeCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._rows = []
+
+    def execute(self, query, params=()):
+        self._connection.statements.append((" ".join(query.split()), params))
+        self._rows = self._connection.respond(query, params)
+
+    def executemany(self, query, rows):
+        for params in rows:
+            self.execute(query, params)
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.pings = 0
+        self.closed = False
+        # 设置后 execute / rollback 抛出该异常，模拟已断开的连接
+        self.error = None
+
+    def respond(self, query, params):
+        if self.error:
+            raise self.error
+        for prefix, rows in self.responses.items():
+            if query.strip().startswith(prefix):
+                return rows
+        return []
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.error:
+            raise self.error
+
+    def ping(self, reconnect=False, attempts=1):
+        self.pings += 1
+
+    def close(self):
+        self.closed = True
+
+def make_client(monkeypatch, pool_size=2, pool_timeout=1.0, ping_after=30.0, responses=None):
+    client = SQLClient(pool_size=pool_size, pool_timeout=pool_timeout, ping_after=ping_after)
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection(responses))
+        return connections[-1]
+
+    monkeypatch.setattr(client, "_connect", connect)
+    return client, connections
+
+def test_connections_are_reused(monkeypatch):
+    client, connections = make_client(monkeypatch)
+    for _ in range(3):
+        with client.get_connection():
+            pass
+    assert len(connections) == 1
+    # 刚归还的连接直接借出，不额外往返服务器
+    assert connections[0].pings == 0
+
+def test_idle_connections_are_pinged(monkeypatch):
+    client, connections = make_client(monkeypatch, ping_after=0.0)
+    for _ in range(3):
+        with client.get_connection():
+            pass
+    assert len(connections) == 1
+    assert connections[0].pings == 2
+
+def test_pool_exhaustion_times_out(monkeypatch):
+    client, connections = make_client(monkeypatch, pool_size=1, pool_timeout=0.05)
+    with client.get_connection():
+        with pytest.raises(PoolTimeoutError):
+            with client.get_connection():
+                pass
+    # 归还后可以再次借出
+    with client.get_connection():
+        pass
+    assert len(connections) == 1
+
+def test_waiting_caller_gets_released_connection(monkeypatch):
+    client, connections = make_client(monkeypatch, pool_size=1, pool_timeout=2.0)
+    borrowed = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with client.get_connection():
+            borrowed.set()
+            release.wait(2)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    borrowed.wait(2)
+    threading.Timer(0.05, release.set).start()
+    with client.get_connection() as connection:
+        assert connection is connections[0]
+    holder.join()
+
+def test_transaction_commits_and_rolls_back(monkeypatch):
+    client, connections = make_client(monkeypatch)
+    with client.transaction() as cursor:
+        cursor.execute("SELECT 1")
+    with pytest.raises(RuntimeError):
+        with client.transaction() as cursor:
+            cursor.execute("SELECT 1")
+            raise RuntimeError("boom")
+    assert (connections[0].commits, connections[0].rollbacks) == (1, 1)
+
+def test_broken_connection_is_discarded(monkeypatch):
+    """语句和回滚都失败的连接被关闭，不放回连接池，下次借出时新建连接"""
+    client, connections = make_client(monkeypatch)
+    with client.transaction() as cursor:
+        cursor.execute("SELECT 1")
+    connections[0].error = errors.OperationalError("Lost connection to MySQL server")
+    with pytest.raises(errors.OperationalError):
+        with client.transaction() as cursor:
+            cursor.execute("SELECT 1")
+    assert connections[0].closed
+    with client.transaction() as cursor:
+        cursor.execute("SELECT 1")
+    assert len(connections) == 2 and not connections[1].closed
+
+def test_append_inserts_a_single_row(monkeypatch):
+    """追加消息只插入一行，不读取也不重写已有的历史"""
+    client, connections = make_client(monkeypatch, responses={
+        "SELECT id FROM users": [{"id": "u1"}],
+        "SELECT JSON_LENGTH": [{"legacy_count": 1}],
+    })
+    assert client.append_to_conversation("alice", "c1", "你好", is_user=True) == "c1"
+    statements = [query for query, _ in connections[0].statements]
+    assert [query.split()[0] for query in statements] == ["SELECT", "SELECT", "INSERT", "UPDATE"]
+    assert statements[2].startswith("INSERT INTO chat_history_messages")
+    assert connections[0].statements[2][1][:3] == ("c1", "user", "你好")
+    assert not any("conversation_history =" in query for query in statements)
+    assert connections[0].commits == 1
+
+def test_append_migrates_legacy_conversation_first(monkeypatch):
+    legacy = [SYSTEM_MESSAGE, {"role": "user", "content": "旧问题"}, {"role": "assistant", "content": "旧回答"}]
+    client, connections = make_client(monkeypatch, responses={
+        "SELECT id FROM users": [{"id": "u1"}],
+        "SELECT JSON_LENGTH": [{"legacy_count": 3}],
+        "SELECT conversation_history, timestamp": [{"conversation_history": json.dumps(legacy), "timestamp": None}],
+    })
+    client.append_to_conversation("alice", "c1", "新问题", is_user=True)
+    inserted = [params[2] for query, params in connections[0].statements if query.startswith("INSERT INTO chat_history_messages")]
+    assert inserted == ["旧问题", "旧回答", "新问题"]
+
+def test_close_closes_idle_and_later_released_connections(monkeypatch):
+    client, connections = make_client(monkeypatch)
+    with client.get_connection():
+        pass
+    with client.get_connection() as borrowed:
+        with client.get_connection():
+            pass
+        idle = connections[1]
+        client.close()
+        assert idle.closed and not borrowed.closed
+    assert borrowed.closed
+    # 关闭后再次使用会重新建立连接
+    with client.get_connection() as connection:
+        assert connection not in connections[:2]
@@ -0,0 +1,34 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from app.core.password_hashing import PasswordHasher, PasswordHasherBusyError, check_password
+"""
+密码哈希进程池测试（离线运行）
+"""
+
+def test_hash_and_verify_in_process_pool():
+    async def run():
+        hasher = PasswordHasher(rounds=4, max_workers=2)
+        try:
+            hashed = await hasher.hash("secret")
+            assert hashed.startswith("$2b$04$")
+            assert check_password("secret", hashed)
+            assert await hasher.verify("secret", hashed)
+            assert not await hasher.verify("wrong", hashed)
+            assert hasher.stats() == {"pending": 0, "completed": 3, "rejected": 0}
+        finally:
+            hasher.close()
+    asyncio.run(run())
+
+def test_rejects_when_queue_is_full():
+    """执行中 + 排队的任务达到上限时直接拒绝"""
+    async def run():
+        hasher = PasswordHasher(rounds=8, max_workers=0, max_pending=1)
+        results = await asyncio.gather(hasher.hash("a"), hasher.hash("b"), return_exceptions=True)
+        assert isinstance(results[0], str)
+        assert isinstance(results[1], PasswordHasherBusyError)
+        assert hasher.stats()["rejected"] == 1
+        # 之前的任务完成后可以继续提交
+        assert await hasher.verify("a", results[0])
+    asyncio.run(run())
@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import fakeredis
+from app.db.redis_conversation_manager import RedisConversationManager
+"""
+Redis 对话历史后端测试（使用 fakeredis 代替 Redis 服务，离线运行）
+"""
+
+def make_manager(**kwargs):
+    return RedisConversationManager(fakeredis.FakeRedis(decode_responses=True), **kwargs)
+
+def test_history_shared_between_instances():
+    """两个实例（相当于两个 worker）看到同一份历史"""
+    server = fakeredis.FakeServer()
+    worker_a = RedisConversationManager(fakeredis.FakeRedis(server=server, decode_responses=True))
+    worker_b = RedisConversationManager(fakeredis.FakeRedis(server=server, decode_responses=True))
+    worker_a.update_history("c1", "《采购师》的ISBN是什么？", "ISBN 978-7-xxx")
+    history = worker_b.get_history("c1")
+    assert history[0]["role"] == "system"
+    assert history[1:] == [
+        {"role": "user", "content": "《采购师》的ISBN是什么？"},
+        {"role": "assistant", "content": "ISBN 978-7-xxx"},
+    ]
+
+def test_append_trims_oldest_turns():
+    manager = make_manager(max_context_length=200)
+    for i in range(20):
+        manager.update_history("c1", query=f"问题{i}" * 5, response=f"回答{i}" * 5)
+    history = manager.get_history("c1")
+    assert sum(len(message["content"]) for message in history) <= 200
+    assert history[-1]["content"] == "回答19" * 5
+    assert history[1]["role"] == "user"
+
+def test_concurrent_appends_are_not_lost():
+    manager = make_manager(max_context_length=10 ** 9)
+    def worker():
+        for _ in range(50):
+            manager.update_history("c1", query="q", response="r")
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(manager.get_history("c1")) == 1 + 4 * 50 * 2
@@ -0,0 +1,45 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+from datetime import datetime
+from typing import List
+from fastapi.encoders import jsonable_encoder
+from app.api.responses import FastJSONResponse, orm_response
+from app.models.chat import Chat, Message
+from app.models.user import User
+from app.schemas.chat import ChatResponse
+from app.schemas.user import UserResponse
+"""
+JSON 响应测试（离线运行）
+"""
+
+def make_chat() -> Chat:
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    chat = Chat(id="c1", title="标题", user_id="u1", created_at=now, updated_at=now)
+    chat.messages = [
+        Message(id="m1", chat_id="c1", role="user", content="你好\n\"quoted\"", meta_data={"k": [1, 2]}, created_at=now, updated_at=now),
+    ]
+    return chat
+
+def test_orm_response_matches_default_serialization():
+    chat = make_chat()
+    expected = jsonable_encoder([ChatResponse.model_validate(chat)])
+    response = orm_response(List[ChatResponse], [chat])
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == expected
+    # 非 ASCII 字符不转义
+    assert "你好".encode() in response.body
+
+def test_fast_json_response_renders_models_and_dicts():
+    model = ChatResponse.model_validate(make_chat())
+    assert json.loads(FastJSONResponse(model).body) == jsonable_encoder(model)
+    assert FastJSONResponse({"exists": True}).body == b'{"exists":true}'
+
+def test_orm_response_serializes_users_without_password():
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    user = User(id="u1", username="alice", nickname="爱丽丝", email=None, hashed_password="secret",
+                is_active=True, is_superuser=False, created_at=now, updated_at=now)
+    response = orm_response(UserResponse, user)
+    assert json.loads(response.body) == jsonable_encoder(UserResponse.model_validate(user))
+    assert b"secret" not in response.body
@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import math
+import time
+from app.services.semantic_cache import SemanticCache, query_signature
+"""
+语义答案缓存测试（离线运行）
+"""
+
+def at_similarity(similarity: float):
+    """与 [1, 0] 的余弦相似度为 similarity 的单位向量"""
+    return [similarity, math.sqrt(1 - similarity ** 2)]
+
+def test_threshold_boundary():
+    cache = SemanticCache(max_size=4, threshold=0.95, ttl=0)
+    cache.store("问题", [1.0, 0.0], "回答", version="v1")
+    assert cache.lookup(at_similarity(0.951), "v1") == "回答"
+    assert cache.lookup(at_similarity(0.949), "v1") is None
+
+def test_ttl_expiry():
+    cache = SemanticCache(max_size=4, threshold=0.9, ttl=0.05)
+    cache.store("问题", [1.0, 0.0], "回答", version="v1")
+    assert cache.lookup([1.0, 0.0], "v1") == "回答"
+    time.sleep(0.1)
+    assert cache.lookup([1.0, 0.0], "v1") is None
+
+def test_version_bump_invalidates_entries():
+    cache = SemanticCache(max_size=4, threshold=0.9, ttl=0)
+    cache.store("问题", [1.0, 0.0], "回答", version="v1")
+    assert cache.lookup([1.0, 0.0], "v2") is None
+    # 切换回旧版本也不会复活已失效的条目
+    assert cache.lookup([1.0, 0.0], "v1") is None
+
+def test_lru_eviction_and_stats():
+    cache = SemanticCache(max_size=2, threshold=0.99, ttl=0)
+    cache.store("a", [1.0, 0.0, 0.0], "A", version="v1")
+    cache.store("b", [0.0, 1.0, 0.0], "B", version="v1")
+    assert cache.lookup([1.0, 0.0, 0.0], "v1") == "A"  # a 变为最近使用
+    cache.store("c", [0.0, 0.0, 1.0], "C", version="v1")  # 淘汰 b
+    assert cache.lookup([0.0, 1.0, 0.0], "v1") is None
+    assert cache.lookup([0.0, 0.0, 1.0], "v1") == "C"
+    assert cache.stats() == {
+        "hits": 2, "misses": 1, "evictions": 1, "signature_mismatches": 0, "hit_rate": 2 / 3, "size": 2,
+    }
+
+def test_numbers_and_titles_must_match():
+    """只差一个模块编号的问题即使嵌入几乎相同也不复用回答"""
+    cache = SemanticCache(max_size=4, threshold=0.95, ttl=0)
+    cache.store("采购师高级模块五的主编是谁？", [1.0, 0.0], "张三", version="v1")
+    assert cache.lookup(at_similarity(0.99), "v1", "采购师高级模块六的主编是谁？") is None
+    assert cache.lookup(at_similarity(0.99), "v1", "采购师高级 模块五 的主编是哪位？") == "张三"
+    assert cache.stats()["signature_mismatches"] == 1
+
+def test_query_signature():
+    assert query_signature("ISBN 978-7-5167-1234-5") == query_signature("isbn 9787516712345")
+    assert query_signature("《采购师》第三章") != query_signature("《采购师》第四章")
+    assert query_signature("采购合同有哪些注意事项") == frozenset()
+
+def test_query_signature_matches_keyword_tokens():
+    """签名中的书名和编号与关键字检索的分词结果一致"""
+    from app.services.keyword_retrieval import tokenize
+    text = "《采购师高级　模块五》的ＩＳＢＮ 978-7-5167-1234-5"
+    assert query_signature(text) <= set(tokenize(text))
@@ -0,0 +1,44 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.core.config import Config
+import multiprocessing
+import time
+from app.serve import (
+    available_cpus, build_options, child_pids, current_rss_bytes, password_hash_workers, process_tree_rss_bytes,
+)
+"""
+生产启动入口测试（离线运行）
+"""
+
+def test_build_options_from_config(monkeypatch):
+    monkeypatch.setattr(Config, "SERVER_WORKERS", None)
+    options = build_options()
+    assert options["workers"] == available_cpus()
+    assert options["worker_class"] == "app.serve.ProductionWorker"
+    assert options["bind"] == f"{Config.FASTAPI_SERVER_URL}:{Config.FASTAPI_SERVER_PORT}"
+
+    monkeypatch.setattr(Config, "SERVER_WORKERS", 3)
+    assert build_options()["workers"] == 3
+
+def test_current_rss_bytes():
+    assert current_rss_bytes() > 0
+
+def test_password_hash_workers_split_cpus_across_workers(monkeypatch):
+    monkeypatch.setattr("app.serve.available_cpus", lambda: 8)
+    assert password_hash_workers(1) == 8
+    assert password_hash_workers(4) == 2
+    assert password_hash_workers(16) == 1
+
+def sleep_in_child():
+    time.sleep(30)
+
+def test_process_tree_rss_includes_children():
+    process = multiprocessing.get_context("spawn").Process(target=sleep_in_child)
+    process.start()
+    try:
+        assert process.pid in child_pids(os.getpid())
+        assert process_tree_rss_bytes(os.getpid()) > current_rss_bytes()
+    finally:
+        process.terminate()
+        process.join()
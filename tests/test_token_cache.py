@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+from datetime import timedelta
+import pytest
+from jose import JWTError
+from app.core import security
+from app.core.config import Config
+from app.core.token_cache import TokenCache, key_fingerprint, token_cache
+"""
+已验证令牌缓存测试（离线运行）
+"""
+
+def test_entries_expire_with_token():
+    cache = TokenCache(max_size=10)
+    fingerprint = key_fingerprint("secret", "HS256")
+    cache.set("live", fingerprint, {"sub": "alice", "exp": time.time() + 60})
+    cache.set("expired", fingerprint, {"sub": "bob", "exp": time.time() - 1})
+    cache.set("no-exp", fingerprint, {"sub": "carol"})
+    assert cache.get("live", fingerprint)["sub"] == "alice"
+    assert cache.get("expired", fingerprint) is None
+    assert cache.get("no-exp", fingerprint) is None
+
+def test_key_rotation_clears_cache():
+    cache = TokenCache(max_size=10)
+    old, new = key_fingerprint("old", "HS256"), key_fingerprint("new", "HS256")
+    cache.set("token", old, {"sub": "alice", "exp": time.time() + 60})
+    assert cache.get("token", new) is None
+    assert cache.get("token", old) is None
+    assert cache.stats()["size"] == 0
+
+def test_decode_access_token_verifies_signature_once(monkeypatch):
+    token_cache.clear()
+    calls = []
+    decode = security.jwt.decode
+    monkeypatch.setattr(security.jwt, "decode", lambda *args, **kwargs: calls.append(1) or decode(*args, **kwargs))
+
+    token = security.create_access_token({"sub": "alice"}, expires_delta=timedelta(minutes=5))
+    for _ in range(3):
+        assert security.decode_access_token(token)["sub"] == "alice"
+    assert len(calls) == 1
+
+    # 签名密钥轮换后旧令牌重新验证（并失败）
+    monkeypatch.setattr(Config, "SECRET_KEY", Config.SECRET_KEY + "-rotated")
+    with pytest.raises(JWTError):
+        security.decode_access_token(token)
+    assert len(calls) == 2
@@ -0,0 +1,58 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.core.user_cache import UserCache, user_cache
+from app.models.chat import Chat  # noqa: F401  注册 User.chats 关系的目标模型
+from app.models.user import User
+"""
+已认证用户缓存测试（离线运行）
+"""
+
+def make_user(username: str = "alice", **kwargs) -> User:
+    return User(id=f"id-{username}", username=username, hashed_password="x", is_active=True, **kwargs)
+
+def test_hit_miss_and_ttl():
+    cache = UserCache(max_size=10, ttl=30)
+    assert cache.get("alice") is None
+    cache.set("alice", make_user())
+    assert cache.get("alice").id == "id-alice"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    expiring = UserCache(max_size=10, ttl=1e-9)
+    expiring.set("alice", make_user())
+    assert expiring.get("alice") is None
+
+def test_lru_eviction_and_disabled():
+    cache = UserCache(max_size=2, ttl=30)
+    cache.set("a", make_user("a"))
+    cache.set("b", make_user("b"))
+    cache.get("a")
+    cache.set("c", make_user("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+    disabled = UserCache(max_size=0)
+    disabled.set("a", make_user("a"))
+    assert disabled.get("a") is None
+
+def test_orm_update_invalidates_entry():
+    """通过 ORM 停用或改名时，缓存条目立即失效"""
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    with Session(engine) as session:
+        user = make_user("bob")
+        session.add(user)
+        session.commit()
+
+        user_cache.set("bob", user)
+        user.is_active = False
+        session.commit()
+        assert user_cache.get("bob") is None
+
+        user_cache.set("bob", user)
+        user.username = "bobby"
+        session.commit()
+        assert user_cache.get("bob") is None
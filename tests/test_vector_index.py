@@ -0,0 +1,90 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+from app.db.vector_index import MemoryMappedVectorIndex, quantize_binary, quantize_int8
+from app.utils.embedding import shorten_embeddings
+"""
+内存映射向量索引测试（离线运行，不依赖 Milvus）
+"""
+
+def make_corpus(n: int = 500, dim: int = 32, seed: int = 0):
+    """生成归一化的随机向量和对应的条目"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = list(range(1000, 1000 + n))
+    entities = [{"vector_text": f"问题 {i}", "metadata": {"answer": f"答案 {i}"}} for i in ids]
+    return ids, vectors, entities
+
+def test_search_matches_brute_force(tmp_path):
+    """全量扫描的结果与暴力计算一致，返回结构与 Milvus 一致"""
+    ids, vectors, entities = make_corpus()
+    MemoryMappedVectorIndex.build(str(tmp_path), ids, vectors, entities, nlist=0)
+    index = MemoryMappedVectorIndex(str(tmp_path))
+    query = vectors[7]
+    results = index.search(query.tolist(), top_k=5)
+
+    expected = np.argsort(-(vectors @ query))[:5]
+    assert len(results) == 1
+    assert [hit["id"] for hit in results[0]] == [ids[i] for i in expected]
+    assert results[0][0]["id"] == ids[7]
+    assert results[0][0]["entity"]["metadata"]["answer"] == f"答案 {ids[7]}"
+    assert results[0][0]["distance"] >= results[0][-1]["distance"]
+
+def test_ivf_search_finds_exact_match(tmp_path):
+    """开启 IVF 分区后仍能找回自身"""
+    ids, vectors, entities = make_corpus()
+    MemoryMappedVectorIndex.build(str(tmp_path), ids, vectors, entities, nlist=16)
+    index = MemoryMappedVectorIndex(str(tmp_path), nprobe=4)
+    for i in (0, 123, 499):
+        results = index.search(vectors[i].tolist(), top_k=3)
+        assert results[0][0]["id"] == ids[i]
+
+def test_top_k_larger_than_index(tmp_path):
+    """top_k 超过条目数时返回全部条目"""
+    ids, vectors, entities = make_corpus(n=3)
+    MemoryMappedVectorIndex.build(str(tmp_path), ids, vectors, entities)
+    index = MemoryMappedVectorIndex(str(tmp_path))
+    assert len(index.search(vectors[0].tolist(), top_k=10)[0]) == 3
+
+def test_quantized_search_with_rescore(tmp_path):
+    """int8 / 二值量化粗排 + float32 精排后，结果与暴力计算的前几名一致"""
+    ids, vectors, entities = make_corpus(dim=64)
+    for quantization in ("int8", "binary"):
+        path = str(tmp_path / quantization)
+        MemoryMappedVectorIndex.build(path, ids, vectors, entities, quantization=quantization)
+        index = MemoryMappedVectorIndex(path, rescore_factor=8)
+        query = vectors[42]
+        results = index.search(query.tolist(), top_k=3)
+        assert results[0][0]["id"] == ids[42]
+        assert abs(results[0][0]["distance"] - 1.0) < 1e-5
+
+def test_quantized_scores_match_reference_across_blocks(tmp_path):
+    """分块计算的量化得分与直接计算一致（条目数超过一个块）"""
+    ids, vectors, entities = make_corpus(n=3000, dim=128)
+    query = vectors[11]
+    rows = np.arange(5, 3000, 3)
+    codes, scales = quantize_int8(vectors)
+    int8_expected = (codes.astype(np.float32) @ query) * scales
+    bits = np.unpackbits(quantize_binary(vectors), axis=1)[:, :128].astype(np.int32)
+    query_bits = np.unpackbits(quantize_binary(query))[:128].astype(np.int32)
+    binary_expected = (128 - 2 * np.abs(bits - query_bits).sum(axis=1)) / 128
+    for quantization, expected in (("int8", int8_expected), ("binary", binary_expected)):
+        path = str(tmp_path / quantization)
+        MemoryMappedVectorIndex.build(path, ids, vectors, entities, nlist=0, quantization=quantization)
+        index = MemoryMappedVectorIndex(path)
+        np.testing.assert_allclose(index._coarse_scores(query, None), expected, rtol=1e-5, atol=1e-5)
+        np.testing.assert_allclose(index._coarse_scores(query, rows), expected[rows], rtol=1e-5, atol=1e-5)
+
+def test_shorten_embeddings_renormalizes():
+    """缩短后的向量为单位向量"""
+    _, vectors, _ = make_corpus(n=4, dim=32)
+    shortened = shorten_embeddings(vectors, 8)
+    assert shortened.shape == (4, 8)
+    assert np.allclose(np.linalg.norm(shortened, axis=1), 1.0, atol=1e-5)
+
+def test_default_path_anchored_to_project_root():
+    from app.core.config import PROJECT_ROOT, Config
+    if os.getenv("VECTOR_INDEX_PATH") is None:
+        assert Config.VECTOR_INDEX_PATH == os.path.join(PROJECT_ROOT, "data", "vector_index")